@@ -0,0 +1,180 @@
+"""Crash-safe journal for appending to the OVERALL workbook.
+
+An append run prepares one batch of rows per OVERALL sheet, inserts it
+into the violations store, adds it to the workbook in memory and finally
+saves the workbook. The journal records each step so an interrupted run
+can be resumed instead of redone:
+
+- every prepared batch (with its rollup columns) is written to
+  journal/<type>.pkl before anything else uses it, and its state is
+  recorded in journal/journal.json ("prepared", then "stored");
+- the workbook is saved to a temporary file in the OVERALL folder and
+  published with an atomic rename, so the source workbook is untouched
+  until the new one is complete;
+- on the next run a journal for the same source workbook, raw folder
+  and pull run (run manifest) is resumed: journaled batches are replayed from their files (skipping
+  the store insert when already done) and only the missing sheets are
+  prepared from the raw reports. A journal whose workbook was already
+  published only needs its clean-up finished.
+
+The journal is removed once the run is complete.
+"""
+
+import os
+import json
+import tempfile
+import shutil
+
+import pandas as pd
+
+from config import APPEND_JOURNAL_FOLDER
+from dedupe_index import workbook_stamp
+from run_manifest import write_overall_pointer
+
+JOURNAL_FILE = "journal.json"
+
+
+def _write_json_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class AppendJournal:
+    """Journal of one append run, kept in the OVERALL folder."""
+
+    def __init__(self, overall_folder):
+        self.overall_folder = overall_folder
+        self.folder = os.path.join(overall_folder, APPEND_JOURNAL_FOLDER)
+        self.path = os.path.join(self.folder, JOURNAL_FILE)
+        self.state = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError):
+                print("⚠ Append journal unreadable, ignoring it")
+
+    def _save(self):
+        os.makedirs(self.folder, exist_ok=True)
+        _write_json_atomic(self.path, self.state)
+
+    def finish_published(self):
+        """Complete the clean-up of a run whose workbook was already published.
+
+        Returns:
+            True if such a run was found and finished
+        """
+        if not self.state or not self.state.get("published"):
+            return False
+        source = os.path.join(self.overall_folder, self.state["source"])
+        target = os.path.join(self.overall_folder, self.state["target"])
+        if os.path.exists(target):
+            write_overall_pointer(self.overall_folder, target)
+            if source != target and os.path.exists(source):
+                os.remove(source)
+                print(f"✓ Removed old file: {self.state['source']}")
+        print("ℹ Finished clean-up of the previous interrupted append")
+        self.clear()
+        return True
+
+    def begin(self, source_path, raw_reports_folder, target_name, run_id=None):
+        """Resume the pending run for this workbook or start a new one.
+
+        Args:
+            source_path: OVERALL workbook being appended to
+            raw_reports_folder: Folder the batches are read from
+            target_name: File name the workbook will be published as
+            run_id: Pull run the batches come from (run manifest), if known
+
+        Returns:
+            True if a pending run is resumed
+        """
+        run = {
+            "source": os.path.basename(source_path),
+            "stamp": workbook_stamp(source_path),
+            "raw_folder": os.path.abspath(raw_reports_folder),
+            "run": run_id,
+        }
+        if self.state and all(self.state.get(k) == v for k, v in run.items()):
+            self.state["target"] = target_name
+            self._save()
+            done = sum(1 for b in self.state["batches"].values() if b["status"] == "stored")
+            print(f"↻ Resuming interrupted append ({len(self.state['batches'])} batches journaled, "
+                  f"{done} stored)")
+            return True
+
+        if self.state:
+            print("⚠ Discarding append journal of a different workbook or pull run")
+        self.clear()
+        self.state = dict(run, target=target_name, published=False, batches={})
+        self._save()
+        return False
+
+    def batch(self, violation_type):
+        """Return the journaled batch (DataFrame, raw file, group name) or None."""
+        entry = self.state["batches"].get(violation_type)
+        if entry is None:
+            return None
+        df = pd.DataFrame()
+        if entry["file"]:
+            df = pd.read_pickle(os.path.join(self.folder, entry["file"]))
+        return df, entry["raw_file"], entry["group_name"]
+
+    def record_batch(self, violation_type, df, raw_file, group_name):
+        """Persist a prepared batch before it is stored or appended."""
+        file_name = None
+        if not df.empty:
+            file_name = f"{violation_type.lower()}.pkl"
+            tmp = os.path.join(self.folder, file_name + ".tmp")
+            df.to_pickle(tmp)
+            os.replace(tmp, os.path.join(self.folder, file_name))
+        self.state["batches"][violation_type] = {
+            "file": file_name,
+            "rows": len(df),
+            "raw_file": raw_file,
+            "group_name": group_name,
+            "status": "prepared",
+        }
+        self._save()
+
+    def is_stored(self, violation_type):
+        entry = self.state["batches"].get(violation_type)
+        return entry is not None and entry["status"] == "stored"
+
+    def mark_stored(self, violation_type):
+        self.state["batches"][violation_type]["status"] = "stored"
+        self._save()
+
+    def publish(self, appender, target_path, source_path):
+        """Save through a temporary file and atomically rename it to target_path.
+
+        Args:
+            appender: Open workbook appender holding the appended rows
+            target_path: Published workbook path
+            source_path: Workbook the run started from (permissions are kept)
+        """
+        fd, tmp_path = tempfile.mkstemp(prefix=".publish-", suffix=".xlsx",
+                                        dir=os.path.dirname(os.path.abspath(target_path)))
+        os.close(fd)
+        try:
+            appender.save(tmp_path)
+            shutil.copymode(source_path, tmp_path)
+            with open(tmp_path, 'ab') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, target_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.state["published"] = True
+        self._save()
+
+    def clear(self):
+        """Remove the journal and its batch files."""
+        if os.path.isdir(self.folder):
+            shutil.rmtree(self.folder)
+        self.state = None
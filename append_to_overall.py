@@ -1,26 +1,26 @@
 """Append pulled violation reports to OVERALL VIOLATIONS REPORT excel file."""
-import subprocess
-
-subprocess.run(
-    ["taskkill", "/f", "/im", "EXCEL.EXE"],
-    stdout=subprocess.DEVNULL,
-    stderr=subprocess.DEVNULL
-)
-
 import os
-import shutil
-import glob
-from flask import app
 import pandas as pd
 from datetime import datetime, timedelta
-import xlwings as xw
+
+from appenders import get_appender
+from dedupe_index import DedupeIndex
+from workbook_backup import WorkbookBackups
+from append_journal import AppendJournal
+from run_manifest import (load_run_manifest, manifest_report_path, scan_latest,
+                          current_overall_workbook, write_overall_pointer)
+from config import OVERALL_WORKBOOK_UPDATE
+from violations_store import ViolationStore, get_store_path, import_workbook
+from summaries import write_summaries
+from sheet_mapping import find_sheet, get_sheet_specs, prepare_sheet_data, add_daily_rollups
+from timestamps import parse_times, format_times, DATE_FORMAT
+from run_telemetry import stage
 
 
 def find_overall_excel(base_folder):
-    overall_files = glob.glob(os.path.join(base_folder, "OVERALL VIOLATIONS REPORT *.xlsx"))
-    if not overall_files:
+    latest_file = current_overall_workbook(base_folder)
+    if not latest_file:
         return None, None
-    latest_file = max(overall_files, key=os.path.getmtime)
     try:
         date_str = os.path.basename(latest_file).replace("OVERALL VIOLATIONS REPORT ", "").replace(".xlsx","").strip()
     except Exception:
@@ -34,292 +34,222 @@ def get_yesterday_date_string():
     return yesterday.strftime("%d.%m.%Y")
 
 
-def extract_date_from_event_time(event_time_str):
-    """Extract date from event time string."""
-    try:
-        if pd.isna(event_time_str) or str(event_time_str).strip() == '':
-            return ''
-        
-        dt = pd.to_datetime(event_time_str, errors='coerce')
-        if pd.notna(dt):
-            return dt.strftime("%Y-%m-%d")
-    except Exception:
-        pass
-    
-    return ''
-
-
-def determine_offense(beginning_time):
-    """Determine offense type from Beginning time."""
-    try:
-        dt = pd.to_datetime(beginning_time, errors='coerce')
-        if pd.notna(dt):
-            hour = dt.hour
-            if hour in [4, 5]:
-                return "Early start"
-            elif hour in [20, 21, 22, 23]:
-                return "Night driving"
-    except Exception:
-        pass
-    
-    return ""
-
-
-def prepare_idling_data(raw_df, existing_df):
-    """Prepare idling data for appending."""
-    if '№' in raw_df.columns:
-        raw_df = raw_df.drop(columns=['№'])
-    
-    column_mapping = {
-        'Grouping': 'TRUCK NO',
-        'Event time': 'Event time',
-        'Time received': 'Time received',
-        'Event text': 'Event text',
-        'Location': 'Location',
-        'Count': 'NO OF EVENTS'
-    }
-    
-    raw_df = raw_df.rename(columns=column_mapping)
-    raw_df['RPT_DT'] = raw_df['Event time'].apply(extract_date_from_event_time)
+def load_sheet_index(dedupe, appender, sheet_name, truck_col, time_col, stale):
+    """Return the dedupe index of a sheet, rebuilding it from the sheet if needed.
     
-    target_columns = ['TRUCK NO', 'Event time', 'RPT_DT', 'Time received', 'Event text', 'Location', 'NO OF EVENTS']
-    
-    for col in target_columns:
-        if col not in raw_df.columns:
-            raw_df[col] = ''
-    
-    raw_df = raw_df[target_columns]
-    
-    # Remove duplicates
-    if not existing_df.empty and 'TRUCK NO' in existing_df.columns and 'Event time' in existing_df.columns:
-        existing_keys = set(
-            existing_df['TRUCK NO'].astype(str) + '|' + existing_df['Event time'].astype(str)
-        )
-        
-        raw_df['_check_key'] = raw_df['TRUCK NO'].astype(str) + '|' + raw_df['Event time'].astype(str)
-        original_count = len(raw_df)
-        raw_df = raw_df[~raw_df['_check_key'].isin(existing_keys)]
-        raw_df = raw_df.drop(columns=['_check_key'])
+    Args:
+        dedupe: DedupeIndex of the OVERALL folder
+        appender: Open workbook appender
+        sheet_name: Sheet name
+        truck_col: Truck column header
+        time_col: Timestamp column header
+        stale: Index does not describe the current workbook
         
-        removed = original_count - len(raw_df)
-        if removed > 0:
-            print(f"    Removed {removed} duplicate rows")
+    Returns:
+        SheetIndex
+    """
+    if not stale and dedupe.has_sheet(sheet_name):
+        index = dedupe.sheet(sheet_name)
+        print(f"  Indexed rows: {len(index)}")
+        return index
     
-    return raw_df
+    existing_df = appender.read_sheet(sheet_name)
+    print(f"  Current rows: {len(existing_df)} (indexing)")
+    if truck_col in existing_df.columns and time_col in existing_df.columns:
+        return dedupe.rebuild_sheet(sheet_name, existing_df[truck_col], existing_df[time_col])
+    return dedupe.rebuild_sheet(sheet_name, [], [])
 
 
-def prepare_harsh_brake_data(raw_df, existing_df):
-    """Prepare harsh brake data for appending."""
-    if '№' in raw_df.columns:
-        raw_df = raw_df.drop(columns=['№'])
-    
-    column_mapping = {
-        'Grouping': 'Row Labels',
-        'Event time': 'Event time',
-        'Event text': 'Event text',
-        'Location': 'Location',
-        'Count': 'Count of Time received'
-    }
+def load_raw_report(raw_reports_folder, spec, manifest=None):
+    """Read the raw report feeding a sheet.
     
-    raw_df = raw_df.rename(columns=column_mapping)
-    raw_df['RPT_DT'] = raw_df['Event time'].apply(extract_date_from_event_time)
-    raw_df['DRIVER NAME'] = ''
-    
-    target_columns = ['Row Labels', 'Event time', 'RPT_DT', 'DRIVER NAME', 'Event text', 'Location', 'Count of Time received']
-    
-    for col in target_columns:
-        if col not in raw_df.columns:
-            raw_df[col] = ''
-    
-    raw_df = raw_df[target_columns]
-    
-    # Remove duplicates
-    if not existing_df.empty and 'Row Labels' in existing_df.columns and 'Event time' in existing_df.columns:
-        existing_keys = set(
-            existing_df['Row Labels'].astype(str) + '|' + existing_df['Event time'].astype(str)
-        )
-        
-        raw_df['_check_key'] = raw_df['Row Labels'].astype(str) + '|' + raw_df['Event time'].astype(str)
-        original_count = len(raw_df)
-        raw_df = raw_df[~raw_df['_check_key'].isin(existing_keys)]
-        raw_df = raw_df.drop(columns=['_check_key'])
+    Args:
+        raw_reports_folder: Folder containing raw pulled reports
+        spec: Sheet spec from config.OVERALL_SHEETS
+        manifest: Run manifest of the pull (see run_manifest.py); without
+            one the newest matching file in the folder is used
         
-        removed = original_count - len(raw_df)
-        if removed > 0:
-            print(f"    Removed {removed} duplicate rows")
-    
-    return raw_df
-
-
-def prepare_speed_data(raw_df, existing_df):
-    """Prepare speed violation data for appending."""
-    if '№' in raw_df.columns:
-        raw_df = raw_df.drop(columns=['№'])
-    
-    column_mapping = {
-        'Grouping': 'TRUCK NO',
-        'Time': 'Time',
-        'Max speed': 'MAX SPEED',
-        'Location': 'Location',
-        'Speed limit': 'Speed limit',
-        'Count': 'Count'
-    }
-    
-    raw_df = raw_df.rename(columns=column_mapping)
-    raw_df['RPT_DT'] = raw_df['Time'].apply(extract_date_from_event_time)
-    raw_df['DRIVER NAME'] = ''
-    
-    target_columns = ['TRUCK NO', 'Time', 'RPT_DT', 'DRIVER NAME', 'MAX SPEED', 'Location', 'Speed limit', 'Count']
-    
-    for col in target_columns:
-        if col not in raw_df.columns:
-            raw_df[col] = ''
+    Returns:
+        Tuple of (DataFrame, file name, group name) or (None, None, None)
+    """
+    if manifest is not None:
+        raw_path = manifest_report_path(raw_reports_folder, manifest, spec["raw_file"])
+        group_name = manifest.get("group")
+    else:
+        raw_path = scan_latest(raw_reports_folder, f"*{spec['raw_file']}*.xlsx")
+        # Raw files are named {GROUP}_{TAG}_{TIMESTAMP}.xlsx
+        group_name = (os.path.basename(raw_path).split(f"_{spec['raw_file']}")[0] or None
+                      if raw_path else None)
     
-    raw_df = raw_df[target_columns]
+    if not raw_path:
+        print(f"  ⚠ No raw {spec['title'].lower()} report found")
+        return None, None, None
     
-    # Remove duplicates
-    if not existing_df.empty and 'TRUCK NO' in existing_df.columns and 'Time' in existing_df.columns:
-        existing_keys = set(
-            existing_df['TRUCK NO'].astype(str) + '|' + existing_df['Time'].astype(str)
-        )
-        
-        raw_df['_check_key'] = raw_df['TRUCK NO'].astype(str) + '|' + raw_df['Time'].astype(str)
-        original_count = len(raw_df)
-        raw_df = raw_df[~raw_df['_check_key'].isin(existing_keys)]
-        raw_df = raw_df.drop(columns=['_check_key'])
-        
-        removed = original_count - len(raw_df)
-        if removed > 0:
-            print(f"    Removed {removed} duplicate rows")
+    raw_file = os.path.basename(raw_path)
+    print(f"  Reading: {raw_file}")
     
-    return raw_df
+    raw_df = pd.read_excel(raw_path, sheet_name=spec["raw_sheet"])
+    print(f"  Raw data rows: {len(raw_df)}")
+    return raw_df, raw_file, group_name
 
 
-def prepare_night_driving_data(raw_df, existing_df):
-    """Prepare night driving data for appending."""
-    if '№' in raw_df.columns:
-        raw_df = raw_df.drop(columns=['№'])
-    
-    column_mapping = {
-        'Grouping': 'Vehicle no',
-        'Beginning': 'Beginning',
-        'Initial location': 'Initial location',
-        'End': 'End',
-        'Final location': 'Final location',
-        'Duration': 'DURATION',
-        'Mileage': 'Mileage'
-    }
-    
-    raw_df = raw_df.rename(columns=column_mapping)
-    raw_df['Driver name'] = ''
-    raw_df['TM NAME'] = ''
-    raw_df['TC NAME'] = ''
-    raw_df['RPT_DT'] = raw_df['Beginning'].apply(extract_date_from_event_time)
-    raw_df['Offense'] = raw_df['Beginning'].apply(determine_offense)
-    
-    target_columns = ['Vehicle no', 'Driver name', 'TM NAME', 'TC NAME', 'Beginning', 'RPT_DT', 
-                      'Initial location', 'End', 'Final location', 'DURATION', 'Mileage', 'Offense']
-    
-    for col in target_columns:
-        if col not in raw_df.columns:
-            raw_df[col] = ''
-    
-    raw_df = raw_df[target_columns]
-    
-    # Remove duplicates
-    if not existing_df.empty and 'Vehicle no' in existing_df.columns and 'Beginning' in existing_df.columns:
-        existing_keys = set(
-            existing_df['Vehicle no'].astype(str) + '|' + existing_df['Beginning'].astype(str)
-        )
-        
-        raw_df['_check_key'] = raw_df['Vehicle no'].astype(str) + '|' + raw_df['Beginning'].astype(str)
-        original_count = len(raw_df)
-        raw_df = raw_df[~raw_df['_check_key'].isin(existing_keys)]
-        raw_df = raw_df.drop(columns=['_check_key'])
-        
-        removed = original_count - len(raw_df)
-        if removed > 0:
-            print(f"    Removed {removed} duplicate rows")
-    
-    return raw_df
+def add_rollups(store, violation_type, spec, prepared_data):
+    """Add the per-truck per-day rollup columns using counts already stored."""
+    if not spec.get("rollups") or prepared_data.empty:
+        return prepared_data
+    _, time_col = spec["key"]
+    dates = format_times(parse_times(prepared_data[time_col]), fmt=DATE_FORMAT, na_value='')
+    return add_daily_rollups(prepared_data, spec, store.daily_counts(violation_type, dates))
 
 
-def append_to_sheet_xlwings(sheet, new_data_df, has_sn=True):
-    """Append data to a sheet using xlwings with formatting preservation.
+def append_sheet(appender, dedupe, stale, store, journal, violation_type, spec, raw_reports_folder,
+                 manifest=None):
+    """Append one raw report to its OVERALL sheet and the violations store.
+    
+    A batch already in the journal (interrupted run) is replayed as
+    recorded instead of being prepared again from the raw report.
     
     Args:
-        sheet: xlwings Sheet object
-        new_data_df: DataFrame to append
-        has_sn: Whether sheet has S/N column (Column A)
+        appender: Open workbook appender
+        dedupe: DedupeIndex of the OVERALL folder
+        stale: Dedupe index does not describe the current workbook
+        store: ViolationStore
+        journal: AppendJournal of this run
+        violation_type: OVERALL_SHEETS key
+        spec: Sheet spec from config.OVERALL_SHEETS
+        raw_reports_folder: Folder containing raw pulled reports
+        manifest: Run manifest of the pull, or None
         
     Returns:
         Number of rows appended
     """
-    if new_data_df.empty:
+    title = spec["title"]
+    print(f"\n📊 Processing {title}...")
+    
+    sheet = find_sheet(appender.sheet_names(), spec)
+    if not sheet:
+        print(f"  ✗ Sheet '{title}' not found")
         return 0
+    
+    print(f"  Using sheet: '{sheet}'")
+    truck_col, time_col = spec["key"]
+    with stage("dedupe", report=violation_type) as st:
+        index = load_sheet_index(dedupe, appender, sheet, truck_col, time_col, stale)
+        for col_letter, number_format in spec.get("formats", {}).items():
+            appender.set_column_format(sheet, col_letter, number_format)
+        
+        journaled = journal.batch(violation_type)
+        if journaled is not None:
+            prepared_data, raw_file, group_name = journaled
+            print(f"  ↻ Replaying journaled batch ({len(prepared_data)} rows)")
+        else:
+            raw_df, raw_file, group_name = load_raw_report(raw_reports_folder, spec, manifest)
+            if raw_df is None:
+                return 0
+            st["rows_in"] = len(raw_df)
+            prepared_data = prepare_sheet_data(raw_df, spec, index)
+            if not prepared_data.empty:
+                prepared_data = add_rollups(store, violation_type, spec, prepared_data)
+            journal.record_batch(violation_type, prepared_data, raw_file, group_name)
+        st["rows_out"] = len(prepared_data)
+    
+    if prepared_data.empty:
+        print("  ℹ No new data to append (all duplicates)")
+        return 0
+    
+    if not journal.is_stored(violation_type):
+        with stage("store", rows_in=len(prepared_data), report=violation_type) as st:
+            stored = store.insert(violation_type, prepared_data, spec, group_name, raw_file)
+            st["rows_out"] = stored
+        journal.mark_stored(violation_type)
+        print(f"    ✓ Stored {stored} new rows")
+    
+    with stage("append", rows_in=len(prepared_data), report=violation_type) as st:
+        appender.ensure_header(sheet, (['SN'] if spec["has_sn"] else []) + list(prepared_data.columns))
+        rows_added = appender.append_rows(sheet, prepared_data, has_sn=spec["has_sn"])
+        index.add(prepared_data[truck_col], prepared_data[time_col])
+        st["rows_out"] = rows_added
+    print(f"    ✓ Appended {rows_added} rows to {sheet}")
+    return rows_added
 
-    last_row = sheet.used_range.last_cell.row
-    style_row = max(2, last_row) if last_row > 1 else 2
-    rows_added = 0
-
-    # ---- S/N logic (ONLY if has_sn=True) ----
-    if has_sn:
-        try:
-            last_sn_value = sheet.range(f'A{last_row}').value
-            if last_sn_value and str(last_sn_value).replace('.0', '').isdigit():
-                start_sn = int(float(last_sn_value)) + 1
-            else:
-                start_sn = last_row
-        except Exception:
-            start_sn = last_row
-    else:
-        start_sn = None
 
-    for _, row_data in new_data_df.iterrows():
-        current_row = last_row + 1 + rows_added
+def _store_gaps(store, dedupe, sheet_names):
+    """Return the titles of sheets holding more keyed rows than the store."""
+    gaps = []
+    for violation_type, spec in get_sheet_specs():
+        sheet = find_sheet(sheet_names, spec)
+        # append_sheet() has loaded the index of every sheet it processed
+        if sheet in dedupe.sheets and store.count(violation_type) < len(dedupe.sheets[sheet]):
+            gaps.append(spec["title"])
+    return gaps
 
-        # ---- Write S/N ONLY if enabled ----
-        start_col = 1
-        if has_sn:
-            sn_cell = sheet.range(f'A{current_row}')
-            sn_cell.value = start_sn + rows_added
-            try:
-                ref_cell = sheet.range(f'A{style_row}')
-                sn_cell.api.Font.Name = ref_cell.api.Font.Name
-                sn_cell.api.Font.Size = ref_cell.api.Font.Size
-                sn_cell.api.Font.Bold = ref_cell.api.Font.Bold
-                sn_cell.number_format = ref_cell.number_format
-            except Exception:
-                pass
-            start_col = 2  # Data starts from column B
 
-        # ---- Write data columns ----
-        for col_idx, col_name in enumerate(new_data_df.columns, start=start_col):
-            value = row_data[col_name]
-            if pd.isna(value):
-                value = ''
+def seed_store(store, dedupe, sheet_names, workbook_path):
+    """Import the workbook's history into the store where it has fewer rows.
 
-            col_letter = xw.utils.col_name(col_idx)
-            cell = sheet.range(f'{col_letter}{current_row}')
-            cell.value = value
+    The summary sheets are built from the store, so a new (or partial)
+    store would otherwise summarise only the rows appended since it was
+    created.
 
-            try:
-                ref_cell = sheet.range(f'{col_letter}{style_row}')
-                cell.api.Font.Name = ref_cell.api.Font.Name
-                cell.api.Font.Size = ref_cell.api.Font.Size
-                cell.api.Font.Bold = ref_cell.api.Font.Bold
-                cell.number_format = ref_cell.number_format
-            except Exception:
-                pass
+    Args:
+        store: ViolationStore
+        dedupe: DedupeIndex of the workbook (row keys per sheet)
+        sheet_names: Sheet names of the workbook
+        workbook_path: Workbook the rows are imported from
 
-        rows_added += 1
+    Returns:
+        True if the store now covers every sheet
+    """
+    gaps = _store_gaps(store, dedupe, sheet_names)
+    if not gaps:
+        return True
+    print(f"ℹ Violations store is missing rows of {', '.join(gaps)}, importing the workbook")
+    import_workbook(store, workbook_path)
+    gaps = _store_gaps(store, dedupe, sheet_names)
+    if gaps:
+        print(f"⚠ Violations store still misses rows of {', '.join(gaps)}")
+    return not gaps
 
-    return rows_added
 
+def store_violations(raw_reports_folder, overall_excel_folder):
+    """Insert pulled violation data into the violations store only.
+    
+    Used when config.OVERALL_WORKBOOK_UPDATE is False; the OVERALL
+    workbook is then exported on demand from the store.
+    
+    Args:
+        raw_reports_folder: Folder containing raw pulled reports
+        overall_excel_folder: Folder holding the violations store
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    print(f"\n{'='*60}")
+    print("STORING VIOLATIONS")
+    print(f"{'='*60}\n")
+    
+    try:
+        manifest = load_run_manifest(raw_reports_folder)
+        with ViolationStore(get_store_path(overall_excel_folder)) as store:
+            for violation_type, spec in get_sheet_specs():
+                print(f"\n📊 Processing {spec['title']}...")
+                raw_df, raw_file, group_name = load_raw_report(raw_reports_folder, spec, manifest)
+                if raw_df is None:
+                    continue
+                prepared_data = prepare_sheet_data(raw_df, spec)
+                prepared_data = add_rollups(store, violation_type, spec, prepared_data)
+                stored = store.insert(violation_type, prepared_data, spec, group_name, raw_file)
+                print(f"    ✓ Stored {stored} new rows ({len(prepared_data) - stored} already stored)")
+        return True
+    except Exception as e:
+        print(f"\n✗ Error storing violations: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
 
 
 def append_violations_to_overall(raw_reports_folder, overall_excel_folder):
-    """Append pulled violation data to OVERALL excel file using xlwings.
+    """Append pulled violation data to OVERALL excel file.
     
     Args:
         raw_reports_folder: Folder containing raw pulled reports
@@ -328,10 +258,16 @@ def append_violations_to_overall(raw_reports_folder, overall_excel_folder):
     Returns:
         bool: True if successful, False otherwise
     """
+    if not OVERALL_WORKBOOK_UPDATE:
+        return store_violations(raw_reports_folder, overall_excel_folder)
+    
     print(f"\n{'='*60}")
     print("APPENDING TO OVERALL VIOLATIONS REPORT")
     print(f"{'='*60}\n")
     
+    journal = AppendJournal(overall_excel_folder)
+    journal.finish_published()
+    
     # Find OVERALL excel file
     overall_path, current_date = find_overall_excel(overall_excel_folder)
     
@@ -344,195 +280,59 @@ def append_violations_to_overall(raw_reports_folder, overall_excel_folder):
     print(f"  Current date in filename: {current_date}\n")
     
     # Create backup
-    backup_folder = os.path.join(overall_excel_folder, "backup")
-    os.makedirs(backup_folder, exist_ok=True)
-    backup_path = os.path.join(backup_folder, os.path.basename(overall_path))
-    shutil.copyfile(overall_path, backup_path)
-    print(f"✓ Created backup in {backup_folder}")  
-
+    backups = WorkbookBackups(overall_excel_folder)
+    backups.snapshot(overall_path)
+    
+    # Update filename date
+    yesterday_date = get_yesterday_date_string()
+    new_filename = f"OVERALL VIOLATIONS REPORT {yesterday_date}.xlsx"
+    new_path = os.path.join(overall_excel_folder, new_filename)
+    manifest = load_run_manifest(raw_reports_folder)
+    if manifest is None:
+        print("ℹ No run manifest in the raw folder, using the newest report files")
+    else:
+        print(f"✓ Run manifest: {manifest['run']} ({len(manifest['reports'])} reports)")
+    journal.begin(overall_path, raw_reports_folder, new_filename,
+                  run_id=manifest["run"] if manifest else None)
     
-    app = None
-    wb = None
+    appender = get_appender()
     
     try:
-        # Open Excel with xlwings
-        print("📖 Opening OVERALL excel with xlwings...")
-        app = xw.App(visible=False, add_book=False)
-        app.display_alerts = False
-        app.screen_updating = False
-        app.enable_events = False
- # Run in background
-        wb = app.books.open(
-            overall_path,
-            update_links=False,
-            read_only=False
-        )
-
-        
-        print(f"Available sheets: {[sheet.name for sheet in wb.sheets]}\n")
+        print(f"📖 Opening OVERALL excel with {appender.name}...")
+        appender.open(overall_path)
+        sheet_names = appender.sheet_names()
         
-        # Process IDLING VIOLATION
-        print("📊 Processing IDLING VIOLATION...")
+        dedupe = DedupeIndex(overall_excel_folder)
+        stale = not dedupe.is_current(overall_path)
+        if stale:
+            print("ℹ Dedupe index does not match this workbook, rebuilding from sheets")
         
-        if "IDLING VIOLATION" not in [sheet.name for sheet in wb.sheets]:
-            print("  ✗ Sheet 'IDLING VIOLATION' not found")
-        else:
-            sheet = wb.sheets["IDLING VIOLATION"]
-            existing_idling = sheet.used_range.options(pd.DataFrame, header=1, index=False).value
-            # Force RPT_DT column to text (column D example)
-            sheet.range("D:D").number_format = "@"
-            # Format Event time column as DateTime
-            sheet.range("C:C").number_format = "yyyy-mm-dd hh:mm:ss"
-            sheet.range("E:E").number_format = "yyyy-mm-dd hh:mm:ss"
-
-
-            print(f"  Current rows: {len(existing_idling) if existing_idling is not None else 0}")
-            
-            idling_files = [f for f in os.listdir(raw_reports_folder) if 'IDLING' in f and f.endswith('.xlsx')]
-            
-            if not idling_files:
-                print("  ⚠ No raw idling report found")
-            else:
-                raw_idling_path = os.path.join(raw_reports_folder, idling_files[0])
-                print(f"  Reading: {idling_files[0]}")
-                
-                raw_idling = pd.read_excel(raw_idling_path, sheet_name='Live Data')
-                print(f"  Raw data rows: {len(raw_idling)}")
-                
-                prepared_data = prepare_idling_data(raw_idling, existing_idling if existing_idling is not None else pd.DataFrame())
-                
-                if prepared_data.empty:
-                    print("  ℹ No new data to append (all duplicates)")
-                else:
-                    rows_added = append_to_sheet_xlwings(sheet, prepared_data)
-                    print(f"    ✓ Appended {rows_added} rows to IDLING VIOLATION")
+        print(f"Available sheets: {sheet_names}\n")
         
-        # Process HARSH BRAKE VIOLATION
-        print("\n📊 Processing HARSH BRAKE VIOLATION...")
-        
-        if "HARSH BRAKE VIOLATION" not in [sheet.name for sheet in wb.sheets]:
-            print("  ✗ Sheet 'HARSH BRAKE VIOLATION' not found")
-        else:
-            sheet = wb.sheets["HARSH BRAKE VIOLATION"]
-            existing_harsh = sheet.used_range.options(pd.DataFrame, header=1, index=False).value
-            # Force RPT_DT column to text (column D example)
-            sheet.range("D:D").number_format = "@"
-            sheet.range("C:C").number_format = "yyyy-mm-dd hh:mm:ss"
-
-            print(f"  Current rows: {len(existing_harsh) if existing_harsh is not None else 0}")
-            
-            harsh_files = [f for f in os.listdir(raw_reports_folder) 
-                          if 'HARSH_BRAKE_SUMMARY' in f and f.endswith('.xlsx')]
+        with ViolationStore(get_store_path(overall_excel_folder)) as store:
+            for violation_type, spec in get_sheet_specs():
+                append_sheet(appender, dedupe, stale, store, journal, violation_type, spec,
+                             raw_reports_folder, manifest)
             
-            if not harsh_files:
-                print("  ⚠ No raw harsh brake report found")
+            print(f"\n📈 Writing summary sheets...")
+            # Summaries cover the workbook's history only if the store does
+            if seed_store(store, dedupe, sheet_names, overall_path):
+                with stage("summaries") as st:
+                    written = write_summaries(appender, store)
+                    st["rows_out"] = sum(written.values())
+                for sheet_name, rows in written.items():
+                    print(f"  ✓ {sheet_name}: {rows} rows")
             else:
-                raw_harsh_path = os.path.join(raw_reports_folder, harsh_files[0])
-                print(f"  Reading: {harsh_files[0]}")
-                
-                raw_harsh = pd.read_excel(raw_harsh_path, sheet_name='Sheet1')
-                print(f"  Raw data rows: {len(raw_harsh)}")
-                
-                prepared_data = prepare_harsh_brake_data(raw_harsh, existing_harsh if existing_harsh is not None else pd.DataFrame())
-                
-                if prepared_data.empty:
-                    print("  ℹ No new data to append (all duplicates)")
-                else:
-                    rows_added = append_to_sheet_xlwings(sheet, prepared_data)
-                    print(f"    ✓ Appended {rows_added} rows to HARSH BRAKE VIOLATION")
-        
-        # Process OVER SPEEDING VIOLATION
-        print("\n📊 Processing OVER SPEEDING VIOLATION...")
-        
-        speed_sheet = None
-        for sheet in wb.sheets:
-            if 'OVER SPEEDING' in sheet.name.upper() or 'OVERSPEED' in sheet.name.upper():
-                speed_sheet = sheet
-                break
+                print("⚠ Summary sheets not updated: their totals would leave out history")
         
-        if not speed_sheet:
-            print("  ✗ Sheet 'OVER SPEEDING VIOLATION' not found")
-        else:
-            print(f"  Using sheet: '{speed_sheet.name}'")
-            existing_speed = speed_sheet.used_range.options(pd.DataFrame, header=1, index=False).value
-            # Force RPT_DT column to text (column D example)
-            speed_sheet.range("D:D").number_format = "@"
-
-            print(f"  Current rows: {len(existing_speed) if existing_speed is not None else 0}")
-            
-            speed_files = [f for f in os.listdir(raw_reports_folder) 
-                          if 'SPEED_VIOLATION' in f and f.endswith('.xlsx')]
-            
-            if not speed_files:
-                print("  ⚠ No raw speed violation report found")
-            else:
-                raw_speed_path = os.path.join(raw_reports_folder, speed_files[0])
-                print(f"  Reading: {speed_files[0]}")
-                
-                raw_speed = pd.read_excel(raw_speed_path, sheet_name='Live Data')
-                print(f"  Raw data rows: {len(raw_speed)}")
-                
-                prepared_data = prepare_speed_data(raw_speed, existing_speed if existing_speed is not None else pd.DataFrame())
-                
-                if prepared_data.empty:
-                    print("  ℹ No new data to append (all duplicates)")
-                else:
-                    rows_added = append_to_sheet_xlwings(speed_sheet, prepared_data)
-                    print(f"    ✓ Appended {rows_added} rows to {speed_sheet.name}")
-        
-        # Process NIGHT DRIVING REPORT
-        print("\n📊 Processing NIGHT DRIVING REPORT...")
-        
-        night_sheet = None
-        for sheet in wb.sheets:
-            if 'NIGHT DRIVING' in sheet.name.upper():
-                night_sheet = sheet
-                break
-        
-        if not night_sheet:
-            print("  ✗ Sheet 'NIGHT DRIVING REPORT' not found")
-        else:
-            print(f"  Using sheet: '{night_sheet.name}'")
-            existing_night = night_sheet.used_range.options(pd.DataFrame, header=1, index=False).value
-            # Force RPT_DT column to text (column D example)
-            night_sheet.range("F:F").number_format = "@"
-            night_sheet.range("J:J").number_format = "@"
-            night_sheet.range("E:E").number_format = "yyyy-mm-dd hh:mm:ss"
-            night_sheet.range("H:H").number_format = "yyyy-mm-dd hh:mm:ss"
-
-
-            print(f"  Current rows: {len(existing_night) if existing_night is not None else 0}")
-            
-            night_files = [f for f in os.listdir(raw_reports_folder) 
-                          if 'NIGHT_DRIVING' in f and f.endswith('.xlsx')]
-            
-            if not night_files:
-                print("  ⚠ No raw night driving report found")
-            else:
-                raw_night_path = os.path.join(raw_reports_folder, night_files[0])
-                print(f"  Reading: {night_files[0]}")
-                
-                raw_night = pd.read_excel(raw_night_path, sheet_name='Live Data')
-                print(f"  Raw data rows: {len(raw_night)}")
-                
-                prepared_data = prepare_night_driving_data(raw_night, existing_night if existing_night is not None else pd.DataFrame())
-                
-                if prepared_data.empty:
-                    print("  ℹ No new data to append (all duplicates)")
-                else:
-                    rows_added = append_to_sheet_xlwings(night_sheet, prepared_data, has_sn=False)
-                    print(f"    ✓ Appended {rows_added} rows to {night_sheet.name}")
-        
-        # Update filename date
-        yesterday_date = get_yesterday_date_string()
-        new_filename = f"OVERALL VIOLATIONS REPORT {yesterday_date}.xlsx"
-        new_path = os.path.join(overall_excel_folder, new_filename)
-        
-        # Save workbook
+        # Save to a temp file and publish it with an atomic rename
         print(f"\n💾 Saving updated OVERALL excel...")
-        wb.save(new_path)
-        wb.close()
-        app.quit()
+        with stage("save") as st:
+            journal.publish(appender, new_path, overall_path)
+            st["bytes_written"] = os.path.getsize(new_path)
+        write_overall_pointer(overall_excel_folder, new_path)
+        appender.close()
+        dedupe.commit(new_path)
         
         print(f"✓ Saved: {new_filename}")
         
@@ -543,6 +343,11 @@ def append_violations_to_overall(raw_reports_folder, overall_excel_folder):
                 print(f"✓ Removed old file: {os.path.basename(overall_path)}")
             except Exception as e:
                 print(f"⚠ Could not remove old file: {e}")
+        journal.clear()
+        
+        removed, _ = backups.prune()
+        if removed:
+            print(f"✓ Pruned {removed} old backup snapshots")
         
         print(f"\n{'='*60}")
         print("✓ OVERALL EXCEL UPDATED SUCCESSFULLY")
@@ -555,24 +360,12 @@ def append_violations_to_overall(raw_reports_folder, overall_excel_folder):
         import traceback
         traceback.print_exc()
         
-        # Clean up xlwings
-        if wb:
-            try:
-                wb.close()
-            except:
-                pass
-        if app:
-            try:
-                app.quit()
-            except:
-                pass
+        appender.close()
         
-        print(f"\n⚠ Restoring from backup...")
-        try:
-            shutil.copyfile(backup_path, overall_path)
-            print(f"✓ Original file restored")
-        except Exception as restore_error:
-            print(f"✗ Failed to restore: {restore_error}")
+        # The workbook is only replaced by the atomic publish, so it is
+        # unchanged; the next run resumes from the journal
+        print(f"\n⚠ {os.path.basename(overall_path)} was not modified")
+        print("  Re-run to resume the append from its journal")
         
         return False
 
@@ -0,0 +1,417 @@
+"""Workbook appender backends for the OVERALL VIOLATIONS REPORT.
+
+Both backends expose the same small interface used by append_to_overall:
+
+    open(path) / sheet_names() / read_sheet(name) / set_column_format(name, letter, fmt)
+    ensure_header(name, columns) / append_rows(name, df, has_sn) / write_sheet(name, df)
+    save(path) / close()
+
+write_sheet() replaces (or adds) a whole static sheet, e.g. the
+summaries. append_rows() writes the new rows as one 2D block and styles them once
+per column from the sheet's last data row (the reference row) through a
+shared named style, instead of copying fonts and number formats cell by
+cell.
+
+- XlwingsAppender drives a local Excel instance (Windows, keeps every
+  workbook feature intact).
+- StreamAppender works on the .xlsx zip parts (xlsx_stream.XlsxPackage):
+  it splices new <row> elements into the sheet XML and copies pivots,
+  charts and external links unchanged, without loading the workbook.
+- OpenpyxlAppender is pure Python and runs headless on Linux. openpyxl
+  does not round-trip charts, pivot tables or x14 data-validation
+  extensions, so it refuses a workbook with charts or pivots unless
+  config.OPENPYXL_ALLOW_FEATURE_LOSS is set.
+"""
+
+import os
+import re
+import sys
+import zipfile
+import subprocess
+
+import pandas as pd
+
+from config import OVERALL_APPEND_BACKEND, OPENPYXL_ALLOW_FEATURE_LOSS
+from xlsx_stream import XlsxPackage
+
+try:
+    import xlwings as xw
+except ImportError:  # Not available on Linux servers
+    xw = None
+
+
+def _frame_rows(df):
+    """Return DataFrame values as a list of row lists with NaN replaced by ''."""
+    values = df.astype(object).where(df.notna(), '')
+    return values.values.tolist()
+
+
+def _column_letter(idx):
+    """Convert a 1-based column index to an Excel column letter."""
+    letters = ''
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _style_name(sheet_name, col_letter):
+    """Name of the shared style for a sheet column."""
+    clean = re.sub(r'[^A-Za-z0-9]+', '_', sheet_name).strip('_')
+    return f"OVERALL_{clean}_{col_letter}"
+
+
+def _missing_header_cells(existing, columns):
+    """Return {col: name} for header positions that are still empty.
+
+    Args:
+        existing: Dict of 1-based column -> current header value
+        columns: Wanted header names from column A
+    """
+    return {
+        col: name for col, name in enumerate(columns, start=1)
+        if existing.get(col) is None or str(existing.get(col)).strip() == ''
+    }
+
+
+def _start_sn(last_sn_value, last_row):
+    """Next S/N after the last row's S/N (falls back to the row number)."""
+    try:
+        if last_sn_value and str(last_sn_value).replace('.0', '').isdigit():
+            return int(float(last_sn_value)) + 1
+    except Exception:
+        pass
+    return last_row
+
+
+class XlwingsAppender:
+    """Append through a hidden Excel instance with bulk range writes."""
+
+    name = "xlwings"
+
+    def __init__(self):
+        self.app = None
+        self.wb = None
+
+    def open(self, path):
+        if os.name == "nt":
+            # A stale hidden Excel instance keeps the workbook locked
+            subprocess.run(
+                ["taskkill", "/f", "/im", "EXCEL.EXE"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        self.app = xw.App(visible=False, add_book=False)
+        self.app.display_alerts = False
+        self.app.screen_updating = False
+        self.app.enable_events = False
+        self.wb = self.app.books.open(path, update_links=False, read_only=False)
+
+    def sheet_names(self):
+        return [sheet.name for sheet in self.wb.sheets]
+
+    def read_sheet(self, name):
+        df = self.wb.sheets[name].used_range.options(pd.DataFrame, header=1, index=False).value
+        if df is None:
+            return pd.DataFrame()
+        df.columns = [str(c).strip() for c in df.columns]
+        return df
+
+    def set_column_format(self, name, col_letter, number_format):
+        self.wb.sheets[name].range(f"{col_letter}:{col_letter}").number_format = number_format
+
+    def ensure_header(self, name, columns):
+        sheet = self.wb.sheets[name]
+        existing = {col: sheet.range((1, col)).value for col in range(1, len(columns) + 1)}
+        for col, text in _missing_header_cells(existing, columns).items():
+            cell = sheet.range((1, col))
+            cell.value = text
+            try:
+                ref = sheet.range((1, col - 1))
+                cell.api.Font.Name = ref.api.Font.Name
+                cell.api.Font.Size = ref.api.Font.Size
+                cell.api.Font.Bold = ref.api.Font.Bold
+            except Exception:
+                pass
+
+    def _named_style(self, sheet, col_letter, style_row):
+        """Reuse the column's workbook style, creating it from the reference cell if missing.
+
+        An existing style is never deleted: Excel would reset every cell
+        already using it (the rows appended on earlier runs) to Normal.
+        """
+        style_name = _style_name(sheet.name, col_letter)
+        try:
+            self.wb.api.Styles(style_name)
+            return style_name
+        except Exception:
+            pass
+        ref = sheet.range(f"{col_letter}{style_row}")
+        self.wb.api.Styles.Add(style_name, ref.api)
+        return style_name
+
+    def append_rows(self, name, df, has_sn=True):
+        if df.empty:
+            return 0
+
+        sheet = self.wb.sheets[name]
+        last_row = sheet.used_range.last_cell.row
+        style_row = max(2, last_row)
+        first_row = last_row + 1
+        end_row = last_row + len(df)
+
+        rows = _frame_rows(df)
+        start_col = 1
+        if has_sn:
+            start_sn = _start_sn(sheet.range(f"A{last_row}").value, last_row)
+            rows = [[start_sn + i] + row for i, row in enumerate(rows)]
+
+        # One COM call for the whole block
+        sheet.range((first_row, start_col)).value = rows
+
+        n_cols = len(rows[0])
+        for col_idx in range(start_col, start_col + n_cols):
+            col_letter = _column_letter(col_idx)
+            block = sheet.range(f"{col_letter}{first_row}:{col_letter}{end_row}")
+            try:
+                block.api.Style = self._named_style(sheet, col_letter, style_row)
+            except Exception:
+                # Fall back to copying the main attributes once per column
+                try:
+                    ref = sheet.range(f"{col_letter}{style_row}")
+                    block.api.Font.Name = ref.api.Font.Name
+                    block.api.Font.Size = ref.api.Font.Size
+                    block.api.Font.Bold = ref.api.Font.Bold
+                    block.number_format = ref.number_format
+                except Exception:
+                    pass
+
+        return len(rows)
+
+    def write_sheet(self, name, df):
+        names = self.sheet_names()
+        if name in names:
+            sheet = self.wb.sheets[name]
+            sheet.clear()
+        else:
+            sheet = self.wb.sheets.add(name, after=self.wb.sheets[names[-1]])
+        sheet.range((1, 1)).value = [list(df.columns)] + _frame_rows(df)
+
+    def save(self, path):
+        self.wb.save(path)
+
+    def close(self):
+        if self.wb:
+            try:
+                self.wb.close()
+            except Exception:
+                pass
+            self.wb = None
+        if self.app:
+            try:
+                self.app.quit()
+            except Exception:
+                pass
+            self.app = None
+
+
+class OpenpyxlAppender:
+    """Append with openpyxl; no Excel installation required."""
+
+    name = "openpyxl"
+
+    # Package parts openpyxl drops or rewrites on save
+    LOSSY_PARTS = {"xl/charts/": "charts", "xl/pivotTables/": "pivot tables",
+                   "xl/pivotCache/": "pivot caches"}
+
+    def __init__(self, allow_feature_loss=None):
+        self.wb = None
+        self.column_formats = {}
+        if allow_feature_loss is None:
+            allow_feature_loss = OPENPYXL_ALLOW_FEATURE_LOSS
+        self.allow_feature_loss = allow_feature_loss
+
+    def open(self, path):
+        import openpyxl
+        import warnings
+
+        with zipfile.ZipFile(path) as z:
+            names = z.namelist()
+        lossy = [what for prefix, what in self.LOSSY_PARTS.items()
+                 if any(n.startswith(prefix) for n in names)]
+        if lossy:
+            if not self.allow_feature_loss:
+                raise RuntimeError(
+                    f"openpyxl backend would not preserve the {', '.join(lossy)} of "
+                    f"{os.path.basename(path)}; use the stream or xlwings backend "
+                    f"(or set OPENPYXL_ALLOW_FEATURE_LOSS = True)")
+            print(f"  ⚠ openpyxl backend: {', '.join(lossy)} in this workbook will not be preserved")
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            self.wb = openpyxl.load_workbook(path, keep_links=True)
+
+    def sheet_names(self):
+        return list(self.wb.sheetnames)
+
+    def read_sheet(self, name):
+        ws = self.wb[name]
+        rows = ws.iter_rows(min_row=1, max_row=ws.max_row, values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        columns = [str(c).strip() if c is not None else '' for c in header]
+        return pd.DataFrame(list(rows), columns=columns)
+
+    def set_column_format(self, name, col_letter, number_format):
+        # Applied to the appended cells of this column
+        self.column_formats[(name, col_letter)] = number_format
+
+    def ensure_header(self, name, columns):
+        from copy import copy
+
+        ws = self.wb[name]
+        existing = {col: ws.cell(row=1, column=col).value for col in range(1, len(columns) + 1)}
+        for col, text in _missing_header_cells(existing, columns).items():
+            cell = ws.cell(row=1, column=col, value=text)
+            if col > 1:
+                cell._style = copy(ws.cell(row=1, column=col - 1)._style)
+
+    def _named_style(self, ws, col_letter, style_row):
+        """Register a NamedStyle copied from the reference cell (once per column)."""
+        from copy import copy
+        from openpyxl.styles import NamedStyle
+
+        style_name = _style_name(ws.title, col_letter)
+        if style_name in self.wb.named_styles:
+            return style_name
+
+        ref = ws[f"{col_letter}{style_row}"]
+        style = NamedStyle(name=style_name)
+        style.font = copy(ref.font)
+        style.fill = copy(ref.fill)
+        style.border = copy(ref.border)
+        style.alignment = copy(ref.alignment)
+        style.protection = copy(ref.protection)
+        style.number_format = self.column_formats.get((ws.title, col_letter), ref.number_format)
+        self.wb.add_named_style(style)
+        return style_name
+
+    def append_rows(self, name, df, has_sn=True):
+        if df.empty:
+            return 0
+
+        ws = self.wb[name]
+        last_row = ws.max_row
+        style_row = max(2, last_row)
+
+        rows = _frame_rows(df)
+        start_col = 1
+        if has_sn:
+            start_sn = _start_sn(ws[f"A{last_row}"].value, last_row)
+            rows = [[start_sn + i] + row for i, row in enumerate(rows)]
+
+        n_cols = len(rows[0])
+        styles = [
+            self._named_style(ws, _column_letter(c), style_row)
+            for c in range(start_col, start_col + n_cols)
+        ]
+
+        for r_offset, row in enumerate(rows, start=1):
+            r = last_row + r_offset
+            for c_offset, value in enumerate(row):
+                cell = ws.cell(row=r, column=start_col + c_offset, value=value)
+                cell.style = styles[c_offset]
+
+        return len(rows)
+
+    def write_sheet(self, name, df):
+        index = None
+        if name in self.wb.sheetnames:
+            index = self.wb.sheetnames.index(name)
+            self.wb.remove(self.wb[name])
+        ws = self.wb.create_sheet(name, index)
+        ws.append(list(df.columns))
+        for row in _frame_rows(df):
+            ws.append(row)
+        ws.freeze_panes = "A2"
+
+    def save(self, path):
+        self.wb.save(path)
+
+    def close(self):
+        if self.wb is not None:
+            self.wb.close()
+            self.wb = None
+
+
+class StreamAppender:
+    """Append by editing the workbook's sheet XML parts in a single pass."""
+
+    name = "stream"
+
+    def __init__(self):
+        self.package = None
+
+    def open(self, path):
+        self.package = XlsxPackage(path)
+
+    def sheet_names(self):
+        return self.package.sheet_names()
+
+    def read_sheet(self, name):
+        return self.package.read_sheet(name)
+
+    def set_column_format(self, name, col_letter, number_format):
+        self.package.set_column_format(name, col_letter, number_format)
+
+    def ensure_header(self, name, columns):
+        _, existing, _ = self.package.header(name)
+        self.package.set_header_cells(name, _missing_header_cells(existing, columns))
+
+    def append_rows(self, name, df, has_sn=True):
+        if df.empty:
+            return 0
+
+        last = self.package.last_row(name)
+        rows = _frame_rows(df)
+        if has_sn:
+            start_sn = _start_sn(last["first_value"], last["row"])
+            rows = [[start_sn + i] + row for i, row in enumerate(rows)]
+        return self.package.append_rows(name, rows)
+
+    def write_sheet(self, name, df):
+        self.package.write_sheet(name, [list(df.columns)] + _frame_rows(df))
+
+    def save(self, path):
+        self.package.save(path)
+
+    def close(self):
+        if self.package is not None:
+            self.package.close()
+            self.package = None
+
+
+def get_appender(backend=None):
+    """Return an appender for the configured backend.
+
+    Args:
+        backend: "xlwings", "stream", "openpyxl" or "auto" (defaults to
+            config.OVERALL_APPEND_BACKEND). "auto" uses xlwings on Windows
+            when it is installed and the stream backend otherwise.
+
+    Returns:
+        Appender instance
+    """
+    backend = backend or OVERALL_APPEND_BACKEND
+    if backend == "auto":
+        backend = "xlwings" if (xw is not None and sys.platform == "win32") else "stream"
+    if backend == "xlwings":
+        if xw is None:
+            raise RuntimeError("xlwings backend requested but xlwings is not installed")
+        return XlwingsAppender()
+    if backend == "stream":
+        return StreamAppender()
+    if backend == "openpyxl":
+        return OpenpyxlAppender()
+    raise ValueError(f"Unknown OVERALL append backend: {backend}")
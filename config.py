@@ -11,6 +11,9 @@ WIALON_RESOURCE_ID = 22504459
 # Default timezone offset for Tanzania (UTC+3)
 TANZANIA_TIMEZONE_OFFSET = 10800  # seconds
 
+# Message Loading Configuration
+MESSAGE_LOAD_LIMIT = 200  # Max messages per messages/load_interval call
+
 # Target Groups
 GROUPS = {
     "TRANSIT_ALL_TRUCKS": "TRANSIT_ALL_TRUCKS",
@@ -67,9 +70,217 @@ TEMPLATES = {
     }
 }
 
-# Excel Output Configuration
+# Pipeline Configuration
+PIPELINE_MAX_WORKERS = 4     # Reports pulled concurrently (one Wialon session each)
+REPORT_DELAY_SECONDS = 1     # Pause after each report on a worker (rate limiting)
+
+# Parallel processing of large frames (see parallel.py)
+PARALLEL_MIN_ROWS = 20000             # Smaller frames are processed in-process
+PARALLEL_WORKERS = None               # Worker processes (None = all cores)
+SHARED_MEMORY_MIN_BYTES = 1024 * 1024  # Buffers below this are pickled in-band
+
+# Night driving location classifier cache (relative to project root)
+LOCATION_CACHE_FILE = "location_cache.json"
+
+# Excel Output Configuration (see report_writers.py)
 EXCEL_SHEET_NAME = "Live Data"
-EXCEL_ENGINE = "openpyxl"
+# "stream" (rows streamed into the sheet XML, constant memory) or
+# "openpyxl" (whole workbook built in memory first)
+EXCEL_ENGINE = "stream"
+
+# Output formats per report type ("default" for the others). The .xlsx
+# report is always written (later stages read it); "csv" and "parquet"
+# (needs pyarrow) add copies with the same name next to it.
+REPORT_OUTPUT_FORMATS = {
+    "default": ["xlsx"],
+    # "SPEED_VIOLATION": ["xlsx", "parquet"],
+}
+
+# OVERALL workbook append backend (see appenders.py):
+# "xlwings" (Excel, Windows), "stream" (edits the sheet XML in the .xlsx
+# package, keeps pivots/charts/links), "openpyxl" (pure Python) or "auto"
+OVERALL_APPEND_BACKEND = "auto"
+# openpyxl drops charts and rewrites pivot tables, so that backend refuses
+# workbooks containing them unless this is True
+OPENPYXL_ALLOW_FEATURE_LOSS = False
+
+# Persistent (truck, timestamp) dedupe index for OVERALL sheets
+# (see dedupe_index.py), stored in this subfolder of the OVERALL folder
+DEDUPE_INDEX_FOLDER = "index"
+DEDUPE_BLOOM_FILTER = True      # Check a Bloom filter (saved with the keys) first
+DEDUPE_BLOOM_BITS_PER_KEY = 10  # ~1% false positives with 4 hash functions
+
+# OVERALL workbook sheets (see sheet_mapping.py). Per sheet:
+#   sheet_match:    Substrings identifying the sheet (upper-case, stripped name)
+#   raw_file/raw_sheet: Raw report file tag and the sheet to read from it
+#   columns:        Raw column -> OVERALL column
+#   derived:        OVERALL column -> (derivation, source column or value)
+#   target_columns: Column order written after the S/N column
+#   key:            (truck column, timestamp column) used for dedupe
+#   location:       Location column (indexed in the violations store)
+#   formats:        Number formats applied to appended cells, by column letter
+#   rollups:        Write DAILY_ROLLUP_COLUMNS after the target columns
+OVERALL_SHEETS = {
+    "IDLING": {
+        "title": "IDLING VIOLATION",
+        "sheet_match": ["IDLING VIOLATION", "IDLING VOLATION"],
+        "raw_file": "IDLING",
+        "raw_sheet": "Live Data",
+        "columns": {
+            'Grouping': 'TRUCK NO',
+            'Count': 'NO OF EVENTS',
+        },
+        "derived": {
+            'RPT_DT': ("date", 'Event time'),
+        },
+        "target_columns": ['TRUCK NO', 'Event time', 'RPT_DT', 'Time received',
+                           'Event text', 'Location', 'NO OF EVENTS'],
+        "key": ('TRUCK NO', 'Event time'),
+        "location": 'Location',
+        "has_sn": True,
+        "formats": {"D": "@", "C": "yyyy-mm-dd hh:mm:ss", "E": "yyyy-mm-dd hh:mm:ss"},
+        "rollups": True,
+    },
+    "HARSH_BRAKE": {
+        "title": "HARSH BRAKE VIOLATION",
+        "sheet_match": ["HARSH BRAKE VIOLATION"],
+        "raw_file": "HARSH_BRAKE_SUMMARY",
+        "raw_sheet": "Sheet1",
+        "columns": {
+            'Grouping': 'Row Labels',
+            'Count': 'Count of Time received',
+        },
+        "derived": {
+            'RPT_DT': ("date", 'Event time'),
+            'DRIVER NAME': ("constant", ''),
+        },
+        "target_columns": ['Row Labels', 'Event time', 'RPT_DT', 'DRIVER NAME',
+                           'Event text', 'Location', 'Count of Time received'],
+        "key": ('Row Labels', 'Event time'),
+        "location": 'Location',
+        "has_sn": True,
+        "formats": {"D": "@", "C": "yyyy-mm-dd hh:mm:ss"},
+        "rollups": True,
+    },
+    "SPEED": {
+        "title": "OVER SPEEDING VIOLATION",
+        "sheet_match": ["OVER SPEEDING", "OVERSPEED"],
+        "raw_file": "SPEED_VIOLATION",
+        "raw_sheet": "Live Data",
+        "columns": {
+            'Grouping': 'TRUCK NO',
+            'Max speed': 'MAX SPEED',
+        },
+        "derived": {
+            'RPT_DT': ("date", 'Time'),
+            'DRIVER NAME': ("constant", ''),
+        },
+        "target_columns": ['TRUCK NO', 'Time', 'RPT_DT', 'DRIVER NAME', 'MAX SPEED',
+                           'Location', 'Speed limit', 'Count'],
+        "key": ('TRUCK NO', 'Time'),
+        "location": 'Location',
+        "has_sn": True,
+        "formats": {"D": "@"},
+        "rollups": True,
+    },
+    "NIGHT_DRIVING": {
+        "title": "NIGHT DRIVING REPORT",
+        "sheet_match": ["NIGHT DRIVING"],
+        "raw_file": "NIGHT_DRIVING",
+        "raw_sheet": "Live Data",
+        "columns": {
+            'Grouping': 'Vehicle no',
+            'Duration': 'DURATION',
+        },
+        "derived": {
+            'Driver name': ("constant", ''),
+            'TM NAME': ("constant", ''),
+            'TC NAME': ("constant", ''),
+            'RPT_DT': ("date", 'Beginning'),
+            'Offense': ("offense", 'Beginning'),
+        },
+        "target_columns": ['Vehicle no', 'Driver name', 'TM NAME', 'TC NAME', 'Beginning', 'RPT_DT',
+                           'Initial location', 'End', 'Final location', 'DURATION', 'Mileage', 'Offense'],
+        "key": ('Vehicle no', 'Beginning'),
+        "location": 'Initial location',
+        "has_sn": False,
+        "formats": {"F": "@", "J": "@", "E": "yyyy-mm-dd hh:mm:ss", "H": "yyyy-mm-dd hh:mm:ss"},
+        "rollups": True,
+    },
+}
+
+# Violations store (see violations_store.py), the source of truth for
+# all appended violations; kept in the OVERALL folder
+VIOLATIONS_DB_FILE = "violations.db"
+# Also append each run to the OVERALL workbook. With False the workbook
+# is only produced on demand: python violations_store.py export ...
+OVERALL_WORKBOOK_UPDATE = True
+
+# Per-truck per-day rollup columns written as values after each sheet's
+# target columns (replaces the COUNTIFS / COUNTIF "Keep/Skip" formulas):
+# rollup -> column header
+DAILY_ROLLUP_COLUMNS = {
+    "events": "EVENTS PER TRUCK DAY",  # violations of this truck on this date
+    "key": "TRUCK DATE KEY",           # "<truck>-<yyyy-mm-dd>"
+    "flag": "FIRST OCCURRENCE",        # "Keep" on the truck-day's first row, else "Skip"
+}
+
+# OVERALL workbook backups (see workbook_backup.py): content-addressed
+# snapshots of the workbook's zip parts in this subfolder of the OVERALL
+# folder. Retention keeps the most recent snapshots plus the newest
+# snapshot of each recent day.
+BACKUP_FOLDER = "backup"
+BACKUP_KEEP_LAST = 10
+BACKUP_KEEP_DAYS = 30
+
+# Run manifests (see run_manifest.py): each pull lists its report files
+# in this subfolder of the raw folder; the OVERALL folder records its
+# current workbook in OVERALL_POINTER_FILE
+RUN_MANIFEST_FOLDER = "manifests"
+OVERALL_POINTER_FILE = "current_workbook.json"
+
+# Raw folder compaction (see raw_compaction.py): runs older than
+# RAW_COMPACT_AFTER_DAYS move into per-month archives in this subfolder
+# of raw/; archives older than RAW_ARCHIVE_KEEP_DAYS are deleted (None
+# keeps them)
+RAW_ARCHIVE_FOLDER = "archive"
+RAW_COMPACT_AFTER_DAYS = 7
+RAW_ARCHIVE_KEEP_DAYS = 365
+
+# Append journal (see append_journal.py): prepared batches and run state
+# of the append in progress, in this subfolder of the OVERALL folder
+APPEND_JOURNAL_FOLDER = "journal"
+
+# Static summary sheets written to the OVERALL workbook on each append
+# (see summaries.py), computed from the store's per-truck per-day counts
+# instead of refreshing pivot caches over all rows: summary -> sheet name.
+# Empty dict disables them.
+OVERALL_SUMMARY_SHEETS = {
+    "type": "SUMMARY BY TYPE",    # violations, trucks and days per type
+    "truck": "SUMMARY BY TRUCK",  # violations per truck and type
+    "day": "SUMMARY BY DAY",      # violations per report date and type
+}
+
+# Offense labels by hour of the night driving Beginning time
+OFFENSE_HOURS = {
+    "Early start": [4, 5],
+    "Night driving": [20, 21, 22, 23],
+}
+
+# Wialon HTTP requests: retries after connection errors (and timeouts of
+# idempotent lookups; report execution is never re-sent after a timeout)
+HTTP_RETRIES = 2
+HTTP_RETRY_BACKOFF_SECONDS = 2  # Doubled after each retry
+
+# Run telemetry (see run_telemetry.py): per-stage report in raw/<folder>/<run>.json
+TELEMETRY_FOLDER = "telemetry"
+# Optional Prometheus text file (node_exporter textfile collector), e.g.
+# r"C:\node_exporter\textfile\wialon_violations.prom"; None disables it
+TELEMETRY_PROMETHEUS_FILE = None
 
 # Debug Configuration
-SAVE_DEBUG_JSON = True  # Save intermediate JSON responses for debugging
\ No newline at end of file
+SAVE_DEBUG_JSON = True  # Save intermediate JSON responses for debugging
+# Captures are written compressed (<report>_<suffix>.json.gz) by a background thread
+DEBUG_JSON_SAMPLE_RATE = 1.0  # Fraction of reports whose responses are captured
+DEBUG_JSON_MAX_BYTES = 20 * 1024 * 1024  # Skip payloads larger than this (compact JSON)
+DEBUG_JSON_QUEUE_SIZE = 16  # Pending captures; further ones are dropped, never waited for
\ No newline at end of file
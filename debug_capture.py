@@ -0,0 +1,135 @@
+"""Debug capture of Wialon responses.
+
+Report responses and row chunks used to be written synchronously as
+indented JSON next to each report, adding seconds of blocking I/O per
+report. save_debug_json() now only queues the payload: a background
+thread serialises it compactly and writes it gzip-compressed as
+<report>_<suffix>.json.gz.
+
+Captures follow config:
+- SAVE_DEBUG_JSON switches debug capture off entirely;
+- DEBUG_JSON_SAMPLE_RATE keeps the captures of that fraction of reports
+  (decided per report path, so a report is captured whole or not at all);
+- DEBUG_JSON_MAX_BYTES skips payloads whose JSON is larger;
+- DEBUG_JSON_QUEUE_SIZE bounds the pending captures; when the writer
+  falls behind, further captures are dropped instead of waited for.
+
+A capture made with required=True is data another stage reads back
+(load_debug_json), not debugging output: it ignores the switches above
+and is written before the call returns.
+"""
+
+import os
+import gzip
+import json
+import zlib
+import queue
+import atexit
+import threading
+
+from config import (SAVE_DEBUG_JSON, DEBUG_JSON_SAMPLE_RATE, DEBUG_JSON_MAX_BYTES,
+                    DEBUG_JSON_QUEUE_SIZE)
+
+EXTENSION = ".json.gz"
+
+_queue = queue.Queue(maxsize=DEBUG_JSON_QUEUE_SIZE)
+_writer = None
+_writer_lock = threading.Lock()
+_dropped = 0
+
+
+def debug_path(output_path, suffix):
+    """Return the capture path of a report output path and suffix."""
+    return output_path.replace(".xlsx", f"_{suffix}{EXTENSION}")
+
+
+def _sampled(output_path):
+    if DEBUG_JSON_SAMPLE_RATE >= 1:
+        return True
+    # Stable per report, so all captures of a report share the decision
+    return zlib.crc32(output_path.encode('utf-8')) / 2 ** 32 < DEBUG_JSON_SAMPLE_RATE
+
+
+def _write(data, path, max_bytes=None):
+    payload = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if max_bytes is not None and len(payload) > max_bytes:
+        print(f"  ℹ Debug capture skipped ({len(payload) / 1e6:.1f} MB): {os.path.basename(path)}")
+        return
+    tmp = path + ".tmp"
+    with gzip.open(tmp, 'wb', compresslevel=5) as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def _run_writer():
+    while True:
+        data, path = _queue.get()
+        try:
+            _write(data, path, DEBUG_JSON_MAX_BYTES)
+        except Exception:
+            pass  # Debug output must never fail a report
+        finally:
+            _queue.task_done()
+
+
+def _ensure_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_run_writer, name="debug-capture", daemon=True)
+            _writer.start()
+
+
+def save_debug_json(data, output_path, suffix, required=False):
+    """Capture a JSON payload next to a report.
+
+    Args:
+        data: JSON-serialisable payload
+        output_path: Report .xlsx path the capture belongs to
+        suffix: Capture name (file is <report>_<suffix>.json.gz)
+        required: Write now and regardless of the debug settings, for
+            payloads read back by another stage
+    """
+    path = debug_path(output_path, suffix)
+    if required:
+        _write(data, path)
+        return
+
+    global _dropped
+    if not SAVE_DEBUG_JSON or not _sampled(output_path):
+        return
+    _ensure_writer()
+    try:
+        _queue.put_nowait((data, path))
+    except queue.Full:
+        _dropped += 1
+
+
+def flush_debug_captures():
+    """Wait until queued captures are written (end of a report node / process)."""
+    global _dropped
+    if _writer is not None and _writer.is_alive():
+        _queue.join()
+    if _dropped:
+        print(f"  ℹ {_dropped} debug captures dropped (writer queue full)")
+        _dropped = 0
+
+
+def load_debug_json(output_path, suffix):
+    """Read a capture back (compressed, or a plain .json from older runs).
+
+    Returns:
+        Parsed JSON, or None if there is no capture
+    """
+    path = debug_path(output_path, suffix)
+    if os.path.exists(path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    legacy = output_path.replace(".xlsx", f"_{suffix}.json")
+    if os.path.exists(legacy):
+        with open(legacy, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None
+
+
+atexit.register(flush_debug_captures)
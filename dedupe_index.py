@@ -0,0 +1,276 @@
+"""Persistent duplicate-check index for the OVERALL workbook sheets.
+
+Each OVERALL sheet is deduplicated on a (truck, timestamp) pair. Instead
+of reading the whole sheet on every run, the pairs already in the sheet
+are kept as 64-bit hashes in a sorted array per sheet (8 bytes per row,
+memory-mapped and searched with np.searchsorted), optionally fronted by
+a Bloom filter so most new keys are rejected without touching the array.
+The filter is saved next to the keys and updated with each append, so
+loading it costs no more than loading the keys; it is only rebuilt when
+it is missing, does not match the keys or has grown past its capacity.
+
+The index records the size and modification time of the workbook it
+describes. If the workbook no longer matches (edited by hand, restored
+from a backup), the index is reported stale and the caller rebuilds it
+from the sheet once.
+
+Keys are normalised before hashing: truck ids are stripped and
+upper-cased, timestamps that parse are rendered as ISO strings, so
+'09.01.2026 06:36:21 am' and '2026-01-09 06:36:21' are the same key.
+"""
+
+import os
+import re
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from config import DEDUPE_INDEX_FOLDER, DEDUPE_BLOOM_FILTER, DEDUPE_BLOOM_BITS_PER_KEY
+from timestamps import parse_times, format_times
+
+MANIFEST_FILE = "index.json"
+BLOOM_HASHES = 4
+BLOOM_MIN_BITS = 1 << 16
+
+
+def normalize_key_parts(trucks, times):
+    """Return normalised truck ids and timestamp texts.
+
+    Args:
+        trucks: Series of truck ids
+        times: Series of timestamps (strings or datetimes)
+
+    Returns:
+        Tuple of (truck string Series, time string Series); times that
+        parse are ISO strings, others keep their stripped text
+    """
+    trucks = pd.Series(trucks).reset_index(drop=True)
+    times = pd.Series(times).reset_index(drop=True)
+
+    truck_text = trucks.astype('string').fillna('').str.strip().str.upper()
+    parsed = parse_times(times)
+    time_text = format_times(parsed, na_value='')
+    unparsed = parsed.isna()
+    if unparsed.any():
+        time_text[unparsed] = times[unparsed].astype('string').fillna('').str.strip()
+
+    return truck_text, time_text.astype('string')
+
+
+def normalize_keys(trucks, times):
+    """Return normalised 'TRUCK|ISO time' key strings.
+
+    Args:
+        trucks: Series of truck ids
+        times: Series of timestamps (strings or datetimes)
+
+    Returns:
+        object Series of key strings
+    """
+    truck_text, time_text = normalize_key_parts(trucks, times)
+    return (truck_text + '|' + time_text).astype(object)
+
+
+def hash_keys(keys):
+    """Hash key strings to a uint64 array (stable across runs and platforms)."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(k.encode('utf-8'), digest_size=8).digest(), 'little')
+         for k in keys),
+        dtype=np.uint64, count=len(keys)
+    )
+
+
+def workbook_stamp(path):
+    """Return (size, mtime_ns) identifying a workbook file version."""
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over uint64 key hashes."""
+
+    def __init__(self, bits):
+        self.bits = np.zeros((max(BLOOM_MIN_BITS, int(bits)) + 7) // 8, dtype=np.uint8)
+        self.size = len(self.bits) * 8
+
+    @classmethod
+    def from_bits(cls, bits):
+        """Wrap the bit array of a saved filter."""
+        bloom = cls.__new__(cls)
+        bloom.bits = bits
+        bloom.size = len(bits) * 8
+        return bloom
+
+    def _positions(self, hashes):
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        return [(h1 + np.uint64(i) * h2) % np.uint64(self.size) for i in range(BLOOM_HASHES)]
+
+    def add(self, hashes):
+        for pos in self._positions(hashes):
+            np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.int64),
+                             (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8)))
+
+    def might_contain(self, hashes):
+        result = np.ones(len(hashes), dtype=bool)
+        for pos in self._positions(hashes):
+            byte = self.bits[(pos >> np.uint64(3)).astype(np.int64)]
+            result &= (byte >> (pos & np.uint64(7)).astype(np.uint8)) & 1 == 1
+        return result
+
+
+class SheetIndex:
+    """Sorted key hashes of one sheet."""
+
+    def __init__(self, hashes=None):
+        self.hashes = np.asarray(hashes if hashes is not None else [], dtype=np.uint64)
+        self.bloom = None
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _build_bloom(self):
+        self.bloom = None
+        if DEDUPE_BLOOM_FILTER:
+            self.bloom = BloomFilter(len(self.hashes) * 2 * DEDUPE_BLOOM_BITS_PER_KEY)
+            self.bloom.add(self.hashes)
+
+    def contains(self, trucks, times):
+        """Return a boolean mask of (truck, time) pairs already in the sheet."""
+        hashes = hash_keys(normalize_keys(trucks, times))
+        result = np.zeros(len(hashes), dtype=bool)
+        if not len(self.hashes) or not len(hashes):
+            return result
+
+        candidates = np.ones(len(hashes), dtype=bool)
+        if self.bloom is not None:
+            candidates = self.bloom.might_contain(hashes)
+        idx = np.flatnonzero(candidates)
+        if len(idx):
+            pos = np.searchsorted(self.hashes, hashes[idx])
+            pos[pos == len(self.hashes)] = 0
+            result[idx] = self.hashes[pos] == hashes[idx]
+        return result
+
+    def add(self, trucks, times):
+        """Add (truck, time) pairs appended to the sheet."""
+        hashes = hash_keys(normalize_keys(trucks, times))
+        if not len(hashes):
+            return
+        self.hashes = np.union1d(self.hashes, hashes).astype(np.uint64)
+        if self.bloom is not None and _bloom_fits(self.bloom, len(self.hashes)):
+            self.bloom.add(hashes)
+        else:
+            self._build_bloom()
+        self.dirty = True
+
+
+def _bloom_fits(bloom, keys):
+    """Return True if a filter is still large enough for this many keys."""
+    return bloom.size >= keys * DEDUPE_BLOOM_BITS_PER_KEY
+
+
+class DedupeIndex:
+    """Per-sheet key indexes stored next to the OVERALL workbook."""
+
+    def __init__(self, overall_folder):
+        self.folder = os.path.join(overall_folder, DEDUPE_INDEX_FOLDER)
+        self.manifest_path = os.path.join(self.folder, MANIFEST_FILE)
+        self.manifest = {"workbook": None, "sheets": {}}
+        self.sheets = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self.manifest = json.load(f)
+            except (OSError, ValueError):
+                print("⚠ Dedupe index manifest unreadable, rebuilding")
+
+    @staticmethod
+    def _file_name(sheet_name, kind="keys"):
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', sheet_name).strip('_').lower()
+        return f"{slug}.{kind}.npy"
+
+    def _load_bloom(self, sheet_name, keys):
+        """Return the saved Bloom filter of a sheet if it matches its keys."""
+        saved = self.manifest.get("blooms", {}).get(sheet_name)
+        if not saved or saved.get("keys") != keys:
+            return None
+        path = os.path.join(self.folder, saved["file"])
+        if not os.path.exists(path):
+            return None
+        # Copy-on-write map: appends set bits without touching the file
+        bloom = BloomFilter.from_bits(np.load(path, mmap_mode='c'))
+        return bloom if _bloom_fits(bloom, keys) else None
+
+    def is_current(self, workbook_path):
+        """Return True if the index describes this exact workbook file."""
+        return self.manifest.get("workbook") == workbook_stamp(workbook_path)
+
+    def has_sheet(self, sheet_name):
+        return sheet_name in self.manifest.get("sheets", {})
+
+    def sheet(self, sheet_name):
+        """Return the SheetIndex for a sheet (loaded on first use)."""
+        if sheet_name in self.sheets:
+            return self.sheets[sheet_name]
+        file_name = self.manifest.get("sheets", {}).get(sheet_name)
+        hashes = None
+        if file_name:
+            path = os.path.join(self.folder, file_name)
+            if os.path.exists(path):
+                hashes = np.load(path, mmap_mode='r')
+        index = SheetIndex(hashes)
+        if DEDUPE_BLOOM_FILTER:
+            index.bloom = self._load_bloom(sheet_name, len(index))
+            if index.bloom is None:
+                index._build_bloom()
+                index.dirty = len(index) > 0  # Save the filter for the next load
+        self.sheets[sheet_name] = index
+        return index
+
+    def rebuild_sheet(self, sheet_name, trucks, times):
+        """Replace a sheet's index with the keys currently in the sheet."""
+        hashes = np.unique(hash_keys(normalize_keys(trucks, times)))
+        index = SheetIndex(hashes)
+        index._build_bloom()
+        index.dirty = True
+        self.sheets[sheet_name] = index
+        return index
+
+    def commit(self, workbook_path):
+        """Write changed sheet indexes and stamp them with the saved workbook."""
+        os.makedirs(self.folder, exist_ok=True)
+        sheets = self.manifest.setdefault("sheets", {})
+        blooms = self.manifest.setdefault("blooms", {})
+        for sheet_name, index in self.sheets.items():
+            if not index.dirty:
+                continue
+            file_name = self._file_name(sheet_name)
+            # Release the memory maps before replacing the files (Windows)
+            index.hashes = np.array(index.hashes)
+            self._save_array(file_name, index.hashes.astype(np.uint64))
+            sheets[sheet_name] = file_name
+            blooms.pop(sheet_name, None)
+            if index.bloom is not None:
+                bloom_file = self._file_name(sheet_name, "bloom")
+                index.bloom.bits = np.array(index.bloom.bits)
+                self._save_array(bloom_file, index.bloom.bits)
+                # The key count ties the filter to the keys it was saved with
+                blooms[sheet_name] = {"file": bloom_file, "keys": len(index)}
+            index.dirty = False
+
+        self.manifest["workbook"] = workbook_stamp(workbook_path)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def _save_array(self, file_name, array):
+        path = os.path.join(self.folder, file_name)
+        tmp = path + ".tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp, path)
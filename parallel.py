@@ -0,0 +1,236 @@
+"""Process-pool execution for CPU-bound report processing.
+
+Large pulls (multi-day backfills, several groups) make the pandas work in
+timestamp conversion and the processors the bottleneck, and under the GIL
+it only ever uses one core. parallelize() wraps a processor so that a
+large frame is split into partitions by unit (all rows of a unit stay in
+one partition), each partition is converted and processed in a worker
+process, and the results are stitched back together in the original order.
+
+Frames are handed to workers with pickle protocol 5. Out-of-band buffers
+(numeric columns, Arrow-backed strings) are placed in shared memory
+instead of being copied through the pool's pipe. String columns without
+Arrow storage would pickle every value in-band, so they are sent as
+categoricals: the integer codes go through shared memory and only the
+distinct values (unit names, addresses, ...) are pickled. Object columns
+with missing or unhashable values are pickled in-band as they are, which
+keeps None and NaN apart. The parent keeps each shared block open until
+its worker is done, which is what Windows requires for the block to stay
+alive. Results come back through the normal pool pickling.
+"""
+
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from config import PARALLEL_MIN_ROWS, PARALLEL_WORKERS, SHARED_MEMORY_MIN_BYTES
+from schemas import resolve_columns, SchemaError
+from timestamps import convert_timestamps_to_tanzania
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared worker process pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PARALLEL_WORKERS or os.cpu_count())
+        return _pool
+
+
+def shutdown_pool():
+    """Stop the worker process pool (if started)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def _encode_strings(df):
+    """Return (frame, [(position, dtype)]) with string columns as categoricals."""
+    encoded = []
+    for pos, dtype in enumerate(df.dtypes):
+        if isinstance(dtype, pd.StringDtype):
+            column = df.iloc[:, pos]
+        elif dtype == object:
+            column = df.iloc[:, pos]
+            if column.isna().any():
+                continue
+        else:
+            continue
+        try:
+            codes, uniques = pd.factorize(column)
+        except TypeError:
+            continue  # Unhashable values (lists, dicts)
+        if not encoded:
+            df = df.copy(deep=False)
+        df.isetitem(pos, pd.Categorical.from_codes(codes, categories=uniques))
+        encoded.append((pos, dtype))
+    return df, encoded
+
+
+def pack_frame(df):
+    """Serialize a DataFrame for a worker, moving large buffers to shared memory.
+
+    Args:
+        df: pandas DataFrame
+
+    Returns:
+        Tuple of (packed dict, list of SharedMemory blocks the caller must
+        keep open until the worker finishes and then release)
+    """
+    df, strings = _encode_strings(df)
+    buffers = []
+    payload = pickle.dumps(df, protocol=5, buffer_callback=buffers.append)
+
+    blocks = []
+    handles = []
+    inline = []
+    for buf in buffers:
+        raw = buf.raw()
+        if raw.nbytes < SHARED_MEMORY_MIN_BYTES:
+            blocks.append(None)
+            inline.append(bytes(raw))
+            continue
+        shm = shared_memory.SharedMemory(create=True, size=raw.nbytes)
+        shm.buf[:raw.nbytes] = raw
+        handles.append(shm)
+        blocks.append((shm.name, raw.nbytes))
+
+    return {"payload": payload, "blocks": blocks, "inline": inline, "strings": strings}, handles
+
+
+def unpack_frame(packed):
+    """Rebuild a DataFrame packed by pack_frame() (in the worker process)."""
+    shms = []
+    buffers = []
+    inline = iter(packed["inline"])
+    try:
+        for block in packed["blocks"]:
+            if block is None:
+                buffers.append(next(inline))
+                continue
+            name, size = block
+            shm = shared_memory.SharedMemory(name=name)
+            shms.append(shm)
+            buffers.append(shm.buf[:size])
+        df = pickle.loads(packed["payload"], buffers=buffers)
+        for pos, dtype in packed["strings"]:
+            df.isetitem(pos, df.iloc[:, pos].astype(dtype))
+        # Detach from shared memory: the blocks cannot be closed while the
+        # unpickled frame or the slices still reference their buffers
+        result = df.copy(deep=True)
+        del df
+        return result
+    finally:
+        for buf in buffers:
+            if isinstance(buf, memoryview):
+                buf.release()
+        buffers.clear()
+        for shm in shms:
+            shm.close()
+
+
+def release_blocks(handles):
+    """Close and unlink shared memory blocks created by pack_frame()."""
+    for shm in handles:
+        try:
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def partition_positions(units, n_parts):
+    """Split row positions into partitions so each unit lands in exactly one.
+
+    Args:
+        units: Series of unit values
+        n_parts: Number of partitions
+
+    Returns:
+        List of non-empty position arrays (original order within each)
+    """
+    # Same key the processors group by (stripped unit text)
+    codes, _ = pd.factorize(units.astype('string').fillna('').str.strip())
+    part = codes % n_parts
+    return [p for p in (np.flatnonzero(part == i) for i in range(n_parts)) if len(p)]
+
+
+def _run_partition(func, packed, template_id, headers, rows, convert):
+    """Worker entry point: convert timestamps and run the processor on one partition."""
+    df = unpack_frame(packed)
+    if convert:
+        df = convert_timestamps_to_tanzania(df)
+    # Processors only read the report rows from the API object
+    api = SimpleNamespace(last_report_headers=headers, last_report_rows=rows)
+    return func(df, template_id, api)
+
+
+def parallelize(func, merge="rows", convert_timestamps=True):
+    """Wrap a processor so large frames are processed on all cores.
+
+    Args:
+        func: Module-level processor_func(df, template_id, api)
+        merge: "rows" for row-wise processors (result keeps the input index,
+            original order restored) or "groups" for per-unit aggregations
+            (results concatenated and ordered by unit)
+        convert_timestamps: Also run the Tanzania timestamp conversion in the
+            workers (execute_report then skips its own conversion)
+
+    Returns:
+        processor_func(df, template_id, api)
+    """
+    def wrapper(df, template_id, api):
+        headers = list(getattr(api, "last_report_headers", None) or [])
+        rows = getattr(api, "last_report_rows", None)
+        if rows is not None and len(rows) != len(df):
+            rows = None
+
+        try:
+            unit_col = resolve_columns(template_id, df.columns).get("unit")
+        except SchemaError:
+            unit_col = None
+
+        if len(df) < PARALLEL_MIN_ROWS or unit_col is None:
+            if convert_timestamps:
+                df = convert_timestamps_to_tanzania(df)
+            return func(df, template_id, api)
+
+        n_parts = PARALLEL_WORKERS or os.cpu_count() or 1
+        parts = partition_positions(df[unit_col], n_parts)
+        print(f"  ⚙ Processing {len(df)} rows in {len(parts)} partitions by '{unit_col}'")
+
+        pool = get_pool()
+        futures = []
+        all_handles = []
+        try:
+            for positions in parts:
+                part_rows = [rows[i] for i in positions] if rows is not None else None
+                packed, handles = pack_frame(df.iloc[positions])
+                all_handles.extend(handles)
+                futures.append(pool.submit(
+                    _run_partition, func, packed, template_id, headers, part_rows, convert_timestamps
+                ))
+            results = [f.result() for f in futures]
+        finally:
+            release_blocks(all_handles)
+
+        merged = pd.concat(results)
+        if merge == "rows":
+            return merged.sort_index(kind="stable")
+        return merged.sort_values(unit_col, kind="stable").reset_index(drop=True)
+
+    wrapper.converts_timestamps = convert_timestamps
+    wrapper.__name__ = getattr(func, "__name__", "processor")
+    wrapper.__doc__ = func.__doc__
+    return wrapper
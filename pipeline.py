@@ -0,0 +1,205 @@
+"""Dependency-aware runner for registered violation reports.
+
+Report nodes come from processors.registry. Each node waits only for the
+nodes whose outputs it declares as inputs; everything else runs at the
+same time on a thread pool (network-bound nodes) or a process pool
+(nodes registered with executor="process").
+
+Every node runs on its own Wialon session: a session holds a single
+report result at a time, so concurrent reports cannot share one.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import processors  # noqa: F401  (imports every processor so it registers)
+from processors.registry import REPORTS, get_reports, report_path
+from config import PIPELINE_MAX_WORKERS, REPORT_DELAY_SECONDS
+from parallel import parallelize, shutdown_pool
+from debug_capture import flush_debug_captures
+from report_writers import report_formats
+from run_telemetry import report_context
+
+
+class PipelineError(RuntimeError):
+    """Raised when the registered reports do not form a valid graph."""
+
+
+def build_graph(specs):
+    """Build node dependencies from input/output declarations.
+
+    Args:
+        specs: List of report spec dicts
+
+    Returns:
+        Dict of node name -> set of node names it depends on
+
+    Raises:
+        PipelineError: If an input has no producer or the graph has a cycle
+    """
+    producers = {}
+    for spec in specs:
+        for out in spec["outputs"]:
+            producers[out] = spec["name"]
+
+    deps = {}
+    for spec in specs:
+        missing = [i for i in spec["inputs"] if i not in producers]
+        if missing:
+            raise PipelineError(f"{spec['name']}: no report produces {missing}")
+        deps[spec["name"]] = {producers[i] for i in spec["inputs"]}
+
+    # Kahn's algorithm, only to reject cycles up front
+    remaining = {name: set(d) for name, d in deps.items()}
+    while remaining:
+        ready = [n for n, d in remaining.items() if not d]
+        if not ready:
+            raise PipelineError(f"Dependency cycle between {sorted(remaining)}")
+        for n in ready:
+            del remaining[n]
+        for d in remaining.values():
+            d.difference_update(ready)
+
+    return deps
+
+
+def run_default_report(spec, context, inputs):
+    """Pull a report's first template and apply its processor."""
+    template_id = spec["template_ids"][0]
+    path = report_path(context, spec["name"])
+    processor = spec["processor"]
+    if processor is not None and spec["parallel"]:
+        processor = parallelize(processor, merge=spec["parallel"])
+    success = context["api"].execute_report(
+        context["group_id"], template_id, path, processor_func=processor,
+        keep_rows=spec["keep_rows"], formats=report_formats(spec["name"])
+    )
+    if success:
+        return [{"type": spec["name"], "path": path, "template_id": template_id}]
+    return []
+
+
+def execute_node(name, context, inputs):
+    """Run one report node on its own Wialon session.
+
+    Module-level so it can be pickled into a process pool.
+
+    Args:
+        name: Registered report name
+        context: Picklable context dict (group_id, group_name, raw_folder, timestamp)
+        inputs: Dict of input output-name -> output dict
+
+    Returns:
+        List of output dicts
+    """
+    from wialon_api import WialonAPI
+
+    spec = REPORTS[name]
+    with report_context(name):
+        api = WialonAPI()
+        if not api.login():
+            print(f"✗ {name}: failed to open a Wialon session")
+            return []
+
+        try:
+            node_context = dict(context, api=api)
+            runner = spec["run"]
+            if runner is None:
+                outputs = run_default_report(spec, node_context, inputs)
+            else:
+                outputs = runner(node_context, inputs)
+            time.sleep(REPORT_DELAY_SECONDS)
+            return outputs or []
+        finally:
+            api.logout()
+            # Process pool workers exit without atexit handlers
+            flush_debug_captures()
+
+
+def run_pipeline(group_id, group_name, raw_folder, timestamp, names=None,
+                 max_workers=None):
+    """Pull all registered reports, running independent nodes concurrently.
+
+    Args:
+        group_id: Wialon group ID
+        group_name: Group name (used in file names)
+        raw_folder: Folder for raw report files
+        timestamp: Run timestamp string (used in file names)
+        names: Optional list of report names to run (their inputs must be included)
+        max_workers: Pool size (defaults to config.PIPELINE_MAX_WORKERS)
+
+    Returns:
+        List of output dicts ({"type", "path", "template_id"}) in registration order
+    """
+    specs = get_reports(names)
+    deps = build_graph(specs)
+    order = [spec["name"] for spec in specs]
+    max_workers = max_workers or PIPELINE_MAX_WORKERS
+
+    context = {
+        "group_id": group_id,
+        "group_name": group_name,
+        "raw_folder": raw_folder,
+        "timestamp": timestamp,
+    }
+
+    outputs = {}      # output name -> output dict
+    node_outputs = {}  # node name -> list of output dicts
+    done = set()
+    failed = set()
+    pending = set(order)
+    running = {}
+
+    pools = {
+        "thread": ThreadPoolExecutor(max_workers=max_workers),
+        "process": None,
+    }
+
+    try:
+        while pending or running:
+            # Skip nodes whose dependencies failed
+            for name in [n for n in pending if deps[n] & failed]:
+                print(f"⚠ Skipping {name}: depends on failed {sorted(deps[name] & failed)}")
+                pending.discard(name)
+                failed.add(name)
+
+            ready = [n for n in order if n in pending and deps[n] <= done]
+            for name in ready:
+                spec = REPORTS[name]
+                kind = spec["executor"]
+                if kind == "process" and pools["process"] is None:
+                    pools["process"] = ProcessPoolExecutor(max_workers=max_workers)
+                pool = pools[kind] or pools["thread"]
+                inputs = {i: outputs[i] for i in spec["inputs"]}
+                print(f"📊 Pulling {name} (template {spec['template_ids']})...")
+                running[pool.submit(execute_node, name, context, inputs)] = name
+                pending.discard(name)
+
+            if not running:
+                break
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"✗ {name} failed: {e}")
+                    result = []
+
+                produced = {r["type"] for r in result}
+                expected = set(REPORTS[name]["outputs"])
+                if expected <= produced:
+                    done.add(name)
+                else:
+                    failed.add(name)
+                node_outputs[name] = result
+                for r in result:
+                    outputs[r["type"]] = r
+    finally:
+        for pool in pools.values():
+            if pool is not None:
+                pool.shutdown(wait=True)
+        shutdown_pool()
+
+    return [r for name in order for r in node_outputs.get(name, [])]
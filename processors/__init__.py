@@ -6,60 +6,25 @@ This package contains individual processors for each type of violation report:
 - idling: Idling violations processor
 - night_driving: Night driving report processor
 
-Each processor module exports:
-- TEMPLATE_ID: The Wialon template ID for the report
-- TEMPLATE_NAME: Human-readable template name
-- process_*(): Processing function that takes (df, template_id, api)
+Each processor module registers its report node(s) with
+processors.registry via register_report(): the template id(s) it pulls,
+its processor function (df, template_id, api), the outputs of other
+reports it needs and the outputs it produces. pipeline.run_pipeline()
+runs every registered report, so a new report type only needs a module
+here and an import below.
 """
 
-from .speed_violation import (
-    TEMPLATE_ID as SPEED_TEMPLATE_ID,
-    TEMPLATE_NAME as SPEED_TEMPLATE_NAME,
-    process_speed_violation
-)
+from .registry import REPORTS, register_report, get_reports, report_path
 
-from .harsh_brake import (
-    SUMMARY_TEMPLATE_ID,
-    DETAIL_TEMPLATE_ID,
-    SUMMARY_TEMPLATE_NAME,
-    DETAIL_TEMPLATE_NAME,
-    process_harsh_brake_detail,
-    merge_harsh_brake_reports
-)
-
-from .idling import (
-    TEMPLATE_ID as IDLING_TEMPLATE_ID,
-    TEMPLATE_NAME as IDLING_TEMPLATE_NAME,
-    process_idling
-)
-
-from .night_driving import (
-    TEMPLATE_ID as NIGHT_TEMPLATE_ID,
-    TEMPLATE_NAME as NIGHT_TEMPLATE_NAME,
-    process_night_driving
-)
+# Importing the processor modules registers their reports
+from . import speed_violation
+from . import idling
+from . import night_driving
+from . import harsh_brake
 
 __all__ = [
-    # Speed violation
-    'SPEED_TEMPLATE_ID',
-    'SPEED_TEMPLATE_NAME',
-    'process_speed_violation',
-    
-    # Harsh brake
-    'SUMMARY_TEMPLATE_ID',
-    'DETAIL_TEMPLATE_ID',
-    'SUMMARY_TEMPLATE_NAME',
-    'DETAIL_TEMPLATE_NAME',
-    'process_harsh_brake_detail',
-    'merge_harsh_brake_reports',
-    
-    # Idling
-    'IDLING_TEMPLATE_ID',
-    'IDLING_TEMPLATE_NAME',
-    'process_idling',
-    
-    # Night driving
-    'NIGHT_TEMPLATE_ID',
-    'NIGHT_TEMPLATE_NAME',
-    'process_night_driving',
-]
\ No newline at end of file
+    'REPORTS',
+    'register_report',
+    'get_reports',
+    'report_path',
+]
@@ -2,47 +2,29 @@
 
 import re
 import pandas as pd
-import json
 import time
 import os
+import shutil
+
+from processors.registry import register_report, report_path
+from schemas import resolve_columns, cast_columns
+from debug_capture import load_debug_json
 
 SUMMARY_TEMPLATE_ID = 89
 DETAIL_TEMPLATE_ID = 41
 
 
-def choose_unit_column(df):
-    """Choose the best unit/vehicle identifier column in a DataFrame."""
-    preferred = ['grouping', 'group', 'vehicle', 'truck', 'name', 'unit']
-    for p in preferred:
-        for c in df.columns:
-            if p in str(c).lower():
-                return c
-    return df.columns[0] if len(df.columns) > 0 else None
-
-
-def find_column(df, keywords):
-    """Find a column containing any of the keywords."""
-    if df is None or df.empty:
-        return None
-    for c in df.columns:
-        lc = str(c).lower()
-        for k in keywords:
-            if k in lc:
-                return c
-    return None
-
-
 def extract_unit_ids_from_json(summary_path):
-    """Extract unit name → unit ID mapping from summary JSON backup."""
+    """Extract unit name → unit ID mapping from the summary's kept rows."""
     unit_name_to_id = {}
 
-    json_path = summary_path.replace('.xlsx', '_rows_debug.json')
-    if not os.path.exists(json_path):
+    rows = load_debug_json(summary_path, "rows")
+    if rows is None:
+        # Runs before the rows were kept: the debug capture of the response
+        rows = load_debug_json(summary_path, "rows_debug")
+    if not isinstance(rows, list):
         return {}
 
-    with open(json_path, 'r', encoding='utf-8') as f:
-        rows = json.load(f)
-
     for row in rows:
         if not isinstance(row, dict) or 'c' not in row:
             continue
@@ -96,11 +78,13 @@ def merge_harsh_brake_reports(summary_path, details_path, dest_path, api):
     s = pd.read_excel(summary_path, sheet_name='Live Data')
     print(f"Summary rows (raw): {len(s)}")
 
-    s_count = find_column(s, ['count', 'cnt', 'total'])
-    s_unit = choose_unit_column(s)
+    # Resolve columns once per header; raises SchemaError if the header changed
+    s_cols = resolve_columns(SUMMARY_TEMPLATE_ID, s.columns)
+    s_count = s_cols["count"]
+    s_unit = s_cols["unit"]
 
     # EARLY FILTER: keep rows with Count >= 3
-    s[s_count] = pd.to_numeric(s[s_count], errors='coerce').fillna(0).astype(int)
+    s = cast_columns(s, SUMMARY_TEMPLATE_ID, s_cols)
     s = s[s[s_count] >= 3].copy()
     print(f"Summary rows after Count>=3 filter: {len(s)}")
 
@@ -131,11 +115,7 @@ def merge_harsh_brake_reports(summary_path, details_path, dest_path, api):
     details_df.to_excel(details_path, index=False)
 
     # Fill Event text in summary using unit_id mapping
-    detail_event_col = None
-    for col in details_df.columns:
-        if 'event' in col.lower() and 'time' not in col.lower():
-            detail_event_col = col
-            break
+    detail_event_col = resolve_columns(DETAIL_TEMPLATE_ID, details_df.columns)["event_text"]
     if detail_event_col is None:
         print("⚠ Could not find Event text column in details! Using first column as fallback.")
         detail_event_col = details_df.columns[0]
@@ -177,7 +157,6 @@ def merge_harsh_brake_reports(summary_path, details_path, dest_path, api):
     print(f"✓ Final summary saved: {dest_path}")
 
     # Cleanup temp folder
-    import shutil
     shutil.rmtree(temp_folder, ignore_errors=True)
 
     return True
@@ -185,4 +164,46 @@ def merge_harsh_brake_reports(summary_path, details_path, dest_path, api):
 
 def process_harsh_brake_detail(df, template_id, api):
     """Placeholder - not used in this workflow."""
-    return df
\ No newline at end of file
+    return df
+
+
+def run_harsh_brake_merge(context, inputs):
+    """Pipeline runner: pull per-unit details for the summary and consolidate.
+
+    Args:
+        context: Pipeline context dict (api, raw_folder, group_name, timestamp)
+        inputs: Dict with the HARSH_BRAKE_SUMMARY output
+
+    Returns:
+        List of output dicts (detail and consolidated files)
+    """
+    summary_path = inputs["HARSH_BRAKE_SUMMARY"]["path"]
+    details_path = report_path(context, "HARSH_BRAKE_DETAIL")
+    consolidated_path = report_path(context, "HARSH_BRAKE_CONSOLIDATED")
+
+    print("  → Extracting units and pulling detailed reports...")
+    if not merge_harsh_brake_reports(summary_path, details_path, consolidated_path, api=context["api"]):
+        return []
+
+    try:
+        shutil.copyfile(consolidated_path, summary_path)
+        print(f"  ✓ Updated summary file with enriched data")
+    except Exception as e:
+        print(f"  ⚠ Could not overwrite summary: {e}")
+
+    return [
+        {"type": "HARSH_BRAKE_DETAIL", "path": details_path, "template_id": DETAIL_TEMPLATE_ID},
+        {"type": "HARSH_BRAKE_CONSOLIDATED", "path": consolidated_path,
+         "template_id": f"{SUMMARY_TEMPLATE_ID}+{DETAIL_TEMPLATE_ID}"},
+    ]
+
+
+# The detail node reads the unit ids from the summary's raw rows
+register_report("HARSH_BRAKE_SUMMARY", SUMMARY_TEMPLATE_ID, keep_rows=True)
+register_report(
+    "HARSH_BRAKE_DETAIL",
+    DETAIL_TEMPLATE_ID,
+    inputs=["HARSH_BRAKE_SUMMARY"],
+    outputs=["HARSH_BRAKE_DETAIL", "HARSH_BRAKE_CONSOLIDATED"],
+    run=run_harsh_brake_merge,
+)
@@ -1,96 +1,79 @@
 """Idling report processor."""
 
-import pandas as pd
+import re
+
+from config import TEMPLATES
+from processors.registry import register_report
+from schemas import resolve_columns
 
 
 TEMPLATE_ID = 11
 TEMPLATE_NAME = "01_RPT_IDLING VIOLATIONS REPORT (GROUP)"
 
+EXCLUDE_COUNTS = TEMPLATES["IDLING"]["exclude_counts"]
+
+# Values treated as empty when picking the first value per unit
+EMPTY_MARKERS = ['nan', 'none']
+
+HTML_ENTITIES = {'&gt;': '>', '&lt;': '<', '&amp;': '&'}
+HTML_ENTITY_PATTERN = re.compile('|'.join(HTML_ENTITIES))
+
 
-def choose_unit_column(df):
-    """Choose the best unit/vehicle identifier column from DataFrame."""
-    candidates = ['unit', 'vehicle', 'truck', 'name', 'group', 'grouping', '№']
-    for cand in candidates:
-        for c in df.columns:
-            if cand in str(c).lower():
-                return c
-    for c in df.columns:
-        sample = df[c].dropna().astype(str).head(20)
-        if sample.empty:
-            continue
-        non_numeric = sum(1 for v in sample if any(ch.isalpha() for ch in v))
-        if non_numeric > len(sample) * 0.5:
-            return c
-    return df.columns[0]
+def mask_empty_strings(df):
+    """Return stripped string copies of all columns with empty/'nan'/'none' values as NA."""
+    text = df.astype('string').apply(lambda col: col.str.strip())
+    lowered = text.apply(lambda col: col.str.lower())
+    return text.mask((text == '') | lowered.isin(EMPTY_MARKERS))
 
 
-def first_non_empty(series):
-    """Return first non-empty value from a pandas Series."""
-    for v in series:
-        if pd.notna(v) and str(v).strip() and str(v).strip().lower() not in ('nan', 'none'):
-            return str(v).strip()
-    return ''
+def unescape_html_entities(series):
+    """Replace &gt; &lt; and &amp; entities in one vectorized pass."""
+    return series.astype(str).str.replace(
+        HTML_ENTITY_PATTERN, lambda m: HTML_ENTITIES[m.group(0)], regex=True
+    )
 
 
 def process_idling(df, template_id, api):
     """Process idling report DataFrame.
     
     - Keeps time format as YYYY-MM-DD HH:MM:SS
-    - Filters Count=1,2 (keeps >=3)
+    - Filters Count values listed in config.TEMPLATES["IDLING"]["exclude_counts"] (1, 2)
     - Replaces =&gt; with =>
     """
     if int(template_id) != TEMPLATE_ID:
         return df
     
+    # Resolve columns once per header; raises SchemaError if the header changed
+    cols = resolve_columns(TEMPLATE_ID, df.columns)
+    
     try:
-        unit_col = choose_unit_column(df)
-        if unit_col is None:
-            unit_col = df.columns[0]
-        
-        event_col = None
-        for cand in ['Event text', 'Notification text', 'Event type', 'Event']:
-            for c in df.columns:
-                if cand.lower() == str(c).lower():
-                    event_col = c
-                    break
-            if event_col:
-                break
-        
-        if event_col is None:
-            for c in df.columns:
-                lc = str(c).lower()
-                if 'text' in lc or 'message' in lc or 'notification' in lc or 'event' in lc:
-                    event_col = c
-                    break
+        unit_col = cols["unit"]
+        event_col = cols["event_text"]
+        event_type_col = cols["event_type"]
         
         if event_col is None:
             df['Event text'] = ''
             event_col = 'Event text'
         
-        df['_unit_str'] = df[unit_col].astype(str).fillna('').map(lambda x: x.strip())
-        counts = df['_unit_str'].value_counts().to_dict()
-        
-        event_type_col = None
-        for c in df.columns:
-            lc = str(c).lower()
-            if 'event type' in lc or lc.replace(' ', '') == 'eventtype':
-                event_type_col = c
-                break
+        df['_unit_str'] = df[unit_col].astype(str).fillna('').str.strip()
         
         cols_to_agg = [c for c in list(df.columns) if c not in ('_unit_str',)]
         if event_type_col is not None and event_type_col in cols_to_agg:
             cols_to_agg.remove(event_type_col)
         
-        agg_funcs = {c: first_non_empty for c in cols_to_agg}
-        grouped = df.groupby('_unit_str').agg(agg_funcs).reset_index()
+        # First non-empty value per unit and column, plus event count per unit
+        values = mask_empty_strings(df[cols_to_agg])
+        values['_unit_str'] = df['_unit_str']
+        by_unit = values.groupby('_unit_str')
+        grouped = by_unit.first().fillna('').astype(str)
+        grouped['Count'] = by_unit.size().astype(int)
+        grouped = grouped.reset_index()
         
         try:
             grouped[unit_col] = grouped['_unit_str']
         except Exception:
             pass
         
-        grouped['Count'] = grouped[unit_col].map(lambda u: int(counts.get(u, 0)))
-        
         original_cols = [c for c in list(df.columns) if c not in ('_unit_str',)]
         if event_type_col is not None and event_type_col in original_cols:
             original_cols = [c for c in original_cols if c != event_type_col]
@@ -110,22 +93,19 @@ def process_idling(df, template_id, api):
         if 'Count' not in final_cols:
             final_cols.append('Count')
         
-        # Filter: Remove Count=1,2 (keep >=3)
+        # Filter: Remove excluded counts (Count=1,2 by default)
         try:
             if 'Count' in grouped.columns:
                 original_count = len(grouped)
-                grouped = grouped[grouped['Count'] >= 3]
-                print(f"  Filtered idling: {original_count} -> {len(grouped)} rows (kept Count>=3)")
+                grouped = grouped[~grouped['Count'].isin(EXCLUDE_COUNTS)]
+                print(f"  Filtered idling: {original_count} -> {len(grouped)} rows (removed Count in {EXCLUDE_COUNTS})")
         except Exception:
             pass
         
-        # Replace =&gt; with => in Event text column
+        # Unescape HTML entities (=&gt; -> =>) in Event text column
         try:
             if event_col in grouped.columns:
-                grouped[event_col] = grouped[event_col].astype(str).str.replace('=&gt;', '=>', regex=False)
-                grouped[event_col] = grouped[event_col].str.replace('&gt;', '>', regex=False)
-                grouped[event_col] = grouped[event_col].str.replace('&lt;', '<', regex=False)
-                grouped[event_col] = grouped[event_col].str.replace('&amp;', '&', regex=False)
+                grouped[event_col] = unescape_html_entities(grouped[event_col])
         except Exception:
             pass
         
@@ -140,4 +120,7 @@ def process_idling(df, template_id, api):
         print(f"  Warning: Idling processing failed: {e}")
         import traceback
         traceback.print_exc()
-        return df
\ No newline at end of file
+        return df
+
+
+register_report("IDLING", TEMPLATE_ID, processor=process_idling, parallel="groups")
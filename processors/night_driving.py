@@ -1,7 +1,17 @@
 """Night driving report processor."""
 
+import os
+import re
+import json
+import hashlib
+import tempfile
+import numpy as np
 import pandas as pd
-import pytz
+
+from config import TEMPLATES, LOCATION_CACHE_FILE
+from processors.registry import register_report
+from schemas import resolve_columns
+from timestamps import parse_times, to_tanzania, format_times
 
 
 TEMPLATE_ID = 6
@@ -28,35 +38,164 @@ BORDER_LOCATIONS = [
 LOCATION_KEYWORDS = ['PARKING', 'MINE', 'MINES']
 
 
-def get_tanzania_timezone():
-    """Returns Tanzania timezone object (UTC+3)."""
-    return pytz.timezone('Africa/Dar_es_Salaam')
+def load_time_windows(template_config):
+    """Build (start, end) minute-of-day pairs from a template's *_window entries.
+
+    Args:
+        template_config: Template dict from config.TEMPLATES
+
+    Returns:
+        List of (start_minute, end_minute) tuples, both ends inclusive
+    """
+    windows = []
+    for key, window in template_config.items():
+        if not key.endswith('_window'):
+            continue
+        start = window['start']['hour'] * 60 + window['start']['minute']
+        end = window['end']['hour'] * 60 + window['end']['minute']
+        windows.append((start, end))
+    return windows
+
+
+NIGHT_WINDOWS = load_time_windows(TEMPLATES["NIGHT_DRIVING"])
+
+
+def minute_of_day(times):
+    """Return minute-of-day (0-1439) for a datetime Series as a float array (NaN for NaT)."""
+    minutes = times.dt.hour * 60 + times.dt.minute
+    return minutes.to_numpy(dtype=float, na_value=np.nan)
+
+
+def in_time_windows(minutes, windows):
+    """Test minute-of-day values against inclusive windows.
+
+    A window whose start is after its end crosses midnight
+    (e.g. 22:00-02:00). NaN minutes never match.
+
+    Args:
+        minutes: numpy array of minute-of-day values
+        windows: List of (start_minute, end_minute) tuples
+
+    Returns:
+        Boolean numpy array
+    """
+    mask = np.zeros(len(minutes), dtype=bool)
+    for start, end in windows:
+        if start <= end:
+            mask |= (minutes >= start) & (minutes <= end)
+        else:
+            mask |= (minutes >= start) | (minutes <= end)
+    return mask
+
+
+# One alternation over every border name and keyword; the named group of
+# the leftmost match gives the location class.
+LOCATION_PATTERN = re.compile(
+    '(?P<border>' + '|'.join(re.escape(b.upper()) for b in BORDER_LOCATIONS) + ')'
+    '|(?P<keyword>' + '|'.join(re.escape(k.upper()) for k in LOCATION_KEYWORDS) + ')'
+)
+
+# Persistent location -> class cache, invalidated when the lists change
+LOCATION_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), LOCATION_CACHE_FILE)
+LOCATION_CACHE_SIGNATURE = hashlib.sha1(LOCATION_PATTERN.pattern.encode('utf-8')).hexdigest()
+
+_location_cache = None
+
+
+def load_location_cache(path=LOCATION_CACHE_PATH):
+    """Load the location class cache from disk (once per process)."""
+    global _location_cache
+    if _location_cache is not None:
+        return _location_cache
+    _location_cache = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('signature') == LOCATION_CACHE_SIGNATURE:
+            _location_cache = dict(data.get('classes') or {})
+    except (OSError, ValueError):
+        pass
+    return _location_cache
+
+
+def save_location_cache(path=LOCATION_CACHE_PATH):
+    """Write the location class cache atomically.
+
+    Parallel workers save concurrently: entries already on disk are
+    merged in, and each process writes its own temporary file.
+    """
+    if _location_cache is None:
+        return
+    classes = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('signature') == LOCATION_CACHE_SIGNATURE:
+            classes = dict(data.get('classes') or {})
+    except (OSError, ValueError):
+        pass
+    classes.update(_location_cache)
+
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix='.location-cache-', suffix='.tmp',
+                                        dir=os.path.dirname(path) or '.')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'signature': LOCATION_CACHE_SIGNATURE, 'classes': classes}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"  ⚠ Could not save location cache: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def classify_location(location_upper):
+    """Return 'border', 'keyword' or '' for an upper-cased location string."""
+    m = LOCATION_PATTERN.search(location_upper)
+    return m.lastgroup if m else ''
+
+
+def classify_locations(series):
+    """Classify a Series of locations, evaluating each distinct value once.
+
+    Args:
+        series: pandas Series of location strings
+
+    Returns:
+        numpy array of classes ('border', 'keyword' or '')
+    """
+    normalized = series.astype('string').str.upper().str.strip()
+    codes, uniques = pd.factorize(normalized)
+
+    cache = load_location_cache()
+    classes = []
+    misses = 0
+    for loc in uniques:
+        cls = cache.get(loc)
+        if cls is None:
+            cls = classify_location(loc)
+            cache[loc] = cls
+            misses += 1
+        classes.append(cls)
+    if misses:
+        save_location_cache()
+
+    lookup = np.array(classes + [''], dtype=object)
+    return lookup[codes]  # code -1 (missing) maps to the trailing ''
 
 
 def is_relevant_location(location_str):
     """Check if location matches our criteria (borders, parking, mines)."""
     if pd.isna(location_str):
         return False
-    
-    location_upper = str(location_str).upper().strip()
-    
-    # Check exact matches with border locations
-    for border in BORDER_LOCATIONS:
-        if border.upper() in location_upper:
-            return True
-    
-    # Check for keywords (PARKING, MINE, MINES)
-    for keyword in LOCATION_KEYWORDS:
-        if keyword in location_upper:
-            return True
-    
-    return False
+    return classify_location(str(location_str).upper().strip()) != ''
 
 
 def process_night_driving(df, template_id, api):
     """Process night driving report DataFrame.
     
-    - Filters by time windows (20:30-23:59 or 04:30-05:40)
+    - Filters by the night windows in config.TEMPLATES["NIGHT_DRIVING"]
+      (20:30-23:59 or 04:30-05:40 by default)
     - Filters by location (borders, parking, mines)
     - Removes unwanted columns (Off-time next, Max speed, Driver)
     
@@ -71,122 +210,44 @@ def process_night_driving(df, template_id, api):
     if int(template_id) != TEMPLATE_ID:
         return df
     
+    # Resolve columns once per header; raises SchemaError if the header changed
+    cols = resolve_columns(TEMPLATE_ID, df.columns)
+    bcol = cols["begin"]
+    end_cols = cols["end"]
+    location_col = cols["location"]
+    
     try:
         # Debug: Print all columns
         print(f"\n  📋 Night Driving Report Columns:")
         for i, col in enumerate(df.columns):
             print(f"    [{i}] '{col}'")
         
-        tz_tz = get_tanzania_timezone()
-        
-        # Find Begin and End columns
-        begin_cols = []
-        end_cols = []
-        
-        for col in list(df.columns):
-            lc = str(col).lower()
-            if 'begin' in lc or 'start' in lc or lc == 'beginning':
-                begin_cols.append(col)
-            if 'end' in lc or 'finish' in lc:
-                end_cols.append(col)
-        
         # Format End columns
         for col in end_cols:
             try:
-                parsed_end = pd.to_datetime(df[col], errors='coerce', dayfirst=False)
-                if parsed_end.isna().all():
-                    parsed_end = pd.to_datetime(df[col], errors='coerce', dayfirst=True)
-                
-                def format_end(x):
-                    if pd.isna(x):
-                        return ''
-                    if getattr(x, 'tzinfo', None) is None:
-                        return (x + pd.Timedelta(hours=3)).strftime('%Y-%m-%d %H:%M:%S')
-                    else:
-                        return x.tz_convert(tz_tz).strftime('%Y-%m-%d %H:%M:%S')
-                
-                df[col] = parsed_end.apply(lambda x: format_end(x) if not pd.isna(x) else '')
+                parsed_end = to_tanzania(parse_times(df[col]))
+                df[col] = format_times(parsed_end, na_value='')
             except Exception:
                 pass
         
         # Process Begin column and filter by time
-        if begin_cols:
-            bcol = begin_cols[0]
-            
+        if bcol:
             try:
-                parsed_begin = pd.to_datetime(df[bcol], errors='coerce', dayfirst=False)
-                if parsed_begin.isna().all():
-                    parsed_begin = pd.to_datetime(df[bcol], errors='coerce', dayfirst=True)
-                
-                # Apply timezone correction
-                def format_begin(x):
-                    if pd.isna(x):
-                        return pd.NaT
-                    if getattr(x, 'tzinfo', None) is None:
-                        return x + pd.Timedelta(hours=3)
-                    else:
-                        return x.tz_convert(tz_tz)
-                
-                parsed_fixed = parsed_begin.apply(lambda x: format_begin(x) if not pd.isna(x) else pd.NaT)
-
-                # Filter: keep if time is between 20:30-23:59 OR 04:30-05:40
-                def is_night_time(dt):
-                    if pd.isna(dt):
-                        return False
-                    hh = dt.hour
-                    mm = dt.minute
-                    
-                    # Evening window (20:30-23:59)
-                    if hh > 20 and hh <= 23:
-                        return True
-                    if hh == 20 and mm >= 30:
-                        return True
-                    
-                    # Morning window (04:30-05:40)
-                    if hh == 4 and mm >= 30:
-                        return True
-                    if hh == 5 and mm <= 40:
-                        return True
-                    
-                    return False
-
-                time_mask = parsed_fixed.apply(is_night_time)
+                parsed_fixed = to_tanzania(parse_times(df[bcol]))
+
+                # Filter: keep rows that begin inside any configured night window
+                time_mask = in_time_windows(minute_of_day(parsed_fixed), NIGHT_WINDOWS)
                 original_count = len(df)
-                df = df[time_mask.fillna(False)].copy()
+                df = df[time_mask].copy()
                 
                 print(f"  ✓ Time filtered: {original_count} -> {len(df)} rows (night windows)")
 
                 # Format the begin column to ISO string
-                def to_iso_str(x):
-                    if pd.isna(x):
-                        return ''
-                    return x.strftime('%Y-%m-%d %H:%M:%S')
-                
-                df[bcol] = parsed_fixed[time_mask].apply(to_iso_str).values
+                df[bcol] = format_times(parsed_fixed[time_mask], na_value='').values
             except Exception as e:
                 print(f"  ⚠ Warning: Time filtering failed: {e}")
         
-        # Filter by Initial location - MORE FLEXIBLE SEARCH
-        location_col = None
-        
-        # Try to find location column with various patterns
-        for col in df.columns:
-            col_lower = str(col).lower().strip()
-            # Check for various location column names
-            if any(keyword in col_lower for keyword in [
-                'initial location',
-                'initial_location', 
-                'location',
-                'begin location',
-                'start location',
-                'place',
-                'address'
-            ]):
-                # Avoid time/date columns
-                if 'time' not in col_lower and 'date' not in col_lower:
-                    location_col = col
-                    break
-        
+        # Filter by Initial location
         if location_col:
             print(f"  📍 Using location column: '{location_col}'")
             
@@ -198,7 +259,7 @@ def process_night_driving(df, template_id, api):
                     print(f"    - {loc}")
             
             before_location = len(df)
-            df['_location_match'] = df[location_col].apply(is_relevant_location)
+            df['_location_match'] = classify_locations(df[location_col]) != ''
             
             # Show how many matched
             matched_count = df['_location_match'].sum()
@@ -239,4 +300,7 @@ def process_night_driving(df, template_id, api):
         import traceback
         traceback.print_exc()
     
-    return df
\ No newline at end of file
+    return df
+
+
+register_report("NIGHT_DRIVING", TEMPLATE_ID, processor=process_night_driving, parallel="rows")
@@ -0,0 +1,90 @@
+"""Report registry used by the pipeline runner.
+
+Each processor module registers the report node(s) it provides. A node
+declares the Wialon template id(s) it pulls, the outputs of other nodes
+it needs (inputs) and the outputs it produces. The pipeline runner
+(pipeline.py) builds a dependency graph from these declarations, so a
+new report type only has to register itself to be pulled, and it runs
+in parallel with every node it does not depend on.
+"""
+
+import os
+
+# name -> report spec, in registration order
+REPORTS = {}
+
+
+def register_report(name, template_ids, processor=None, inputs=(), outputs=None,
+                    run=None, executor="thread", parallel=None, keep_rows=False):
+    """Register a report node.
+
+    Args:
+        name: Report type name (also the default output name and file tag)
+        template_ids: Wialon template id(s) the node pulls
+        processor: Optional processor_func(df, template_id, api) applied by
+            the default runner
+        inputs: Output names this node needs before it can run
+        outputs: Output names this node produces (defaults to [name])
+        run: Optional custom runner run(context, inputs) -> list of output
+            dicts ({"type", "path", "template_id"}); the default pulls the
+            first template with execute_report()
+        executor: "thread" for network-bound nodes, "process" for
+            CPU-bound processing
+        parallel: Optional merge mode ("rows" or "groups") allowing the
+            default runner to split large frames by unit and run the
+            processor on all cores (see parallel.parallelize)
+        keep_rows: Have the default runner keep the report's raw rows
+            (<file>_rows.json.gz) for nodes that read them back
+
+    Returns:
+        The registered spec dict
+    """
+    if isinstance(template_ids, int):
+        template_ids = [template_ids]
+    spec = {
+        "name": name,
+        "template_ids": list(template_ids),
+        "processor": processor,
+        "inputs": list(inputs),
+        "outputs": list(outputs) if outputs else [name],
+        "run": run,
+        "executor": executor,
+        "parallel": parallel,
+        "keep_rows": keep_rows,
+    }
+    # Re-registration (module imported under two names) replaces the entry
+    REPORTS[name] = spec
+    return spec
+
+
+def get_reports(names=None):
+    """Return registered report specs in registration order.
+
+    Args:
+        names: Optional iterable of report names to select
+
+    Returns:
+        List of spec dicts
+    """
+    if names is None:
+        return list(REPORTS.values())
+    missing = [n for n in names if n not in REPORTS]
+    if missing:
+        raise KeyError(f"Unknown report type(s): {missing}")
+    return [spec for name, spec in REPORTS.items() if name in set(names)]
+
+
+def report_path(context, tag):
+    """Return the raw output path for a report tag in this run.
+
+    Args:
+        context: Pipeline context dict (raw_folder, group_name, timestamp)
+        tag: Report tag such as "SPEED_VIOLATION"
+
+    Returns:
+        Path like raw/{GROUP}_{TAG}_{TIMESTAMP}.xlsx
+    """
+    return os.path.join(
+        context["raw_folder"],
+        f"{context['group_name']}_{tag}_{context['timestamp']}.xlsx"
+    )
@@ -1,156 +1,174 @@
 """Speed violation report processor."""
 
 import re
+import logging
+import numpy as np
 import pandas as pd
-import json
-import os
-import glob
-from datetime import datetime, timedelta
+
+from config import TEMPLATES
+from processors.registry import register_report
+from schemas import resolve_columns
+from timestamps import parse_times, to_tanzania, format_times
 
 TEMPLATE_ID = 3
 TEMPLATE_NAME = "01_80 KPH_RPT_SPEED VIOLATION REPORT"
 
+MIN_SPEED_THRESHOLD = TEMPLATES["SPEED_VIOLATION"]["min_speed_threshold"]
+
+# First number in a cell such as "92 km/h" or "92,5 kph"
+SPEED_NUMBER_PATTERN = re.compile(r"([-+]?[0-9]*\.?[0-9]+)")
+
+OUTPUT_TIME_FORMAT = '%d.%m.%Y %I:%M:%S %p'
+
+logger = logging.getLogger(__name__)
+
+
+def extract_speed_numeric(series):
+    """Extract numeric speed values from a Series of speed strings.
+
+    Args:
+        series: pandas Series such as "92 km/h"
+
+    Returns:
+        Float Series (NaN where no number was found)
+    """
+    text = series.astype('string').str.replace(',', '.', regex=False)
+    return pd.to_numeric(text.str.extract(SPEED_NUMBER_PATTERN, expand=False), errors='coerce')
+
+
+def format_datetime_column(series, col_name=''):
+    """Format a time column as DD.MM.YYYY hh:mm:ss am/pm, leaving unparsed values untouched."""
+    parsed = parse_times(series)
+    mask = parsed.notna()
 
-def find_latest_speed_json(folder):
-    """Return the latest SPEED_VIOLATION JSON file in the folder."""
-    pattern = os.path.join(folder, "*SPEED_VIOLATION*_debug.json")
-    files = glob.glob(pattern)
-    if not files:
-        print(f"⚠ No SPEED_VIOLATION JSON found in {folder}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Datetime column %r sample raw values: %s", col_name, series.head(10).to_list())
+        if (~mask).any():
+            logger.debug("Unparsed values in %r:\n%s", col_name, series[~mask])
+        logger.debug("Parsed: %d | Failed: %d", mask.sum(), (~mask).sum())
+
+    formatted = format_times(parsed, OUTPUT_TIME_FORMAT).str.lower()
+    return formatted.where(mask, series).astype(object)
+
+
+def build_raw_time_index(headers, rows, unit_col='Grouping', time_col='Time'):
+    """Index the pull's raw Time text by (unit, row position).
+
+    Args:
+        headers: Report table headers
+        rows: Parsed rows (lists of cell text) in DataFrame order
+        unit_col: Header of the unit column
+        time_col: Header of the time column
+
+    Returns:
+        pandas Series of raw time strings keyed by a (unit, position)
+        MultiIndex, or None if the columns are not present
+    """
+    if not rows or unit_col not in headers or time_col not in headers:
         return None
-    files.sort(key=os.path.getmtime, reverse=True)
-    return files[0]
+    unit_idx = headers.index(unit_col)
+    time_idx = headers.index(time_col)
+    width = max(unit_idx, time_idx)
+
+    units = []
+    times = []
+    for row in rows:
+        if len(row) > width:
+            units.append(row[unit_idx])
+            times.append(row[time_idx])
+        else:
+            units.append(None)
+            times.append(None)
+
+    index = pd.MultiIndex.from_arrays([units, range(len(rows))], names=[unit_col, '_row'])
+    return pd.Series(times, index=index, dtype=object)
+
+
+def fill_missing_times(df, api, unit_col='Grouping', time_col='Time'):
+    """Fill missing Time values from the raw cells of the same pull.
+
+    The raw text is parsed with the shared timestamp codec and shifted to
+    Tanzania time (+3 hours). Lookups are exact on (unit, row position),
+    so the row count never changes.
+    """
+    if unit_col not in df.columns or time_col not in df.columns:
+        return df
+
+    missing = df[time_col].isna() | (df[time_col].astype('string').str.strip() == '')
+    missing = missing.fillna(True)
+    if not missing.any():
+        return df
 
+    rows = getattr(api, 'last_report_rows', None)
+    headers = list(getattr(api, 'last_report_headers', None) or [])
+    if rows is None or len(rows) != len(df):
+        print("⚠ Raw rows for this pull are not available — skipping Time fill")
+        return df
+
+    raw_index = build_raw_time_index(headers, rows, unit_col, time_col)
+    if raw_index is None:
+        print(f"⚠ '{unit_col}'/'{time_col}' not in raw headers — skipping Time fill")
+        return df
+
+    positions = np.flatnonzero(missing.to_numpy())
+    keys = pd.MultiIndex.from_arrays([df[unit_col].to_numpy()[positions], positions])
+    raw_times = raw_index.reindex(keys)
+
+    parsed = to_tanzania(parse_times(pd.Series(raw_times.to_numpy(), dtype=object)))
+    filled = format_times(parsed)
+
+    df = df.copy()
+    col_pos = df.columns.get_loc(time_col)
+    df[time_col] = df[time_col].astype(object)
+    ok = filled.notna().to_numpy()
+    df.iloc[positions[ok], col_pos] = filled.to_numpy()[ok]
 
-def process_speed_violation(df, template_id, api, json_folder=None):
+    print(f"✓ Filled {int(ok.sum())}/{len(positions)} missing '{time_col}' values from raw rows (+3h Tanzania)")
+    return df
+
+
+def process_speed_violation(df, template_id, api):
     """Process speed violation report DataFrame.
 
     - Filters rows to keep only speeds >= 85 km/h
-    - Fills missing Time values from latest SPEED_VIOLATION JSON by Grouping column
-      and adjusts to Tanzania time (+3 hours)
+    - Fills missing Time values from this pull's raw rows by Grouping and row
+      position, adjusted to Tanzania time (+3 hours)
     - Formats Time/Date columns to DD.MM.YYYY HH:MM:SS am/pm
     - Removes Speed, Avg speed, and Driver columns
     """
-
-    # -------------------------------
-    # Fill missing Time from JSON backup
-    # -------------------------------
-    if json_folder:
-        json_backup_path = find_latest_speed_json(json_folder)
-        if json_backup_path:
-            try:
-                with open(json_backup_path, "r", encoding="utf-8") as f:
-                    backup_data = json.load(f)
-
-                # Extract truck/unit and Time from nested JSON
-                json_records = []
-                for row in backup_data:
-                    try:
-                        truck_id = row['c'][1]
-                        time_val_str = row['c'][3]['t']  # e.g., "07.01.2026 07:44:06 am"
-                        # Convert string → datetime and add 3 hours
-                        time_val = pd.to_datetime(time_val_str, dayfirst=True) + timedelta(hours=3)
-                        json_records.append({
-                            'Grouping': truck_id,
-                            'Time': time_val
-                        })
-                    except Exception:
-                        continue
-
-                if json_records:
-                    df_backup = pd.DataFrame(json_records)
-
-                    if 'Grouping' in df.columns and 'Time' in df_backup.columns:
-                        df = df.merge(
-                            df_backup,
-                            on='Grouping',
-                            how='left',
-                            suffixes=('', '_backup')
-                        )
-                        # Fill missing Time values
-                        df['Time'] = df['Time'].combine_first(df['Time_backup'])
-                        df = df.drop(columns=['Time_backup'])
-                        print(f"✓ Filled missing 'Time' values from JSON backup using 'Grouping' (+3h Tanzania)")
-                    else:
-                        print("⚠ 'Grouping' column not found or JSON missing Time — skipping JSON fill")
-                else:
-                    print("⚠ JSON contained no valid records for filling")
-
-            except Exception as e:
-                print(f"⚠ Failed to fill missing times from JSON backup: {e}")
-
-    print("Time column preview BEFORE processing:")
-    time_cols = [c for c in df.columns if 'time' in str(c).lower()]
-    for col in time_cols:
-        print(df[col].head(10))
-
     if int(template_id) != TEMPLATE_ID:
         return df
 
+    # Resolve columns once per header; raises SchemaError if the header changed
+    cols = resolve_columns(TEMPLATE_ID, df.columns)
+    speed_col = cols["speed"]
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for col in cols["datetime_columns"]:
+            logger.debug("Time column preview BEFORE processing (%s):\n%s", col, df[col].head(10))
+
     try:
         # ------------------------------------------------------------------
-        # Find speed column
+        # Fill missing Time from this pull's raw rows
         # ------------------------------------------------------------------
-        speed_col = None
-        for c in df.columns:
-            lc = str(c).lower()
-            if 'speed' in lc or 'km/h' in lc or 'kph' in lc or 'kmh' in lc:
-                speed_col = c
-                break
-
-        if speed_col is None:
-            print("  Warning: No speed column found")
-            return df
+        if cols["unit"] and cols["time"]:
+            df = fill_missing_times(df, api, cols["unit"], cols["time"])
 
         # ------------------------------------------------------------------
-        # Extract numeric speed
+        # Extract numeric speed and filter by threshold
         # ------------------------------------------------------------------
-        def extract_speed_numeric(s):
-            try:
-                if pd.isna(s):
-                    return None
-                sstr = str(s).replace('km/h','').replace('kph','').replace('kmh','').replace('km','').replace(',', '.').strip()
-                m = re.search(r"[-+]?[0-9]*\.?[0-9]+", sstr)
-                if m:
-                    return float(m.group(0))
-            except Exception:
-                return None
-            return None
-
-        df['_speed_num'] = df[speed_col].apply(extract_speed_numeric)
+        speed_num = extract_speed_numeric(df[speed_col])
         original_count = len(df)
 
-        df = df[df['_speed_num'].notna() & (df['_speed_num'] >= 85)]
-        df = df.drop(columns=['_speed_num'])
+        df = df[speed_num.notna() & (speed_num >= MIN_SPEED_THRESHOLD)]
 
-        print(f"  Filtered speed: {original_count} -> {len(df)} rows (speed >= 85 km/h)")
+        print(f"  Filtered speed: {original_count} -> {len(df)} rows (speed >= {MIN_SPEED_THRESHOLD} km/h)")
 
         # ------------------------------------------------------------------
         # Format Time / Date columns
         # ------------------------------------------------------------------
-        for col in df.columns:
-            lc = str(col).lower()
-            if 'time' in lc or 'date' in lc:
-                print(f"\n=== Processing datetime column: {col} ===")
-                print("Sample raw values:")
-                print(df[col].head(10).to_list())
-
-                if pd.api.types.is_datetime64_any_dtype(df[col]):
-                    df[col] = df[col].dt.strftime('%d.%m.%Y %I:%M:%S %p').str.lower()
-                    print("  Column already datetime → formatted directly")
-                    continue
-
-                raw = df[col].astype(str).str.strip()
-                parsed = pd.to_datetime(raw, dayfirst=True, errors='coerce')
-                mask = parsed.notna()
-
-                failed_rows = df.loc[~mask, [col]].copy()
-                if not failed_rows.empty:
-                    print(f"  ❌ Unparsed values in '{col}':")
-                    print(failed_rows.assign(raw_value=raw[~mask]))
-
-                df.loc[mask, col] = parsed.loc[mask].dt.strftime('%d.%m.%Y %I:%M:%S %p').str.lower()
-                print(f"  Parsed: {mask.sum()} | Failed: {(~mask).sum()}")
+        for col in cols["datetime_columns"]:
+            df[col] = format_datetime_column(df[col], col)
 
         # ------------------------------------------------------------------
         # Remove ONLY specific columns
@@ -171,3 +189,6 @@ def process_speed_violation(df, template_id, api, json_folder=None):
         traceback.print_exc()
 
     return df
+
+
+register_report("SPEED_VIOLATION", TEMPLATE_ID, processor=process_speed_violation, parallel="rows")
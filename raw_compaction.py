@@ -0,0 +1,345 @@
+"""Compaction and retention of the raw reports folder.
+
+Every pull leaves its report workbooks and JSON captures
+(*_report_response.json.gz, *_rows*.json.gz; plain .json in older runs)
+in raw/, and the harsh brake details leave one workbook per unit in
+raw/temp_unit_details/.
+compact_raw_folder() moves runs older than config.RAW_COMPACT_AFTER_DAYS
+into one archive per month, raw/archive/<YYYY-MM>.zip:
+
+- report sheets are stored as Parquet (one member per sheet) when
+  pyarrow is installed, otherwise the workbook is stored as is;
+- plain JSON dumps are stored compact and compressed (zstd when the
+  zstandard package is installed, gzip otherwise); .json.gz captures
+  are stored as they are, CSV copies of reports gzip-compressed;
+- raw/archive/index.json records, per run, the archive and member of
+  every original file, so extract_run() can rebuild the run's folder
+  (workbooks, JSON and run manifest) for reprocessing.
+
+Month archives older than config.RAW_ARCHIVE_KEEP_DAYS are deleted with
+their index entries. Unit detail workbooks older than the compaction age
+are deleted: they are scratch files already merged into the run's
+HARSH_BRAKE_DETAIL report, which is archived.
+
+Usage:
+    python raw_compaction.py compact [raw_folder]
+    python raw_compaction.py list [raw_folder]
+    python raw_compaction.py extract <run> <dest_folder> [raw_folder]
+"""
+
+import io
+import os
+import re
+import json
+import gzip
+import shutil
+import zipfile
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from config import (RAW_COMPACT_AFTER_DAYS, RAW_ARCHIVE_KEEP_DAYS, RAW_ARCHIVE_FOLDER,
+                    RUN_MANIFEST_FOLDER)
+
+try:
+    import pyarrow  # noqa: F401  (Parquet support for pandas)
+except ImportError:
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+INDEX_FILE = "index.json"
+UNIT_DETAILS_FOLDER = "temp_unit_details"
+# Run timestamp in raw file names: {GROUP}_{TAG}_{DD.MM.YYYY_HH-MM-SS}[_suffix].ext
+RUN_PATTERN = re.compile(r'_(\d{2}\.\d{2}\.\d{4}_\d{2}-\d{2}-\d{2})(?:_[^.]*)?\.(xlsx|json|json\.gz|csv|parquet)$')
+RUN_FORMAT = "%d.%m.%Y_%H-%M-%S"
+
+
+def _run_time(run):
+    return datetime.strptime(run, RUN_FORMAT)
+
+
+def _compress_json(data):
+    """Return (compact compressed bytes, format) of a JSON file's contents."""
+    compact = json.dumps(json.loads(data), separators=(',', ':')).encode('utf-8')
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(compact), "json.zst"
+    return gzip.compress(compact, compresslevel=9), "json.gz"
+
+
+def _decompress_json(data, fmt):
+    if fmt == "json.zst":
+        if zstandard is None:
+            raise ImportError("zstandard is required to extract this archive")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _sheets_to_parquet(path):
+    """Return [(sheet name, parquet bytes)] for every sheet of a workbook."""
+    sheets = []
+    for name, df in pd.read_excel(path, sheet_name=None).items():
+        buf = io.BytesIO()
+        df.columns = [str(c) for c in df.columns]
+        df.to_parquet(buf, index=False)
+        sheets.append((name, buf.getvalue()))
+    return sheets
+
+
+def _archive_members(path, base):
+    """Return ([(member, bytes)], index record) storing one raw file."""
+    if path.endswith('.json'):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        try:
+            data, fmt = _compress_json(raw)
+        except ValueError:  # Not valid JSON (truncated dump): keep the bytes
+            data, fmt = gzip.compress(raw), "gz"
+        member = f"{base}.{fmt.split('.')[-1]}"
+        return [(member, data)], {"format": fmt, "member": member}
+
+    if path.endswith('.csv'):
+        with open(path, 'rb') as f:
+            return [(f"{base}.gz", gzip.compress(f.read(), compresslevel=9))], \
+                {"format": "gz", "member": f"{base}.gz"}
+
+    if path.endswith('.xlsx') and pyarrow is not None:
+        try:
+            sheets = _sheets_to_parquet(path)
+        except Exception:
+            sheets = None  # Mixed-type columns Parquet cannot hold
+        if sheets is not None:
+            members = [(f"{base}/{i}.parquet", data) for i, (_, data) in enumerate(sheets)]
+            return members, {"format": "parquet", "sheets": [name for name, _ in sheets],
+                             "members": [m for m, _ in members]}
+
+    with open(path, 'rb') as f:
+        return [(base, f.read())], {"format": "file", "member": base}
+
+
+class RawArchive:
+    """Month archives and run index of a raw reports folder."""
+
+    def __init__(self, raw_folder):
+        self.raw_folder = raw_folder
+        self.folder = os.path.join(raw_folder, RAW_ARCHIVE_FOLDER)
+        self.index_path = os.path.join(self.folder, INDEX_FILE)
+        self.index = {"runs": {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+
+    def _save_index(self):
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp, self.index_path)
+
+    def _archive_path(self, month):
+        return os.path.join(self.folder, f"{month}.zip")
+
+    def pending_runs(self, older_than):
+        """Return {run: [relative file paths]} of runs older than a datetime."""
+        latest = None
+        latest_path = os.path.join(self.raw_folder, RUN_MANIFEST_FOLDER, "latest.json")
+        if os.path.exists(latest_path):
+            with open(latest_path, 'r', encoding='utf-8') as f:
+                latest = json.load(f).get("run")
+
+        runs = {}
+        for name in os.listdir(self.raw_folder):
+            m = RUN_PATTERN.search(name)
+            if not m or m.group(1) == latest:
+                continue
+            try:
+                if _run_time(m.group(1)) >= older_than:
+                    continue
+            except ValueError:
+                continue
+            runs.setdefault(m.group(1), []).append(name)
+
+        for run, files in runs.items():
+            manifest = os.path.join(RUN_MANIFEST_FOLDER, f"{run}.json")
+            if os.path.exists(os.path.join(self.raw_folder, manifest)):
+                files.append(manifest)
+        return runs
+
+    def archive_run(self, run, files):
+        """Move one run's files into its month archive.
+
+        Returns:
+            Bytes freed in the raw folder
+        """
+        month = _run_time(run).strftime("%Y-%m")
+        entry = {"month": month, "date": _run_time(run).date().isoformat(), "files": {}}
+        freed = 0
+        os.makedirs(self.folder, exist_ok=True)
+        # The run is added to a copy of the month archive that replaces it
+        # once complete, so an interrupted run leaves the archive as it was
+        archive_path = self._archive_path(month)
+        fd, tmp = tempfile.mkstemp(prefix=f"{month}.", suffix=".zip.tmp", dir=self.folder)
+        os.close(fd)
+        try:
+            if os.path.exists(archive_path):
+                shutil.copyfile(archive_path, tmp)
+            mode = 'a' if os.path.getsize(tmp) else 'w'
+            with zipfile.ZipFile(tmp, mode, zipfile.ZIP_STORED) as archive:
+                existing = set(archive.namelist())
+                for rel_path in files:
+                    base = f"{run}/{rel_path.replace(os.sep, '/')}"
+                    members, record = _archive_members(os.path.join(self.raw_folder, rel_path),
+                                                       base)
+                    for member, data in members:
+                        if member not in existing:
+                            archive.writestr(member, data)
+                    entry["files"][rel_path] = record
+            os.replace(tmp, archive_path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        # The index lists the run before its files are removed
+        self.index["runs"][run] = entry
+        self._save_index()
+        for rel_path in files:
+            path = os.path.join(self.raw_folder, rel_path)
+            freed += os.path.getsize(path)
+            os.remove(path)
+        return freed
+
+    def extract_run(self, run, dest_folder):
+        """Rebuild an archived run's files in dest_folder.
+
+        The run's manifest (when archived) is restored as the folder's
+        latest run, so append_to_overall can reprocess dest_folder.
+
+        Returns:
+            List of restored paths
+        """
+        entry = self.index["runs"].get(run)
+        if entry is None:
+            raise KeyError(f"Run {run} is not archived")
+
+        restored = []
+        with zipfile.ZipFile(self._archive_path(entry["month"])) as archive:
+            for rel_path, record in entry["files"].items():
+                path = os.path.join(dest_folder, rel_path)
+                os.makedirs(os.path.dirname(path) or dest_folder, exist_ok=True)
+                if record["format"] == "parquet":
+                    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+                        for sheet, member in zip(record["sheets"], record["members"]):
+                            df = pd.read_parquet(io.BytesIO(archive.read(member)))
+                            df.to_excel(writer, sheet_name=sheet, index=False)
+                else:
+                    data = archive.read(record["member"])
+                    if record["format"] in ("json.gz", "json.zst", "gz"):
+                        data = _decompress_json(data, record["format"])
+                    with open(path, 'wb') as f:
+                        f.write(data)
+                restored.append(path)
+
+        manifest = os.path.join(RUN_MANIFEST_FOLDER, f"{run}.json")
+        if manifest in entry["files"]:
+            with open(os.path.join(dest_folder, RUN_MANIFEST_FOLDER, "latest.json"), 'w',
+                      encoding='utf-8') as f:
+                json.dump({"run": run, "manifest": f"{run}.json"}, f, indent=2)
+        return restored
+
+    def apply_retention(self, keep_days):
+        """Delete month archives that ended more than keep_days ago.
+
+        Returns:
+            Number of archived runs removed
+        """
+        cutoff = (datetime.now() - timedelta(days=keep_days)).strftime("%Y-%m")
+        expired = {e["month"] for e in self.index["runs"].values() if e["month"] < cutoff}
+        removed = 0
+        for month in expired:
+            path = self._archive_path(month)
+            if os.path.exists(path):
+                os.remove(path)
+            runs = [r for r, e in self.index["runs"].items() if e["month"] == month]
+            for run in runs:
+                del self.index["runs"][run]
+            removed += len(runs)
+        if expired:
+            self._save_index()
+        return removed
+
+
+def clean_unit_details(raw_folder, older_than):
+    """Delete per-unit detail workbooks older than a datetime."""
+    folder = os.path.join(raw_folder, UNIT_DETAILS_FOLDER)
+    if not os.path.isdir(folder):
+        return 0
+    removed = 0
+    cutoff = older_than.timestamp()
+    for entry in os.scandir(folder):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    return removed
+
+
+def compact_raw_folder(raw_folder, compact_after_days=None, keep_days=None):
+    """Archive old runs, apply retention and clear old unit detail files.
+
+    Args:
+        raw_folder: Raw reports folder
+        compact_after_days: Archive runs older than this (config default)
+        keep_days: Delete archives older than this; None keeps them
+            (config default)
+
+    Returns:
+        Dict with runs archived, bytes freed, runs expired, unit files removed
+    """
+    if compact_after_days is None:
+        compact_after_days = RAW_COMPACT_AFTER_DAYS
+    if keep_days is None:
+        keep_days = RAW_ARCHIVE_KEEP_DAYS
+
+    older_than = datetime.now() - timedelta(days=compact_after_days)
+    archive = RawArchive(raw_folder)
+    runs = archive.pending_runs(older_than)
+    freed = 0
+    for run in sorted(runs, key=_run_time):
+        freed += archive.archive_run(run, runs[run])
+
+    result = {
+        "archived": len(runs),
+        "freed": freed,
+        "expired": archive.apply_retention(keep_days) if keep_days else 0,
+        "unit_files": clean_unit_details(raw_folder, older_than),
+    }
+    print(f"✓ Raw folder compacted: {result['archived']} runs archived "
+          f"({result['freed'] / 1e6:.1f} MB freed), {result['expired']} expired, "
+          f"{result['unit_files']} unit detail files removed")
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("compact", "list", "extract") or (
+            sys.argv[1] == "extract" and len(sys.argv) < 4):
+        print("Usage: python raw_compaction.py compact [raw_folder]")
+        print("       python raw_compaction.py list [raw_folder]")
+        print("       python raw_compaction.py extract <run> <dest_folder> [raw_folder]")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == "compact":
+        compact_raw_folder(sys.argv[2] if len(sys.argv) > 2 else "raw")
+    elif command == "list":
+        archive = RawArchive(sys.argv[2] if len(sys.argv) > 2 else "raw")
+        for run, entry in sorted(archive.index["runs"].items(), key=lambda kv: _run_time(kv[0])):
+            print(f"{run}  {entry['month']}.zip  {len(entry['files'])} files")
+    else:
+        archive = RawArchive(sys.argv[4] if len(sys.argv) > 4 else "raw")
+        restored = archive.extract_run(sys.argv[2], sys.argv[3])
+        print(f"✓ Restored {len(restored)} files to {sys.argv[3]}")
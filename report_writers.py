@@ -0,0 +1,273 @@
+"""Output writers for pulled reports.
+
+execute_report() used to save every report with pd.ExcelWriter(openpyxl),
+which builds the whole workbook object graph in memory before writing
+it. write_report() hands the frame to one writer per output format:
+
+- XlsxStreamWriter streams the rows straight into the sheet XML of a new
+  .xlsx package, a chunk at a time, with inline strings (no shared
+  strings table), so its memory use does not grow with the report;
+- OpenpyxlWriter is the previous pd.ExcelWriter path (config.EXCEL_ENGINE
+  = "openpyxl");
+- CsvWriter and ParquetWriter (needs pyarrow) write copies next to the
+  report for tools that do not need a workbook.
+
+config.REPORT_OUTPUT_FORMATS chooses the formats per report type. The
+.xlsx file is the report later stages read (run manifest, harsh brake
+merge, OVERALL append), so it is always written; the other formats are
+extra copies and a failure to write one is only reported.
+"""
+
+import os
+import zipfile
+import numbers
+from datetime import datetime, date
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+import pandas as pd
+
+from config import EXCEL_ENGINE, EXCEL_SHEET_NAME, REPORT_OUTPUT_FORMATS
+from xlsx_stream import (NS_MAIN, NS_REL, NS_PKG_REL, REL_WORKSHEET, CT_WORKSHEET,
+                         ILLEGAL_XML_CHARS, column_letter, _format_number, _t_xml, _to_serial)
+
+try:
+    import pyarrow  # noqa: F401  (Parquet support for pandas)
+except ImportError:
+    pyarrow = None
+
+# Rows converted to XML per write to the sheet part
+CHUNK_ROWS = 5000
+
+# cellXfs indexes of the generated styles.xml
+STYLE_DATETIME = 1
+STYLE_DATE = 2
+STYLE_HEADER = 3
+
+REL_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+REL_STYLESHEET = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"
+CT_WORKBOOK = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"
+CT_STYLES = "application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"
+XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+CONTENT_TYPES_XML = (
+    XML_DECL +
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    f'<Override PartName="/xl/workbook.xml" ContentType="{CT_WORKBOOK}"/>'
+    f'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="{CT_WORKSHEET}"/>'
+    f'<Override PartName="/xl/styles.xml" ContentType="{CT_STYLES}"/>'
+    '</Types>'
+)
+ROOT_RELS_XML = (
+    XML_DECL + f'<Relationships xmlns="{NS_PKG_REL}">'
+    f'<Relationship Id="rId1" Type="{REL_DOCUMENT}" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+WORKBOOK_RELS_XML = (
+    XML_DECL + f'<Relationships xmlns="{NS_PKG_REL}">'
+    f'<Relationship Id="rId1" Type="{REL_WORKSHEET}" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{REL_STYLESHEET}" Target="styles.xml"/>'
+    '</Relationships>'
+)
+STYLES_XML = (
+    XML_DECL + f'<styleSheet xmlns="{NS_MAIN}">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="yyyy\\-mm\\-dd\\ hh:mm:ss"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy\\-mm\\-dd"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def _cell_xml(ref, value, style=0):
+    """Return the <c> element of a value, or '' for an empty cell."""
+    s_attr = f' s="{style}"' if style else ''
+    if value is None or value is pd.NaT or value is pd.NA:
+        return ''
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return f'<c r="{ref}" s="{STYLE_DATETIME}"><v>{_format_number(_to_serial(value))}</v></c>'
+    if isinstance(value, date):
+        return f'<c r="{ref}" s="{STYLE_DATE}"><v>{_format_number(_to_serial(value))}</v></c>'
+    if isinstance(value, (bool, np.bool_)):
+        return f'<c r="{ref}"{s_attr} t="b"><v>{_format_number(value)}</v></c>'
+    if isinstance(value, numbers.Number):
+        if isinstance(value, float) and not np.isfinite(value):
+            return ''
+        return f'<c r="{ref}"{s_attr}><v>{_format_number(value)}</v></c>'
+    text = ILLEGAL_XML_CHARS.sub('', str(value))
+    if text == '':
+        return ''
+    return f'<c r="{ref}"{s_attr} t="inlineStr"><is>{_t_xml(text)}</is></c>'
+
+
+def _replace_atomic(write, path):
+    """Run write(tmp_path) and move the result over path."""
+    tmp = path + ".tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class XlsxStreamWriter:
+    """Streams a frame into a new single-sheet .xlsx package."""
+
+    extension = ".xlsx"
+
+    def _sheet_rows(self, df, letters):
+        """Yield the encoded <row> elements, CHUNK_ROWS at a time."""
+        header = ''.join(_cell_xml(f"{letters[i]}1", str(c), STYLE_HEADER)
+                         for i, c in enumerate(df.columns))
+        yield f'<row r="1">{header}</row>'.encode('utf-8')
+
+        # astype(object) per chunk turns numpy scalars into Python values
+        for start in range(0, len(df), CHUNK_ROWS):
+            chunk = df.iloc[start:start + CHUNK_ROWS].astype(object)
+            parts = []
+            for r, values in enumerate(chunk.itertuples(index=False, name=None), start=start + 2):
+                cells = ''.join(_cell_xml(f"{letters[i]}{r}", v) for i, v in enumerate(values))
+                parts.append(f'<row r="{r}">{cells}</row>')
+            yield ''.join(parts).encode('utf-8')
+
+    def _write(self, df, path, sheet_name):
+        width = max(len(df.columns), 1)
+        letters = [column_letter(i) for i in range(1, width + 1)]
+        workbook_xml = (
+            XML_DECL + f'<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}"><sheets>'
+            f'<sheet name={quoteattr(sheet_name)} sheetId="1" r:id="rId1"/>'
+            '</sheets></workbook>'
+        )
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("[Content_Types].xml", CONTENT_TYPES_XML)
+            zf.writestr("_rels/.rels", ROOT_RELS_XML)
+            zf.writestr("xl/workbook.xml", workbook_xml)
+            zf.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS_XML)
+            zf.writestr("xl/styles.xml", STYLES_XML)
+            with zf.open("xl/worksheets/sheet1.xml", 'w', force_zip64=True) as part:
+                part.write((
+                    XML_DECL + f'<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+                    f'<dimension ref="A1:{letters[-1]}{len(df) + 1}"/><sheetData>'
+                ).encode('utf-8'))
+                for data in self._sheet_rows(df, letters):
+                    part.write(data)
+                part.write(b'</sheetData></worksheet>')
+
+    def write(self, df, path, sheet_name):
+        _replace_atomic(lambda tmp: self._write(df, tmp, sheet_name), path)
+
+
+class OpenpyxlWriter:
+    """Builds the workbook in memory through pd.ExcelWriter (previous behaviour)."""
+
+    extension = ".xlsx"
+
+    def write(self, df, path, sheet_name):
+        with pd.ExcelWriter(path, engine="openpyxl") as writer:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+class CsvWriter:
+    """UTF-8 CSV with a byte order mark (opens with the right encoding in Excel)."""
+
+    extension = ".csv"
+
+    def write(self, df, path, sheet_name):
+        _replace_atomic(lambda tmp: df.to_csv(tmp, index=False, encoding='utf-8-sig',
+                                              chunksize=CHUNK_ROWS), path)
+
+
+class ParquetWriter:
+    """Parquet file; mixed-type object columns are stored as text."""
+
+    extension = ".parquet"
+
+    def write(self, df, path, sheet_name):
+        if pyarrow is None:
+            raise RuntimeError("pyarrow is required for Parquet output")
+        df = df.copy()
+        df.columns = [str(c) for c in df.columns]
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        _replace_atomic(lambda tmp: df.to_parquet(tmp, index=False), path)
+
+
+def get_writer(fmt, engine=None):
+    """Return the writer of an output format.
+
+    Args:
+        fmt: "xlsx", "csv" or "parquet"
+        engine: xlsx engine, "stream" or "openpyxl" (defaults to
+            config.EXCEL_ENGINE)
+
+    Returns:
+        Writer instance
+    """
+    if fmt == "xlsx":
+        engine = engine or EXCEL_ENGINE
+        if engine == "stream":
+            return XlsxStreamWriter()
+        if engine == "openpyxl":
+            return OpenpyxlWriter()
+        raise ValueError(f"Unknown Excel engine: {engine}")
+    if fmt == "csv":
+        return CsvWriter()
+    if fmt == "parquet":
+        return ParquetWriter()
+    raise ValueError(f"Unknown report output format: {fmt}")
+
+
+def report_formats(report_type=None):
+    """Return the output formats configured for a report type (xlsx first)."""
+    formats = REPORT_OUTPUT_FORMATS.get(report_type) or REPORT_OUTPUT_FORMATS["default"]
+    return ["xlsx"] + [f for f in formats if f != "xlsx"]
+
+
+def write_report(df, output_path, formats=None, sheet_name=None):
+    """Write a report frame in each of its output formats.
+
+    Args:
+        df: Report DataFrame
+        output_path: Report .xlsx path; other formats use the same stem
+        formats: Output formats (defaults to the "default" entry of
+            config.REPORT_OUTPUT_FORMATS); xlsx is always written
+        sheet_name: Workbook sheet name (defaults to config.EXCEL_SHEET_NAME)
+
+    Returns:
+        List of written paths (the .xlsx first)
+    """
+    if formats is None:
+        formats = report_formats()
+    elif "xlsx" not in formats:
+        formats = ["xlsx"] + list(formats)
+    sheet_name = sheet_name or EXCEL_SHEET_NAME
+
+    stem = os.path.splitext(output_path)[0]
+    written = []
+    for fmt in formats:
+        writer = get_writer(fmt)
+        path = output_path if fmt == "xlsx" else stem + writer.extension
+        if fmt == "xlsx":
+            writer.write(df, path, sheet_name)
+        else:
+            try:
+                writer.write(df, path, sheet_name)
+            except Exception as e:
+                print(f"  ⚠ Could not write {fmt} copy of {os.path.basename(output_path)}: {e}")
+                continue
+        written.append(path)
+    return written
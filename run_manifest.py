@@ -0,0 +1,182 @@
+"""Run manifests: where each pull wrote its reports.
+
+Every pull writes raw/manifests/<timestamp>.json listing the reports it
+produced (type, template, interval, file, row count, SHA-256) and points
+raw/manifests/latest.json at it. Later stages read the manifest instead
+of scanning raw/ for a file name containing the report tag, so they open
+exactly the files of that run however many days accumulate in the
+folder. The OVERALL folder keeps the same kind of pointer to the current
+workbook (written when a new workbook is published).
+
+Folders without a manifest (older runs) fall back to the directory scan,
+taking the newest matching file.
+"""
+
+import os
+import json
+import glob
+import hashlib
+from datetime import datetime
+
+from config import RUN_MANIFEST_FOLDER, OVERALL_POINTER_FILE
+
+LATEST_FILE = "latest.json"
+COPY_EXTENSIONS = (".csv", ".parquet")
+OVERALL_PATTERN = "OVERALL VIOLATIONS REPORT *.xlsx"
+
+
+def _write_json_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def file_checksum(path):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def count_rows(path):
+    """Return the data rows of an .xlsx file's first sheet (from its dimension)."""
+    from openpyxl import load_workbook
+
+    try:
+        wb = load_workbook(path, read_only=True)
+        try:
+            return max(wb.worksheets[0].max_row - 1, 0) if wb.worksheets else 0
+        finally:
+            wb.close()
+    except Exception:
+        return None
+
+
+def write_run_manifest(raw_folder, outputs, group_name, timestamp, interval=None):
+    """Record the reports of a pull and make it the folder's latest run.
+
+    Args:
+        raw_folder: Folder the reports were written to
+        outputs: Pipeline output dicts ({"type", "path", "template_id"})
+        group_name: Wialon group the reports were pulled for
+        timestamp: Run timestamp string (as used in file names)
+        interval: Optional (from, to) unix times of the report interval
+
+    Returns:
+        Manifest path
+    """
+    reports = {}
+    for output in outputs:
+        path = output["path"]
+        if not os.path.exists(path):
+            continue
+        reports[output["type"]] = {
+            "file": os.path.relpath(path, raw_folder),
+            "template_id": output.get("template_id"),
+            "rows": count_rows(path) if path.endswith('.xlsx') else None,
+            "sha256": file_checksum(path),
+        }
+        # CSV / Parquet copies written next to the report (report_writers)
+        stem = os.path.splitext(path)[0]
+        copies = [os.path.relpath(stem + ext, raw_folder) for ext in COPY_EXTENSIONS
+                  if os.path.exists(stem + ext)]
+        if copies:
+            reports[output["type"]]["copies"] = copies
+
+    manifest = {
+        "run": timestamp,
+        "group": group_name,
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "interval": list(interval) if interval else None,
+        "reports": reports,
+    }
+    folder = os.path.join(raw_folder, RUN_MANIFEST_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{timestamp}.json")
+    _write_json_atomic(path, manifest)
+    _write_json_atomic(os.path.join(folder, LATEST_FILE),
+                       {"run": timestamp, "manifest": f"{timestamp}.json"})
+    print(f"✓ Run manifest: {len(reports)} reports → {os.path.relpath(path, raw_folder)}")
+    return path
+
+
+def load_run_manifest(raw_folder, run=None):
+    """Return the manifest of a run (default: the latest), or None.
+
+    Args:
+        raw_folder: Raw reports folder
+        run: Optional run timestamp
+
+    Returns:
+        Manifest dict or None if the folder has no manifest
+    """
+    folder = os.path.join(raw_folder, RUN_MANIFEST_FOLDER)
+    if run is None:
+        latest = _read_json(os.path.join(folder, LATEST_FILE))
+        if not latest:
+            return None
+        return _read_json(os.path.join(folder, latest["manifest"]))
+    return _read_json(os.path.join(folder, f"{run}.json"))
+
+
+def manifest_report_path(raw_folder, manifest, report_type, verify=True):
+    """Return the path of a report listed in a manifest.
+
+    Args:
+        raw_folder: Raw reports folder
+        manifest: Manifest dict
+        report_type: Report type (e.g. "SPEED_VIOLATION")
+        verify: Check the file's SHA-256 against the manifest
+
+    Returns:
+        Path, or None if the run has no such report or the file is missing
+    """
+    entry = manifest["reports"].get(report_type)
+    if entry is None:
+        return None
+    path = os.path.join(raw_folder, entry["file"])
+    if not os.path.exists(path):
+        print(f"  ⚠ {entry['file']} listed in run {manifest['run']} is missing")
+        return None
+    if verify and entry.get("sha256") and file_checksum(path) != entry["sha256"]:
+        print(f"  ⚠ {entry['file']} changed since run {manifest['run']} was pulled")
+    return path
+
+
+def scan_latest(folder, pattern):
+    """Return the newest file matching a glob pattern (fallback discovery)."""
+    files = glob.glob(os.path.join(folder, pattern))
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def write_overall_pointer(overall_folder, workbook_path):
+    """Record the current OVERALL workbook of a folder."""
+    _write_json_atomic(os.path.join(overall_folder, OVERALL_POINTER_FILE), {
+        "workbook": os.path.basename(workbook_path),
+        "updated": datetime.now().isoformat(timespec='seconds'),
+    })
+
+
+def current_overall_workbook(overall_folder):
+    """Return the current OVERALL workbook path, or None.
+
+    Uses the folder's pointer file; falls back to the newest
+    'OVERALL VIOLATIONS REPORT *.xlsx' when it is missing or stale.
+    """
+    pointer = _read_json(os.path.join(overall_folder, OVERALL_POINTER_FILE))
+    if pointer:
+        path = os.path.join(overall_folder, pointer["workbook"])
+        if os.path.exists(path):
+            return path
+    return scan_latest(overall_folder, OVERALL_PATTERN)
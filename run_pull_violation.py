@@ -11,25 +11,13 @@ Then appends the data to OVERALL VIOLATIONS REPORT excel file.
 
 import os
 import sys
-import time
-import shutil
-import glob
-
-# Add processors directory to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'processors'))
 
 from wialon_api import WialonAPI
-from utils import get_timestamp_string
-
-# Import processors
-from speed_violation import process_speed_violation, TEMPLATE_ID as SPEED_TEMPLATE_ID
-from harsh_brake import (
-    merge_harsh_brake_reports,
-    SUMMARY_TEMPLATE_ID,
-    DETAIL_TEMPLATE_ID
-)
-from idling import process_idling, TEMPLATE_ID as IDLING_TEMPLATE_ID
-from night_driving import process_night_driving, TEMPLATE_ID as NIGHT_TEMPLATE_ID
+from utils import get_timestamp_string, get_yesterday_interval
+from pipeline import run_pipeline
+from run_manifest import write_run_manifest, current_overall_workbook
+from raw_compaction import compact_raw_folder
+from run_telemetry import start_run, write_run_report
 
 
 # Configuration
@@ -58,13 +46,14 @@ def pull_violation_reports(output_folder=None, group_name=None):
     raw_folder = os.path.join(output_folder, "raw")
     os.makedirs(raw_folder, exist_ok=True)
 
+    timestamp = get_timestamp_string()
+    start_run(timestamp, group=group_name)
     api = WialonAPI()
     if not api.login():
         print("✗ Failed to login to Wialon")
         return [], raw_folder
     
     downloaded = []
-    timestamp = get_timestamp_string()
     
     try:
         print(f"\n{'='*60}")
@@ -78,59 +67,11 @@ def pull_violation_reports(output_folder=None, group_name=None):
         
         print(f"✓ Found group ID: {group_id}\n")
         
-        # 1. Speed Violation Report
-        print("📊 [1/4] Pulling Speed Violation Report...")
-        speed_path = os.path.join(raw_folder, f"{group_name}_SPEED_VIOLATION_{timestamp}.xlsx")
-        json_folder = output_folder
-        success = api.execute_report(
-            group_id,
-            SPEED_TEMPLATE_ID,
-            speed_path,
-            processor_func=lambda df, template_id, api: process_speed_violation(
-                df, template_id, api, json_folder=json_folder
-            )
-        )
-        if success:
-            downloaded.append({"type": "SPEED_VIOLATION", "path": speed_path, "template_id": SPEED_TEMPLATE_ID})
-        time.sleep(1)
-        
-        # 2. Idling Report
-        print("\n📊 [2/4] Pulling Idling Violations Report...")
-        idling_path = os.path.join(raw_folder, f"{group_name}_IDLING_{timestamp}.xlsx")
-        success = api.execute_report(group_id, IDLING_TEMPLATE_ID, idling_path, processor_func=process_idling)
-        if success:
-            downloaded.append({"type": "IDLING", "path": idling_path, "template_id": IDLING_TEMPLATE_ID})
-        time.sleep(1)
-        
-        # 3. Night Driving Report
-        print("\n📊 [3/4] Pulling Night Driving Report...")
-        night_path = os.path.join(raw_folder, f"{group_name}_NIGHT_DRIVING_{timestamp}.xlsx")
-        success = api.execute_report(group_id, NIGHT_TEMPLATE_ID, night_path, processor_func=process_night_driving)
-        if success:
-            downloaded.append({"type": "NIGHT_DRIVING", "path": night_path, "template_id": NIGHT_TEMPLATE_ID})
-        time.sleep(1)
-        
-        # 4. Harsh Brake Report
-        print("\n📊 [4/4] Pulling Harsh Brake Violations Report...")
-        summary_path = os.path.join(raw_folder, f"{group_name}_HARSH_BRAKE_SUMMARY_{timestamp}.xlsx")
-        success_summary = api.execute_report(group_id, SUMMARY_TEMPLATE_ID, summary_path)
-        time.sleep(1)
-        if success_summary:
-            downloaded.append({"type": "HARSH_BRAKE_SUMMARY", "path": summary_path, "template_id": SUMMARY_TEMPLATE_ID})
-        
-        details_path = os.path.join(raw_folder, f"{group_name}_HARSH_BRAKE_DETAIL_{timestamp}.xlsx")
-        if success_summary:
-            print("  → Extracting units and pulling detailed reports...")
-            consolidated_path = os.path.join(raw_folder, f"{group_name}_HARSH_BRAKE_CONSOLIDATED_{timestamp}.xlsx")
-            merge_success = merge_harsh_brake_reports(summary_path, details_path, consolidated_path, api=api)
-            if merge_success:
-                downloaded.append({"type": "HARSH_BRAKE_DETAIL", "path": details_path, "template_id": DETAIL_TEMPLATE_ID})
-                downloaded.append({"type": "HARSH_BRAKE_CONSOLIDATED", "path": consolidated_path, "template_id": f"{SUMMARY_TEMPLATE_ID}+{DETAIL_TEMPLATE_ID}"})
-                try:
-                    shutil.copyfile(consolidated_path, summary_path)
-                    print(f"  ✓ Updated summary file with enriched data")
-                except Exception as e:
-                    print(f"  ⚠ Could not overwrite summary: {e}")
+        # Run every registered report; independent reports run concurrently
+        interval = get_yesterday_interval()
+        downloaded = run_pipeline(group_id, group_name, raw_folder, timestamp)
+        # Downstream stages open exactly this run's files
+        write_run_manifest(raw_folder, downloaded, group_name, timestamp, interval)
     
     finally:
         api.logout()
@@ -170,15 +111,10 @@ if __name__ == "__main__":
         try:
             from append_to_overall import append_violations_to_overall
             overall_folder = DEFAULT_OUTPUT_FOLDER
-            overall_files = glob.glob(os.path.join(overall_folder, "OVERALL VIOLATIONS REPORT *.xlsx"))
-            latest_overall = max(overall_files, key=os.path.getmtime) if overall_files else None
+            latest_overall = current_overall_workbook(overall_folder)
             
             if latest_overall:
-                backup_folder = os.path.join(overall_folder, "backup")
-                os.makedirs(backup_folder, exist_ok=True)
-                shutil.copy(latest_overall, os.path.join(backup_folder, os.path.basename(latest_overall)))
-                print(f"✓ Backed up latest overall to {backup_folder}")
-                
+                # append_violations_to_overall snapshots the workbook first
                 append_success = append_violations_to_overall(raw_folder, overall_folder)
                 if append_success:
                     print("\n✓ Data successfully appended to OVERALL excel!")
@@ -197,4 +133,16 @@ if __name__ == "__main__":
     else:
         print("✗ No reports were downloaded.")
     
+    # Roll runs older than config.RAW_COMPACT_AFTER_DAYS into month archives
+    try:
+        compact_raw_folder(raw_folder)
+    except Exception as e:
+        print(f"⚠ Raw folder compaction failed: {e}")
+    
+    # Where the run's time went, per stage (raw/telemetry/<run>.json)
+    try:
+        write_run_report(raw_folder)
+    except Exception as e:
+        print(f"⚠ Could not write run telemetry: {e}")
+    
     print("="*60 + "\n")
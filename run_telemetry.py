@@ -0,0 +1,254 @@
+"""Per-stage telemetry of a pull run.
+
+Stages of a run (login, group lookup, report execution, row fetch,
+parsing, timestamp conversion, processors, report writing, dedupe,
+store and append) are wrapped in stage(), which records for each one:
+
+- wall time and rows in / rows out (rows per second in the summary);
+- HTTP requests, bytes received and retries made while it was open
+  (WialonAPI reports them through record_http()), including those of
+  stages nested inside it on the same thread;
+- bytes written, where the stage writes a file;
+- the process's peak RSS when it ended.
+
+Records carry the report node they ran for (set per pipeline node
+with report_context()). write_run_report() saves them with per-stage
+totals as raw/telemetry/<run>.json and, when
+config.TELEMETRY_PROMETHEUS_FILE is set, as a Prometheus text file for
+node_exporter's textfile collector.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import TELEMETRY_FOLDER, TELEMETRY_PROMETHEUS_FILE
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+METRIC_PREFIX = "wialon_violations"
+
+_lock = threading.Lock()
+_local = threading.local()
+_records = []
+_run = {"run": None, "started": time.time()}
+
+
+def peak_rss_mb():
+    """Return the process's peak resident set size in MB, or None."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kB on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    return None
+
+
+def start_run(run, **labels):
+    """Start recording a new run, dropping records of a previous one.
+
+    Args:
+        run: Run id (the pull timestamp used in file names)
+        **labels: Extra run fields for the report (e.g. group)
+    """
+    with _lock:
+        _records.clear()
+        _run.clear()
+        _run.update(labels, run=run, started=time.time())
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def report_context(name):
+    """Attribute the stages run on this thread to a report node."""
+    previous = getattr(_local, "report", None)
+    _local.report = name
+    try:
+        yield
+    finally:
+        _local.report = previous
+
+
+@contextmanager
+def stage(name, rows_in=None, report=None):
+    """Record one stage; the yielded dict takes rows_out / bytes_written.
+
+    Args:
+        name: Stage name (e.g. "row_fetch")
+        rows_in: Rows the stage starts from, if known
+        report: Report or sheet the stage works on (defaults to the
+            thread's report node)
+    """
+    record = {
+        "stage": name,
+        "report": report or getattr(_local, "report", None),
+        "started": datetime.now().isoformat(timespec='seconds'),
+        "wall_s": None,
+        "rows_in": rows_in,
+        "rows_out": None,
+        "http_requests": 0,
+        "http_bytes": 0,
+        "http_retries": 0,
+        "bytes_written": None,
+        "peak_rss_mb": None,
+        "status": "ok",
+    }
+    stack = _stack()
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record["status"] = "error"
+        raise
+    finally:
+        record["wall_s"] = round(time.perf_counter() - start, 4)
+        rss = peak_rss_mb()
+        record["peak_rss_mb"] = round(rss, 1) if rss is not None else None
+        stack.pop()
+        with _lock:
+            _records.append(record)
+
+
+def record_http(nbytes, retries=0):
+    """Count an HTTP response (or a retry) in this thread's open stages."""
+    for record in _stack():
+        if retries:
+            record["http_retries"] += retries
+        else:
+            record["http_requests"] += 1
+            record["http_bytes"] += nbytes
+
+
+def _summary(records):
+    """Per (stage, report) totals of the records."""
+    totals = {}
+    for r in records:
+        key = (r["stage"], r["report"])
+        t = totals.setdefault(key, {
+            "stage": r["stage"], "report": r["report"], "count": 0, "errors": 0,
+            "wall_s": 0.0, "rows_in": 0, "rows_out": 0, "http_requests": 0,
+            "http_bytes": 0, "http_retries": 0, "bytes_written": 0, "peak_rss_mb": None,
+        })
+        t["count"] += 1
+        t["errors"] += r["status"] != "ok"
+        t["wall_s"] += r["wall_s"] or 0
+        for field in ("rows_in", "rows_out", "http_requests", "http_bytes", "http_retries",
+                      "bytes_written"):
+            t[field] += r[field] or 0
+        if r["peak_rss_mb"] is not None:
+            t["peak_rss_mb"] = max(t["peak_rss_mb"] or 0, r["peak_rss_mb"])
+
+    for t in totals.values():
+        t["wall_s"] = round(t["wall_s"], 4)
+        rows = t["rows_out"] or t["rows_in"]
+        t["rows_per_s"] = round(rows / t["wall_s"], 1) if rows and t["wall_s"] else None
+    return list(totals.values())
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _prometheus_text(report_data):
+    """Render a run report in the Prometheus text exposition format."""
+    metrics = [
+        ("stage_seconds", "wall_s", "Wall time of a stage in the last run"),
+        ("stage_rows_in", "rows_in", "Rows entering a stage in the last run"),
+        ("stage_rows_out", "rows_out", "Rows leaving a stage in the last run"),
+        ("stage_http_requests", "http_requests", "HTTP requests made by a stage in the last run"),
+        ("stage_http_bytes", "http_bytes", "HTTP bytes received by a stage in the last run"),
+        ("stage_http_retries", "http_retries", "HTTP retries of a stage in the last run"),
+        ("stage_errors", "errors", "Failed runs of a stage in the last run"),
+    ]
+    lines = []
+    for metric, field, help_text in metrics:
+        name = f"{METRIC_PREFIX}_{metric}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for t in report_data["stages"]:
+            labels = f'stage="{_label(t["stage"])}",report="{_label(t["report"] or "")}"'
+            lines.append(f"{name}{{{labels}}} {t[field]}")
+
+    run_metrics = [
+        ("run_seconds", report_data["wall_s"], "Wall time of the last run"),
+        ("run_peak_rss_bytes", int((report_data["peak_rss_mb"] or 0) * 1024 * 1024),
+         "Peak resident set size of the last run"),
+        ("run_timestamp_seconds", int(report_data["finished_ts"]), "End time of the last run"),
+    ]
+    for metric, value, help_text in run_metrics:
+        name = f"{METRIC_PREFIX}_{metric}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def write_run_report(raw_folder, prometheus_file=None):
+    """Write the run's telemetry next to its reports.
+
+    Args:
+        raw_folder: Raw reports folder of the run
+        prometheus_file: Prometheus text file path (defaults to
+            config.TELEMETRY_PROMETHEUS_FILE; None skips it)
+
+    Returns:
+        Path of the JSON run report
+    """
+    if prometheus_file is None:
+        prometheus_file = TELEMETRY_PROMETHEUS_FILE
+    with _lock:
+        records = list(_records)
+        run = dict(_run)
+
+    finished = time.time()
+    rss = peak_rss_mb()
+    report_data = dict(
+        run,
+        started=datetime.fromtimestamp(run["started"]).isoformat(timespec='seconds'),
+        finished=datetime.fromtimestamp(finished).isoformat(timespec='seconds'),
+        finished_ts=finished,
+        wall_s=round(finished - run["started"], 3),
+        peak_rss_mb=round(rss, 1) if rss is not None else None,
+        stages=_summary(records),
+        records=records,
+    )
+
+    folder = os.path.join(raw_folder, TELEMETRY_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    name = run["run"] or datetime.fromtimestamp(finished).strftime("%d.%m.%Y_%H-%M-%S")
+    path = os.path.join(folder, f"{name}.json")
+    _write_atomic(path, json.dumps(report_data, indent=2))
+    if prometheus_file:
+        _write_atomic(prometheus_file, _prometheus_text(report_data))
+
+    slowest = sorted(report_data["stages"], key=lambda t: t["wall_s"], reverse=True)[:3]
+    print(f"✓ Run telemetry: {len(records)} stages, {report_data['wall_s']:.0f}s → "
+          f"{os.path.relpath(path, raw_folder)}")
+    for t in slowest:
+        where = f" ({t['report']})" if t["report"] else ""
+        print(f"  • {t['stage']}{where}: {t['wall_s']:.1f}s")
+    return path
@@ -0,0 +1,182 @@
+"""Per-template column schemas for Wialon report tables.
+
+Each report template declares the roles its processor needs (unit, time,
+location, speed, count, event text, ...) and how to recognise them in the
+report header. A header is resolved once per distinct (template id,
+header) pair and the result is cached, so processors no longer rescan
+columns on every run. If a template's header changes so that a required
+role cannot be found, resolution raises SchemaError instead of letting a
+processor silently work on the wrong column.
+
+Role spec keys:
+    exact:    Column names matched case-insensitively, ignoring spaces
+              (tried first, in priority order)
+    contains: Substrings of the lower-cased column name (tried next,
+              each keyword in priority order)
+    exclude:  Substrings that disqualify a column
+    multiple: Resolve to the list of all matching columns
+    required: Raise SchemaError if nothing matches (default True)
+    dtype:    Target dtype applied by cast_columns() ('int', 'float' or 'str')
+"""
+
+import hashlib
+
+import pandas as pd
+
+
+class SchemaError(ValueError):
+    """Raised when a report header does not satisfy its template schema."""
+
+
+UNIT_KEYWORDS = ['unit', 'vehicle', 'truck', 'name', 'group', 'grouping', '№']
+
+SCHEMAS = {
+    # Speed violation
+    3: {
+        "unit": {"exact": ['Grouping'], "contains": UNIT_KEYWORDS, "required": False},
+        "speed": {"contains": ['speed', 'km/h', 'kph', 'kmh']},
+        "time": {"exact": ['Time'], "required": False},
+        "datetime_columns": {"contains": ['time', 'date'], "multiple": True, "required": False},
+    },
+
+    # Night driving
+    6: {
+        "unit": {"exact": ['Grouping'], "contains": UNIT_KEYWORDS, "required": False},
+        "begin": {"exact": ['Beginning'], "contains": ['begin', 'start']},
+        "end": {"contains": ['end', 'finish'], "multiple": True, "required": False},
+        "location": {
+            "contains": ['initial location', 'initial_location', 'location',
+                         'begin location', 'start location', 'place', 'address'],
+            "exclude": ['time', 'date'],
+        },
+    },
+
+    # Idling
+    11: {
+        "unit": {"contains": UNIT_KEYWORDS},
+        "event_text": {
+            "exact": ['Event text', 'Notification text', 'Event type', 'Event'],
+            "contains": ['text', 'message', 'notification', 'event'],
+            "required": False,
+        },
+        "event_type": {"exact": ['eventtype'], "contains": ['event type'], "required": False},
+    },
+
+    # Harsh brake detail (per unit)
+    41: {
+        "event_text": {"contains": ['event'], "exclude": ['time'], "required": False},
+    },
+
+    # Harsh brake summary (count only)
+    89: {
+        "unit": {"contains": ['grouping', 'group', 'vehicle', 'truck', 'name', 'unit']},
+        "count": {"contains": ['count', 'cnt', 'total'], "dtype": 'int'},
+    },
+}
+
+# (template_id, header signature) -> {role: column}
+_resolved_cache = {}
+
+
+def header_signature(columns):
+    """Return a short stable hash of a header (column names in order)."""
+    joined = '\x1f'.join(str(c) for c in columns)
+    return hashlib.sha1(joined.encode('utf-8')).hexdigest()[:16]
+
+
+def _normalize(name):
+    return str(name).lower().replace(' ', '')
+
+
+def _match_role(columns, spec):
+    """Return matching columns for one role spec, best first."""
+    exclude = spec.get("exclude", [])
+    candidates = [c for c in columns if not any(x in str(c).lower() for x in exclude)]
+    matches = []
+
+    for name in spec.get("exact", []):
+        target = _normalize(name)
+        for c in candidates:
+            if _normalize(c) == target and c not in matches:
+                matches.append(c)
+
+    for keyword in spec.get("contains", []):
+        for c in candidates:
+            if keyword in str(c).lower() and c not in matches:
+                matches.append(c)
+
+    if spec.get("multiple"):
+        # Keep header order for multi-column roles
+        return [c for c in columns if c in matches]
+    return matches
+
+
+def resolve_columns(template_id, columns):
+    """Resolve a template's column roles against a report header.
+
+    Args:
+        template_id: Wialon template ID
+        columns: Header (DataFrame columns or list of names)
+
+    Returns:
+        Dict of role -> column name (list for multi-column roles,
+        None for unmatched optional roles)
+
+    Raises:
+        SchemaError: If the template has no schema or a required role is missing
+    """
+    template_id = int(template_id)
+    columns = list(columns)
+    key = (template_id, header_signature(columns))
+    if key in _resolved_cache:
+        return _resolved_cache[key]
+
+    roles = SCHEMAS.get(template_id)
+    if roles is None:
+        raise SchemaError(f"No schema registered for template {template_id}")
+
+    resolved = {}
+    missing = []
+    for role, spec in roles.items():
+        matches = _match_role(columns, spec)
+        if spec.get("multiple"):
+            resolved[role] = matches
+        else:
+            resolved[role] = matches[0] if matches else None
+        if not matches and spec.get("required", True):
+            missing.append(role)
+
+    if missing:
+        raise SchemaError(
+            f"Template {template_id} header no longer matches its schema "
+            f"(missing {missing}); header: {columns}"
+        )
+
+    _resolved_cache[key] = resolved
+    return resolved
+
+
+def cast_columns(df, template_id, resolved):
+    """Apply the schema's target dtypes to resolved columns in place.
+
+    Args:
+        df: pandas DataFrame
+        template_id: Wialon template ID
+        resolved: Result of resolve_columns()
+
+    Returns:
+        The DataFrame
+    """
+    for role, spec in SCHEMAS.get(int(template_id), {}).items():
+        dtype = spec.get("dtype")
+        cols = resolved.get(role)
+        if dtype is None or not cols:
+            continue
+        for col in (cols if isinstance(cols, list) else [cols]):
+            if dtype == 'int':
+                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+            elif dtype == 'float':
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+            elif dtype == 'str':
+                df[col] = df[col].astype(str)
+    return df
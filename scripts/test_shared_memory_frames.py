@@ -0,0 +1,82 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+# Ensure project root is on sys.path so project modules can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import SHARED_MEMORY_MIN_BYTES
+from parallel import pack_frame, unpack_frame, release_blocks, partition_positions
+
+
+def test_round_trip_through_shared_memory():
+    # Numeric column large enough to go through a shared memory block
+    n = SHARED_MEMORY_MIN_BYTES // 8 + 1000
+    df = pd.DataFrame({
+        'Speed': np.arange(n, dtype='float64'),
+        'Grouping': ['T 123 ABC'] * n,
+    })
+
+    packed, handles = pack_frame(df)
+    try:
+        assert handles, "expected at least one shared memory block"
+        out = unpack_frame(packed)
+    finally:
+        release_blocks(handles)
+
+    pd.testing.assert_frame_equal(out, df)
+    print(f"Round trip OK: {len(out)} rows, {len(handles)} shared memory block(s)")
+
+
+def test_string_columns_use_shared_memory():
+    n = SHARED_MEMORY_MIN_BYTES + 1000
+    units = [f'T {i % 50} ABC' for i in range(n)]
+    df = pd.DataFrame({
+        'Grouping': pd.Series(units, dtype=object),
+        'Location': pd.Series(units, dtype='string'),
+    })
+
+    packed, handles = pack_frame(df)
+    try:
+        assert handles, "expected the string codes in shared memory"
+        assert len(packed["payload"]) < 10000, "string values were pickled in-band"
+        out = unpack_frame(packed)
+    finally:
+        release_blocks(handles)
+
+    pd.testing.assert_frame_equal(out, df)
+    print(f"String round trip OK: payload {len(packed['payload'])} bytes for {n} rows")
+
+
+def test_missing_strings_round_trip():
+    # Object columns with missing values stay in-band: None and NaN survive
+    df = pd.DataFrame({
+        'Grouping': ['T 1 ABC', 'T 2 ABC', 'T 1 ABC'],
+        'Driver': pd.Series([None, np.nan, 'A'], dtype=object),
+        'Location': pd.Series(['X', None, 'X'], dtype='string'),
+    })
+
+    packed, handles = pack_frame(df)
+    try:
+        out = unpack_frame(packed)
+    finally:
+        release_blocks(handles)
+
+    pd.testing.assert_frame_equal(out, df)
+    assert out['Driver'][0] is None
+    print("Missing strings OK")
+
+
+def test_partitions_ignore_surrounding_whitespace():
+    units = pd.Series(['T 1 ABC', 'T 1 ABC ', ' T 1 ABC', 'T 2 ABC', 'T 3 ABC'])
+    parts = partition_positions(units, 4)
+    owner = {pos: i for i, part in enumerate(parts) for pos in part}
+    assert owner[0] == owner[1] == owner[2]
+    print(f"Partitions OK: {[list(p) for p in parts]}")
+
+
+if __name__ == "__main__":
+    test_round_trip_through_shared_memory()
+    test_string_columns_use_shared_memory()
+    test_missing_strings_round_trip()
+    test_partitions_ignore_surrounding_whitespace()
@@ -0,0 +1,166 @@
+"""Declarative mapping of raw reports onto OVERALL workbook sheets.
+
+Each OVERALL sheet is described by a spec in config.OVERALL_SHEETS:
+which raw report feeds it, how raw columns are renamed, which columns
+are derived (report date, offense, constants), the output column order
+and the (truck, timestamp) dedupe key. prepare_sheet_data() applies a
+spec to a raw report; derived columns are computed for the whole column
+at once (timestamps are parsed once per distinct value), so adding a
+violation sheet only needs a new spec.
+
+Sheets with "rollups" also get per-truck per-day columns (events that
+day, a truck+date key and a Keep/Skip first-occurrence flag), computed
+by add_daily_rollups() for the new rows against the counts already in
+the violations store, and written as plain values.
+"""
+
+import numpy as np
+import pandas as pd
+
+from config import OVERALL_SHEETS, OFFENSE_HOURS, DAILY_ROLLUP_COLUMNS
+from dedupe_index import normalize_key_parts
+from timestamps import parse_times, format_times, DATE_FORMAT
+
+
+def derive_date(df, source):
+    """Report date (YYYY-MM-DD) of a timestamp column, '' where unparsed."""
+    return format_times(parse_times(df[source]), fmt=DATE_FORMAT, na_value='')
+
+
+def derive_offense(df, source):
+    """Offense label from the hour of a timestamp column (config.OFFENSE_HOURS)."""
+    hours = parse_times(df[source]).dt.hour
+    offense = np.full(len(df), '', dtype=object)
+    for label, label_hours in OFFENSE_HOURS.items():
+        offense[hours.isin(label_hours).to_numpy()] = label
+    return pd.Series(offense, index=df.index, dtype=object)
+
+
+def derive_constant(df, value):
+    """The same value on every row."""
+    return pd.Series(value, index=df.index, dtype=object)
+
+
+# Derivation name -> function(df, argument) -> Series
+DERIVATIONS = {
+    "date": derive_date,
+    "offense": derive_offense,
+    "constant": derive_constant,
+}
+
+
+def find_sheet(sheet_names, spec):
+    """Return the workbook sheet matching a spec, or None.
+
+    Args:
+        sheet_names: Sheet names in the workbook
+        spec: Sheet spec (uses "sheet_match")
+
+    Returns:
+        Sheet name or None
+    """
+    for pattern in spec["sheet_match"]:
+        for name in sheet_names:
+            if pattern in name.strip().upper():
+                return name
+    return None
+
+
+def prepare_sheet_data(raw_df, spec, index=None):
+    """Map a raw report onto an OVERALL sheet's columns.
+
+    Args:
+        raw_df: Raw report DataFrame
+        spec: Sheet spec from config.OVERALL_SHEETS
+        index: Optional SheetIndex of rows already in the sheet; matching
+            (truck, timestamp) pairs are dropped
+
+    Returns:
+        DataFrame with spec["target_columns"]
+    """
+    if '№' in raw_df.columns:
+        raw_df = raw_df.drop(columns=['№'])
+
+    raw_df = raw_df.rename(columns=spec["columns"])
+
+    for col, (derivation, argument) in spec.get("derived", {}).items():
+        if derivation != "constant" and argument not in raw_df.columns:
+            raw_df[col] = ''
+            continue
+        raw_df[col] = DERIVATIONS[derivation](raw_df, argument)
+
+    target_columns = spec["target_columns"]
+    for col in target_columns:
+        if col not in raw_df.columns:
+            raw_df[col] = ''
+
+    raw_df = raw_df[target_columns]
+
+    # Remove duplicates
+    if index is not None and len(index):
+        truck_col, time_col = spec["key"]
+        original_count = len(raw_df)
+        raw_df = raw_df[~index.contains(raw_df[truck_col], raw_df[time_col])]
+
+        removed = original_count - len(raw_df)
+        if removed > 0:
+            print(f"    Removed {removed} duplicate rows")
+
+    return raw_df
+
+
+def sheet_columns(spec):
+    """Return the columns written for a sheet (target + rollup columns)."""
+    columns = list(spec["target_columns"])
+    if spec.get("rollups"):
+        columns += list(DAILY_ROLLUP_COLUMNS.values())
+    return columns
+
+
+def add_daily_rollups(df, spec, prior_counts=None):
+    """Add per-truck per-day rollup columns to prepared rows.
+
+    Equivalent of the sheet formulas COUNTIFS(truck, date) for events per
+    truck per day, truck & "-" & date for the key and
+    IF(COUNTIF(key above)=1, "Keep", "Skip") for the first occurrence,
+    computed for the new rows only.
+
+    Args:
+        df: Prepared rows (spec["target_columns"])
+        spec: Sheet spec
+        prior_counts: Optional DataFrame (truck, rpt_date, events) of events
+            already stored, with normalised truck ids
+
+    Returns:
+        DataFrame with sheet_columns(spec)
+    """
+    if not spec.get("rollups"):
+        return df
+
+    truck_col, time_col = spec["key"]
+    trucks, _ = normalize_key_parts(df[truck_col], df[time_col])
+    dates = format_times(parse_times(df[time_col]), fmt=DATE_FORMAT, na_value='')
+    keys = pd.DataFrame({"truck": trucks.to_numpy(), "rpt_date": dates.to_numpy()})
+
+    prior = np.zeros(len(df), dtype=int)
+    if prior_counts is not None and not prior_counts.empty:
+        merged = keys.merge(prior_counts, on=["truck", "rpt_date"], how="left")
+        prior = merged["events"].fillna(0).astype(int).to_numpy()
+
+    batch = keys.groupby(["truck", "rpt_date"])["truck"].transform("size").to_numpy()
+    first = ~keys.duplicated(["truck", "rpt_date"]).to_numpy()
+
+    df = df.copy()
+    df[DAILY_ROLLUP_COLUMNS["events"]] = prior + batch
+    df[DAILY_ROLLUP_COLUMNS["key"]] = (
+        df[truck_col].astype('string').fillna('').str.strip() + '-' + dates.astype('string')
+    ).to_numpy(dtype=object)
+    df[DAILY_ROLLUP_COLUMNS["flag"]] = np.where(first & (prior == 0), "Keep", "Skip")
+    return df[sheet_columns(spec)]
+
+
+def get_sheet_specs(names=None):
+    """Return (name, spec) pairs of the configured OVERALL sheets."""
+    if names is None:
+        return list(OVERALL_SHEETS.items())
+    return [(name, OVERALL_SHEETS[name]) for name in names]
@@ -0,0 +1,87 @@
+"""Static summary sheets for the OVERALL workbook.
+
+The workbook's pivot tables summarise the violation sheets, and Excel
+rebuilds their caches from every row on refresh. The same summaries
+(violations per type, per truck and per report date) are computed here
+from the violations store's daily_counts table instead: it already holds
+one row per (type, truck, date), kept current by an insert trigger, so
+the work depends on the number of truck-days rather than on the size of
+the history. The results are written as plain value sheets
+(config.OVERALL_SUMMARY_SHEETS) on every append.
+"""
+
+import pandas as pd
+
+from config import OVERALL_SUMMARY_SHEETS
+from sheet_mapping import get_sheet_specs
+
+TOTAL_COLUMN = "TOTAL"
+
+
+def _by(counts, field, label, titles):
+    """Pivot events to one row per field value and one column per type."""
+    table = counts.pivot_table(index=field, columns="type", values="events",
+                               aggfunc="sum", fill_value=0)
+    table = table.reindex(columns=[t for t in titles if t in table.columns])
+    table = table.rename(columns=titles)
+    table[TOTAL_COLUMN] = table.sum(axis=1)
+    return table.rename_axis(label).reset_index()
+
+
+def build_summaries(store, date_from=None, date_to=None):
+    """Compute the summary tables from the store's per-truck per-day counts.
+
+    Args:
+        store: ViolationStore
+        date_from: First report date (YYYY-MM-DD), inclusive
+        date_to: Last report date (YYYY-MM-DD), inclusive
+
+    Returns:
+        Dict of sheet name -> DataFrame, for the summaries enabled in
+        config.OVERALL_SUMMARY_SHEETS
+    """
+    if not OVERALL_SUMMARY_SHEETS:
+        return {}
+
+    titles = {name: spec["title"] for name, spec in get_sheet_specs()}
+    counts = store.daily_totals(date_from, date_to)
+    counts = counts[counts["type"].isin(titles)]
+
+    summaries = {}
+    for summary, sheet_name in OVERALL_SUMMARY_SHEETS.items():
+        if summary == "type":
+            grouped = counts.groupby("type")
+            table = pd.DataFrame({
+                "VIOLATIONS": grouped["events"].sum(),
+                "TRUCKS": grouped["truck"].nunique(),
+                "DAYS": grouped["rpt_date"].nunique(),
+            }).reindex(list(titles), fill_value=0)
+            table.index = [titles[t] for t in table.index]
+            table = table.rename_axis("VIOLATION TYPE").reset_index()
+        elif summary == "truck":
+            table = _by(counts, "truck", "TRUCK NO", titles)
+            table = table.sort_values([TOTAL_COLUMN, "TRUCK NO"], ascending=[False, True])
+        elif summary == "day":
+            table = _by(counts[counts["rpt_date"] != ''], "rpt_date", "RPT_DT", titles)
+            table = table.sort_values("RPT_DT", ascending=False)
+        else:
+            raise ValueError(f"Unknown summary '{summary}'; use type, truck or day")
+        summaries[sheet_name] = table.reset_index(drop=True)
+    return summaries
+
+
+def write_summaries(appender, store):
+    """Replace the summary sheets of an open OVERALL workbook.
+
+    Args:
+        appender: Open workbook appender
+        store: ViolationStore holding every appended violation
+
+    Returns:
+        Dict of sheet name -> rows written
+    """
+    written = {}
+    for sheet_name, table in build_summaries(store).items():
+        appender.write_sheet(sheet_name, table)
+        written[sheet_name] = len(table)
+    return written
@@ -0,0 +1,163 @@
+"""Timestamp codec shared by the Wialon client, processors and OVERALL appender.
+
+Wialon report cells arrive as text in a handful of known layouts. Parsing
+uses those explicit formats on the distinct values of a column only, the
+Tanzania offset (UTC+3, no DST) is applied as plain arithmetic, and ISO
+output is produced by numpy rather than per-element strftime.
+"""
+
+import numpy as np
+import pandas as pd
+
+from config import TANZANIA_TIMEZONE_OFFSET
+
+# Output layout used across raw reports and the OVERALL workbook
+ISO_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = '%Y-%m-%d'
+
+# Formats seen in Wialon report cells and in our own outputs, tried in order
+WIALON_TIME_FORMATS = [
+    ISO_FORMAT,
+    '%d.%m.%Y %I:%M:%S %p',   # 07.01.2026 07:44:06 am (Wialon default)
+    '%d.%m.%Y %H:%M:%S',
+    '%d.%m.%Y %H:%M',
+    '%Y-%m-%d %H:%M',
+    DATE_FORMAT,
+    '%d.%m.%Y',
+]
+
+TANZANIA_OFFSET = pd.Timedelta(seconds=TANZANIA_TIMEZONE_OFFSET)
+
+# Column-name fragments that mark a column as a timestamp column
+TIME_COLUMN_KEYWORDS = ('time', 'date', 'last')
+
+
+def is_time_column(col):
+    """Return True if the column name looks like a timestamp column."""
+    lc = str(col).lower()
+    return any(k in lc for k in TIME_COLUMN_KEYWORDS)
+
+
+def parse_times(values, formats=None):
+    """Parse time values with explicit formats, once per distinct value.
+
+    Timezone-aware input is converted to naive UTC; naive values are
+    returned as-is (they are treated as UTC by to_tanzania()).
+
+    Args:
+        values: pandas Series (or array-like) of strings or datetimes
+        formats: List of strptime formats to try in order
+            (defaults to WIALON_TIME_FORMATS)
+
+    Returns:
+        datetime64[ns] Series aligned with the input (NaT where unparsed)
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if getattr(series.dt, 'tz', None) is not None:
+            series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+        return series.astype('datetime64[ns]')
+
+    codes, uniques = pd.factorize(series.astype('string').str.strip())
+    unique_text = pd.Series(np.asarray(uniques, dtype=object))
+    parsed = pd.Series(pd.NaT, index=unique_text.index, dtype='datetime64[ns]')
+
+    for fmt in formats or WIALON_TIME_FORMATS:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(unique_text[missing], format=fmt, errors='coerce')
+
+    # Code -1 (missing input) picks the trailing NaT
+    lookup = np.append(parsed.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+    return pd.Series(lookup[codes], index=series.index, dtype='datetime64[ns]')
+
+
+def to_tanzania(parsed):
+    """Shift naive UTC times to Tanzania local time (UTC+3)."""
+    return parsed + TANZANIA_OFFSET
+
+
+def format_times(parsed, fmt=ISO_FORMAT, na_value=np.nan):
+    """Format a datetime Series as strings.
+
+    ISO and date-only output are produced directly by numpy; other formats
+    are rendered once per distinct timestamp.
+
+    Args:
+        parsed: datetime64 Series
+        fmt: strftime format
+        na_value: Value used for NaT entries
+
+    Returns:
+        object Series of strings
+    """
+    mask = parsed.notna().to_numpy()
+    arr = parsed.to_numpy(dtype='datetime64[ns]')
+
+    if fmt in (ISO_FORMAT, DATE_FORMAT):
+        unit = 's' if fmt == ISO_FORMAT else 'D'
+        text = np.char.replace(np.datetime_as_string(arr, unit=unit), 'T', ' ')
+        out = text.astype(object)
+    else:
+        codes, uniques = pd.factorize(parsed)
+        rendered = np.asarray(pd.DatetimeIndex(uniques).strftime(fmt), dtype=object)
+        out = np.append(rendered, na_value)[codes]
+
+    out[~mask] = na_value
+    return pd.Series(out, index=parsed.index, dtype=object)
+
+
+def convert_timestamps_to_tanzania(df):
+    """Convert timestamp columns in a report DataFrame to Tanzania time.
+
+    Columns whose name contains "time", "date" or "last" are parsed with
+    the known Wialon formats and rewritten as YYYY-MM-DD HH:MM:SS local
+    strings. A column in which no value parses is left untouched.
+
+    Args:
+        df: pandas DataFrame
+
+    Returns:
+        Modified DataFrame
+    """
+    for col in list(df.columns):
+        if not is_time_column(col):
+            continue
+        parsed = parse_times(df[col])
+        if parsed.isna().all():
+            continue
+        df[col] = format_times(to_tanzania(parsed))
+    print('✓ Converted timestamps to Tanzania time where applicable')
+    return df
+
+
+def format_time_value(tv):
+    """Format a single time value as an ISO string in Tanzania time.
+
+    Naive values are kept as they are; timezone-aware values are converted.
+
+    Args:
+        tv: Time value (string, datetime, or timestamp)
+
+    Returns:
+        Formatted time string, the stripped input if it does not parse,
+        or empty string if empty
+    """
+    if isinstance(tv, (pd.Timestamp, np.datetime64)) or hasattr(tv, 'tzinfo'):
+        ts = pd.Timestamp(tv)
+        if pd.isna(ts):
+            return ''
+        if ts.tz is not None:
+            ts = ts.tz_convert('UTC').tz_localize(None) + TANZANIA_OFFSET
+        return ts.strftime(ISO_FORMAT)
+
+    parsed = parse_times(pd.Series([tv], dtype=object)).iloc[0]
+    if pd.notna(parsed):
+        return parsed.strftime(ISO_FORMAT)
+
+    s_tv = str(tv).strip()
+    if s_tv.lower() in ('nan', 'none', 'nat', ''):
+        return ''
+    return s_tv
@@ -4,6 +4,11 @@ import pandas as pd
 import pytz
 from datetime import datetime, timezone, timedelta
 
+# Timestamp parsing/formatting lives in the shared codec
+from timestamps import convert_timestamps_to_tanzania, format_time_value
+# Debug JSON goes through the bounded background writer
+from debug_capture import save_debug_json  # noqa: F401
+
 
 def get_tanzania_timezone():
     """Returns Tanzania timezone object (UTC+3)."""
@@ -37,69 +42,6 @@ def get_timestamp_string():
     return datetime.now(tz).strftime("%d.%m.%Y_%H-%M-%S")
 
 
-def format_time_value(tv):
-    """Format a time value to ISO string in Tanzania timezone.
-    
-    Args:
-        tv: Time value (string, datetime, or timestamp)
-        
-    Returns:
-        Formatted time string or empty string if invalid
-    """
-    try:
-        parsed = pd.to_datetime(tv, errors='coerce', dayfirst=False)
-        if pd.isna(parsed):
-            parsed = pd.to_datetime(tv, errors='coerce', dayfirst=True)
-        if pd.isna(parsed):
-            s_tv = str(tv).strip()
-            if s_tv.lower() in ('nan', 'none', ''):
-                return ''
-            return s_tv
-            
-        if getattr(parsed, 'tz', None) is None:
-            return parsed.strftime('%Y-%m-%d %H:%M:%S')
-        else:
-            tz_tz = get_tanzania_timezone()
-            parsed = parsed.tz_convert(tz_tz)
-            return parsed.strftime('%Y-%m-%d %H:%M:%S')
-    except Exception:
-        s_tv = str(tv).strip()
-        if s_tv.lower() in ('nan', 'none', ''):
-            return ''
-        return s_tv
-
-
-def convert_timestamps_to_tanzania(df):
-    """Convert datetime columns in DataFrame to Tanzania timezone.
-    
-    Args:
-        df: pandas DataFrame
-        
-    Returns:
-        Modified DataFrame
-    """
-    try:
-        tz_tz = get_tanzania_timezone()
-        for col in list(df.columns):
-            lc = col.lower()
-            if 'time' in lc or 'date' in lc or 'last' in lc:
-                try:
-                    df[col] = pd.to_datetime(df[col], errors='coerce', utc=True)
-                    df[col] = df[col].dt.tz_convert(tz_tz)
-                    df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-                except Exception:
-                    try:
-                        df[col] = pd.to_datetime(df[col], errors='coerce')
-                        df[col] = df[col].dt.tz_localize(pytz.UTC).dt.tz_convert(tz_tz)
-                        df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-                    except Exception:
-                        pass
-        print('✓ Converted timestamps to Tanzania time where applicable')
-    except Exception:
-        pass
-    return df
-
-
 def find_column(df, keywords):
     """Find a column in DataFrame by matching keywords.
     
@@ -189,20 +131,3 @@ def extract_speed_from_text(text):
         return f"{m2.group(1)} km/h"
     
     return None
-
-
-def save_debug_json(data, output_path, suffix):
-    """Save debug JSON file.
-    
-    Args:
-        data: Data to save
-        output_path: Base output path
-        suffix: Suffix for debug filename
-    """
-    import json
-    debug_path = output_path.replace(".xlsx", f"_{suffix}.json")
-    try:
-        with open(debug_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-    except Exception:
-        pass
\ No newline at end of file
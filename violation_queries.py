@@ -0,0 +1,191 @@
+"""Queries over the stored violation history (violations_store.py).
+
+Filters (type, date range, truck, group, location) are pushed down into
+the SQL WHERE clause, where the type+date and truck+date indexes narrow
+the scan before any row is read; grouping and counting also run inside
+SQLite, so only the aggregated result reaches pandas.
+
+Usage:
+    python violation_queries.py [--type SPEED] [--from 2026-01-01] [--to 2026-01-31]
+                                [--truck T123ABC] [--group TRANSIT_ALL_TRUCKS]
+                                [--location Mbeya] [--by truck,type] [--top 10]
+                                [--folder <overall_folder>] [--csv out.csv]
+"""
+
+import os
+import sqlite3
+
+import pandas as pd
+
+from violations_store import ViolationStore, get_store_path
+
+# Fields that can be filtered / grouped on -> SQL expression
+GROUP_FIELDS = {
+    "type": "type",
+    "truck": "truck",
+    "group": "group_name",
+    "location": "location",
+    "date": "rpt_date",
+    "month": "substr(rpt_date, 1, 7)",
+    "hour": "substr(event_time, 12, 2)",
+}
+
+LIST_COLUMNS = ["type", "truck", "event_time", "rpt_date", "group_name", "location"]
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+def build_where(types=None, trucks=None, groups=None, date_from=None, date_to=None,
+                location=None):
+    """Build a WHERE clause and its parameters from query filters.
+
+    Args:
+        types: Violation type(s) (OVERALL_SHEETS keys)
+        trucks: Truck id(s) (matched case-insensitively, spaces stripped)
+        groups: Group name(s)
+        date_from: First report date (YYYY-MM-DD), inclusive
+        date_to: Last report date (YYYY-MM-DD), inclusive
+        location: Substring of the location (case-insensitive)
+
+    Returns:
+        Tuple of (sql string starting with ' WHERE' or '', params list)
+    """
+    clauses = []
+    params = []
+
+    for column, values in (("type", [t.upper() for t in _as_list(types)]),
+                           ("truck", [t.strip().upper() for t in _as_list(trucks)]),
+                           ("group_name", _as_list(groups))):
+        if values:
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    if date_from:
+        clauses.append("rpt_date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("rpt_date <= ?")
+        params.append(date_to)
+    if location:
+        clauses.append("location LIKE ?")
+        params.append(f"%{location}%")
+
+    sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return sql, params
+
+
+def query_violations(store, by=None, top=None, limit=None, **filters):
+    """Count or list stored violations.
+
+    Args:
+        store: ViolationStore (or sqlite3 connection)
+        by: Field name(s) to group on (see GROUP_FIELDS); None lists rows
+        top: Keep only the N largest groups
+        limit: Maximum rows when listing
+        **filters: Filters accepted by build_where()
+
+    Returns:
+        DataFrame of grouped counts (sorted by count, descending) or of
+        matching violations (newest first)
+    """
+    conn = store.conn if isinstance(store, ViolationStore) else store
+    where, params = build_where(**filters)
+
+    by = _as_list(by)
+    if by:
+        unknown = [b for b in by if b not in GROUP_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown group field(s) {unknown}; use {sorted(GROUP_FIELDS)}")
+        fields = ", ".join(f"{GROUP_FIELDS[b]} AS \"{b}\"" for b in by)
+        group = ", ".join(GROUP_FIELDS[b] for b in by)
+        sql = (f"SELECT {fields}, COUNT(*) AS violations FROM violations{where} "
+               f"GROUP BY {group} ORDER BY violations DESC, {group}")
+        if top:
+            sql += f" LIMIT {int(top)}"
+    else:
+        sql = (f"SELECT {', '.join(LIST_COLUMNS)} FROM violations{where} "
+               f"ORDER BY event_time DESC")
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+
+    return pd.read_sql_query(sql, conn, params=params)
+
+
+def truck_trend(store, truck, freq="date", **filters):
+    """Violations per day (or month) and type for one truck.
+
+    Args:
+        store: ViolationStore
+        truck: Truck id
+        freq: "date" or "month"
+        **filters: Further filters accepted by build_where()
+
+    Returns:
+        DataFrame indexed by period with one column per violation type
+    """
+    counts = query_violations(store, by=[freq, "type"], trucks=truck, **filters)
+    if counts.empty:
+        return counts
+    return counts.pivot_table(index=freq, columns="type", values="violations",
+                              fill_value=0).sort_index()
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Query stored violation history")
+    parser.add_argument("--folder", default=".", help="OVERALL folder holding the store")
+    parser.add_argument("--type", action="append", dest="types", help="Violation type (repeatable)")
+    parser.add_argument("--truck", action="append", dest="trucks", help="Truck id (repeatable)")
+    parser.add_argument("--group", action="append", dest="groups", help="Group name (repeatable)")
+    parser.add_argument("--from", dest="date_from", help="First report date YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", help="Last report date YYYY-MM-DD")
+    parser.add_argument("--location", help="Location substring")
+    parser.add_argument("--by", help=f"Group by (comma separated): {', '.join(GROUP_FIELDS)}")
+    parser.add_argument("--top", type=int, help="Only the N largest groups")
+    parser.add_argument("--limit", type=int, default=50, help="Rows to list without --by")
+    parser.add_argument("--csv", help="Write the result to this CSV file")
+    args = parser.parse_args(argv)
+
+    path = get_store_path(args.folder)
+    if not os.path.exists(path):
+        print(f"✗ No violations store at {path}")
+        return 1
+
+    started = time.perf_counter()
+    with ViolationStore(path) as store:
+        try:
+            result = query_violations(
+                store,
+                by=args.by.split(",") if args.by else None,
+                top=args.top,
+                limit=args.limit,
+                types=args.types,
+                trucks=args.trucks,
+                groups=args.groups,
+                date_from=args.date_from,
+                date_to=args.date_to,
+                location=args.location,
+            )
+        except (ValueError, sqlite3.Error) as e:
+            print(f"✗ {e}")
+            return 1
+    elapsed = time.perf_counter() - started
+
+    if args.csv:
+        result.to_csv(args.csv, index=False)
+        print(f"✓ Saved {len(result)} rows to {args.csv}")
+    else:
+        print(result.to_string(index=False) if not result.empty else "No matching violations")
+    print(f"\n({len(result)} rows in {elapsed * 1000:.0f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,332 @@
+"""SQLite store of all appended violations (the source of truth).
+
+Every row prepared for an OVERALL sheet is inserted here, keyed by
+violation type (the OVERALL_SHEETS key) and the normalised (truck,
+timestamp) pair, so re-inserting a report is a no-op. Rows are indexed
+by type + report date and by truck + report date, and a trigger keeps
+per-truck per-day event counts (daily_counts) up to date on insert. The full sheet row is
+kept as JSON in the sheet's target column order, so the OVERALL workbook
+can be regenerated for any date range with export_overall(), which
+streams rows from the database into a write-only workbook.
+
+Usage:
+    python violations_store.py import <OVERALL workbook> [overall_folder]
+    python violations_store.py export <output.xlsx> [date_from] [date_to] [overall_folder]
+"""
+
+import os
+import json
+import sqlite3
+from datetime import datetime, date
+
+import pandas as pd
+
+from config import VIOLATIONS_DB_FILE
+from dedupe_index import normalize_key_parts
+from sheet_mapping import get_sheet_specs, find_sheet, sheet_columns, add_daily_rollups
+from timestamps import parse_times, format_times, DATE_FORMAT
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS violations (
+    id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    truck TEXT NOT NULL,
+    event_time TEXT NOT NULL,
+    rpt_date TEXT,
+    group_name TEXT,
+    location TEXT,
+    source TEXT,
+    data TEXT NOT NULL,
+    UNIQUE (type, truck, event_time)
+);
+CREATE INDEX IF NOT EXISTS idx_violations_type_date ON violations (type, rpt_date);
+CREATE INDEX IF NOT EXISTS idx_violations_truck_date ON violations (truck, rpt_date);
+CREATE INDEX IF NOT EXISTS idx_violations_date ON violations (rpt_date, type, truck, group_name);
+
+CREATE TABLE IF NOT EXISTS daily_counts (
+    type TEXT NOT NULL,
+    truck TEXT NOT NULL,
+    rpt_date TEXT NOT NULL,
+    events INTEGER NOT NULL,
+    PRIMARY KEY (type, truck, rpt_date)
+);
+CREATE TRIGGER IF NOT EXISTS trg_daily_counts AFTER INSERT ON violations
+BEGIN
+    INSERT INTO daily_counts (type, truck, rpt_date, events)
+    VALUES (NEW.type, NEW.truck, COALESCE(NEW.rpt_date, ''), 1)
+    ON CONFLICT (type, truck, rpt_date) DO UPDATE SET events = events + 1;
+END;
+"""
+
+EXPORT_BATCH_SIZE = 5000
+
+
+def _json_value(value):
+    """Make a cell value JSON-serializable."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def get_store_path(overall_folder):
+    """Return the violations database path for an OVERALL folder."""
+    return os.path.join(overall_folder, VIOLATIONS_DB_FILE)
+
+
+class ViolationStore:
+    """Indexed violation history backed by SQLite."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._backfill_daily_counts()
+
+    def _backfill_daily_counts(self):
+        """Fill daily_counts for a store created before the table existed."""
+        has_counts = self.conn.execute("SELECT 1 FROM daily_counts LIMIT 1").fetchone()
+        has_rows = self.conn.execute("SELECT 1 FROM violations LIMIT 1").fetchone()
+        if has_rows and not has_counts:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO daily_counts (type, truck, rpt_date, events) "
+                    "SELECT type, truck, COALESCE(rpt_date, ''), COUNT(*) FROM violations "
+                    "GROUP BY type, truck, COALESCE(rpt_date, '')"
+                )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def insert(self, violation_type, df, spec, group_name=None, source=None):
+        """Insert prepared sheet rows, ignoring (truck, timestamp) pairs already stored.
+
+        Args:
+            violation_type: OVERALL_SHEETS key (e.g. "IDLING")
+            df: DataFrame with sheet_columns(spec)
+            spec: Sheet spec
+            group_name: Wialon group the rows were pulled for
+            source: Raw report file name
+
+        Returns:
+            Number of rows inserted
+        """
+        if df.empty:
+            return 0
+
+        truck_col, time_col = spec["key"]
+        trucks, times = normalize_key_parts(df[truck_col], df[time_col])
+        rpt_dates = format_times(parse_times(df[time_col]), fmt=DATE_FORMAT, na_value=None)
+        location_col = spec.get("location")
+        locations = (df[location_col].astype('string').fillna('').tolist()
+                     if location_col in df.columns else [None] * len(df))
+
+        columns = [c for c in sheet_columns(spec) if c in df.columns]
+        records = [
+            (violation_type, truck, event_time, rpt_date, group_name, location, source,
+             json.dumps([_json_value(v) for v in row], ensure_ascii=False))
+            for truck, event_time, rpt_date, location, row in zip(
+                trucks.tolist(), times.tolist(), rpt_dates.tolist(), locations,
+                df[columns].itertuples(index=False, name=None)
+            )
+        ]
+
+        with self.conn:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO violations "
+                "(type, truck, event_time, rpt_date, group_name, location, source, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+        # rowcount excludes the daily_counts trigger's changes
+        return cursor.rowcount
+
+    def daily_counts(self, violation_type, dates):
+        """Return stored events per truck for the given report dates.
+
+        Args:
+            violation_type: OVERALL_SHEETS key
+            dates: Iterable of report dates (YYYY-MM-DD)
+
+        Returns:
+            DataFrame with columns truck, rpt_date, events
+        """
+        dates = sorted({d for d in dates if d})
+        if not dates:
+            return pd.DataFrame(columns=["truck", "rpt_date", "events"])
+        return pd.read_sql_query(
+            f"SELECT truck, rpt_date, events FROM daily_counts "
+            f"WHERE type = ? AND rpt_date IN ({', '.join('?' * len(dates))})",
+            self.conn, params=[violation_type] + dates
+        )
+
+    def daily_totals(self, date_from=None, date_to=None):
+        """Return the stored per-truck per-day counts of every type.
+
+        Args:
+            date_from: First report date (YYYY-MM-DD), inclusive
+            date_to: Last report date (YYYY-MM-DD), inclusive
+
+        Returns:
+            DataFrame with columns type, truck, rpt_date, events
+        """
+        sql = "SELECT type, truck, rpt_date, events FROM daily_counts WHERE 1 = 1"
+        params = []
+        if date_from:
+            sql += " AND rpt_date >= ?"
+            params.append(date_from)
+        if date_to:
+            sql += " AND rpt_date <= ?"
+            params.append(date_to)
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def iter_rows(self, violation_type, date_from=None, date_to=None):
+        """Yield stored sheet rows (lists) of one type, oldest first."""
+        sql = "SELECT data FROM violations WHERE type = ?"
+        params = [violation_type]
+        if date_from:
+            sql += " AND rpt_date >= ?"
+            params.append(date_from)
+        if date_to:
+            sql += " AND rpt_date <= ?"
+            params.append(date_to)
+        sql += " ORDER BY id"
+
+        cursor = self.conn.execute(sql, params)
+        while True:
+            batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not batch:
+                break
+            for (data,) in batch:
+                yield json.loads(data)
+
+    def count(self, violation_type=None):
+        """Return the number of stored rows (optionally of one type)."""
+        if violation_type is None:
+            return self.conn.execute("SELECT COUNT(*) FROM violations").fetchone()[0]
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM violations WHERE type = ?", (violation_type,)
+        ).fetchone()[0]
+
+
+def import_workbook(store, workbook_path):
+    """Load the rows of an existing OVERALL workbook into the store.
+
+    Args:
+        store: ViolationStore
+        workbook_path: OVERALL VIOLATIONS REPORT .xlsx
+
+    Returns:
+        Dict of violation type -> rows inserted
+    """
+    from xlsx_stream import XlsxPackage
+
+    package = XlsxPackage(workbook_path)
+    inserted = {}
+    try:
+        for violation_type, spec in get_sheet_specs():
+            sheet = find_sheet(package.sheet_names(), spec)
+            if not sheet:
+                print(f"  ⚠ Sheet for {spec['title']} not found")
+                continue
+            df = package.read_sheet(sheet)
+            for col in spec["target_columns"]:
+                if col not in df.columns:
+                    df[col] = ''
+            truck_col, time_col = spec["key"]
+            df = df[df[truck_col].notna() & (df[truck_col].astype(str).str.strip() != '')]
+            df = df[spec["target_columns"]]
+            if spec.get("rollups"):
+                dates = format_times(parse_times(df[time_col]), fmt=DATE_FORMAT, na_value='')
+                df = add_daily_rollups(df, spec, store.daily_counts(violation_type, dates))
+            inserted[violation_type] = store.insert(
+                violation_type, df, spec, source=os.path.basename(workbook_path)
+            )
+            print(f"  ✓ {spec['title']}: {inserted[violation_type]} of {len(df)} rows imported")
+    finally:
+        package.close()
+    return inserted
+
+
+def export_overall(store, output_path, date_from=None, date_to=None):
+    """Write an OVERALL workbook for a date range from the store.
+
+    Rows are streamed from the database into a write-only workbook, so
+    memory use does not grow with the range. The summary sheets
+    (summaries.py) are added after the violation sheets.
+
+    Args:
+        store: ViolationStore
+        output_path: Output .xlsx path
+        date_from: First report date (YYYY-MM-DD), inclusive
+        date_to: Last report date (YYYY-MM-DD), inclusive
+
+    Returns:
+        Dict of sheet title -> rows written
+    """
+    from openpyxl import Workbook
+    from summaries import build_summaries
+
+    wb = Workbook(write_only=True)
+    written = {}
+    for violation_type, spec in get_sheet_specs():
+        ws = wb.create_sheet(spec["title"])
+        header = sheet_columns(spec)
+        if spec["has_sn"]:
+            header = ['SN'] + header
+        ws.append(header)
+
+        n = 0
+        for row in store.iter_rows(violation_type, date_from, date_to):
+            n += 1
+            ws.append([n] + row if spec["has_sn"] else row)
+        written[spec["title"]] = n
+
+    for title, summary in build_summaries(store, date_from, date_to).items():
+        ws = wb.create_sheet(title)
+        ws.append(list(summary.columns))
+        for row in summary.itertuples(index=False, name=None):
+            ws.append(list(row))
+        written[title] = len(summary)
+
+    wb.save(output_path)
+    return written
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python violations_store.py import <OVERALL workbook> [overall_folder]")
+        print("       python violations_store.py export <output.xlsx> [date_from] [date_to] [overall_folder]")
+        sys.exit(1)
+
+    command, target = sys.argv[1], sys.argv[2]
+    if command == "import":
+        folder = sys.argv[3] if len(sys.argv) > 3 else os.path.dirname(os.path.abspath(target))
+        with ViolationStore(get_store_path(folder)) as store:
+            print(f"📥 Importing {os.path.basename(target)}...")
+            import_workbook(store, target)
+    else:
+        date_from = sys.argv[3] if len(sys.argv) > 3 else None
+        date_to = sys.argv[4] if len(sys.argv) > 4 else None
+        folder = sys.argv[5] if len(sys.argv) > 5 else os.path.dirname(os.path.abspath(target))
+        with ViolationStore(get_store_path(folder)) as store:
+            print(f"📤 Exporting {date_from or 'start'} → {date_to or 'today'}...")
+            for title, n in export_overall(store, target, date_from, date_to).items():
+                print(f"  ✓ {title}: {n} rows")
+        print(f"✓ Saved: {target}")
@@ -4,15 +4,31 @@ import os
 import json
 import time
 import requests
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 
+from config import MESSAGE_LOAD_LIMIT, HTTP_RETRIES, HTTP_RETRY_BACKOFF_SECONDS
+from debug_capture import save_debug_json
+from report_writers import write_report
+from timestamps import convert_timestamps_to_tanzania
+from run_telemetry import stage, record_http
+
 # Load environment variables
 load_dotenv()
 
 WIALON_TOKEN = os.getenv("WIALON_TOKEN")
 WIALON_API_URL = os.getenv("WIALON_API_URL")
 
+# messages/load_interval flags: message type lives in the high byte,
+# data-message content flags in the low byte.
+MESSAGE_TYPE_DATA = 0x0000
+MESSAGE_TYPE_MASK = 0xFF00
+MESSAGE_FLAG_POSITION = 0x0001
+
+# Plausible speed range in km/h
+MAX_VALID_SPEED = 400
+
 
 def get_local_timezone_offset():
     """Returns Tanzania timezone offset in seconds."""
@@ -36,39 +52,33 @@ def get_yesterday_interval():
     return int(start_dt.timestamp()), int(end_dt.timestamp())
 
 
-def convert_timestamps_to_tanzania(df):
-    """Convert datetime columns in DataFrame to Tanzania timezone."""
-    import pytz
-    try:
-        tz_tz = pytz.timezone('Africa/Dar_es_Salaam')
-        for col in list(df.columns):
-            lc = col.lower()
-            if 'time' in lc or 'date' in lc or 'last' in lc:
-                try:
-                    df[col] = pd.to_datetime(df[col], errors='coerce', utc=True)
-                    df[col] = df[col].dt.tz_convert(tz_tz)
-                    df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-                except Exception:
-                    try:
-                        df[col] = pd.to_datetime(df[col], errors='coerce')
-                        df[col] = df[col].dt.tz_localize(pytz.UTC).dt.tz_convert(tz_tz)
-                        df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-                    except Exception:
-                        pass
-        print('✓ Converted timestamps to Tanzania time where applicable')
-    except Exception:
-        pass
-    return df
-
-
-def save_debug_json(data, output_path, suffix):
-    """Save debug JSON file."""
-    debug_path = output_path.replace(".xlsx", f"_{suffix}.json")
-    try:
-        with open(debug_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-    except Exception:
-        pass
+def nearest_speed(messages, approx_ts=None):
+    """Return the pos.s speed of the message closest to approx_ts.
+
+    Args:
+        messages: List of position messages from WialonAPI.load_messages()
+        approx_ts: Target Unix timestamp; if None, the first valid speed wins
+
+    Returns:
+        Speed as float (km/h) or None if no message carries a valid speed
+    """
+    if not messages:
+        return None
+
+    n = len(messages)
+    times = np.fromiter((m.get("t", 0) for m in messages), dtype=float, count=n)
+    speeds = np.fromiter(
+        ((m.get("pos") or {}).get("s", np.nan) for m in messages), dtype=float, count=n
+    )
+    valid = (speeds >= 0) & (speeds < MAX_VALID_SPEED)
+    if not valid.any():
+        return None
+
+    if approx_ts is None:
+        return float(speeds[np.argmax(valid)])
+
+    distance = np.where(valid, np.abs(times - float(approx_ts)), np.inf)
+    return float(speeds[np.argmin(distance)])
 
 
 class WialonAPI:
@@ -81,6 +91,32 @@ class WialonAPI:
         self.token = WIALON_TOKEN
         self.api_url = WIALON_API_URL
         self.sid = None
+        # Headers and parsed cell text of the most recent report, in
+        # DataFrame row order (used by processors for exact backfills)
+        self.last_report_headers = []
+        self.last_report_rows = None
+
+    def _post(self, params, timeout=None, retry_timeouts=False):
+        """POST to the Wialon API, retrying connection errors.
+
+        Read timeouts are only retried for idempotent lookups
+        (retry_timeouts): a timed-out report execution may still be
+        running on the session, and a retry would start a second one.
+        Responses and retries are counted in the open telemetry stages.
+        """
+        retryable = (requests.ConnectionError, requests.Timeout) if retry_timeouts \
+            else requests.ConnectionError
+        for attempt in range(HTTP_RETRIES + 1):
+            try:
+                resp = requests.post(self.api_url, params=params, timeout=timeout)
+            except retryable:
+                if attempt == HTTP_RETRIES:
+                    raise
+                record_http(0, retries=1)
+                time.sleep(HTTP_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+                continue
+            record_http(len(resp.content))
+            return resp
 
     def login(self):
         """Login to Wialon API and establish session."""
@@ -88,8 +124,8 @@ class WialonAPI:
             "svc": "token/login",
             "params": json.dumps({"token": self.token})
         }
-        resp = requests.post(self.api_url, params=params)
-        data = resp.json()
+        with stage("login"):
+            data = self._post(params).json()
         
         if "eid" in data:
             self.sid = data["eid"]
@@ -102,10 +138,7 @@ class WialonAPI:
     def logout(self):
         """Logout from Wialon API."""
         if self.sid:
-            requests.post(
-                self.api_url, 
-                params={"svc": "core/logout", "sid": self.sid}
-            )
+            self._post({"svc": "core/logout", "sid": self.sid})
             print("✓ Logged out from Wialon")
 
     def find_group_id(self, group_name):
@@ -127,8 +160,8 @@ class WialonAPI:
             "sid": self.sid,
         }
         
-        resp = requests.post(self.api_url, params=params)
-        data = resp.json()
+        with stage("group_lookup"):
+            data = self._post(params, retry_timeouts=True).json()
         items = data.get("items") or []
         
         if items:
@@ -155,8 +188,7 @@ class WialonAPI:
         }
         
         try:
-            resp = requests.post(self.api_url, params=params, timeout=15)
-            data = resp.json()
+            data = self._post(params, timeout=15, retry_timeouts=True).json()
             items = data.get("items") or []
             if items:
                 return items[0].get("id")
@@ -164,6 +196,74 @@ class WialonAPI:
             pass
         return None
 
+    def load_messages(self, unit_id, time_from, time_to, fields="position", max_count=None):
+        """Load data messages for a unit, requesting only the fields a caller needs.
+
+        Server-side message buffers are always unloaded afterwards.
+
+        Args:
+            unit_id: Wialon unit ID
+            time_from: Interval start (Unix timestamp)
+            time_to: Interval end (Unix timestamp)
+            fields: "position" for time/position/speed only, or a list of
+                parameter names to keep from each message's "p" dict
+            max_count: Maximum number of messages to load
+                (defaults to config.MESSAGE_LOAD_LIMIT)
+
+        Returns:
+            List of trimmed message dicts (empty list on failure)
+        """
+        if max_count is None:
+            max_count = MESSAGE_LOAD_LIMIT
+
+        if fields == "position":
+            flags = MESSAGE_TYPE_DATA | MESSAGE_FLAG_POSITION
+            flags_mask = MESSAGE_TYPE_MASK | MESSAGE_FLAG_POSITION
+            param_names = None
+        else:
+            flags = MESSAGE_TYPE_DATA
+            flags_mask = MESSAGE_TYPE_MASK
+            param_names = list(fields or [])
+
+        params = {
+            "svc": "messages/load_interval",
+            "params": json.dumps({
+                "itemId": int(unit_id),
+                "timeFrom": int(time_from),
+                "timeTo": int(time_to),
+                "flags": flags,
+                "flagsMask": flags_mask,
+                "loadCount": int(max_count),
+            }),
+            "sid": self.sid,
+        }
+
+        try:
+            messages = self._post(params, timeout=30).json().get("messages") or []
+        finally:
+            self.unload_messages()
+
+        if param_names is None:
+            return [{"t": m.get("t", 0), "pos": m.get("pos") or {}} for m in messages]
+
+        trimmed = []
+        for m in messages:
+            p = m.get("p") or {}
+            trimmed.append({
+                "t": m.get("t", 0),
+                "p": {k: p[k] for k in param_names if k in p},
+            })
+        return trimmed
+
+    def unload_messages(self):
+        """Release messages loaded into the server-side session buffer."""
+        if not self.sid:
+            return
+        try:
+            self._post({"svc": "messages/unload", "params": "{}", "sid": self.sid}, timeout=15)
+        except Exception:
+            pass
+
     def get_unit_speed_at(self, unit_name, approx_ts=None):
         """Retrieve speed value for a unit at approximate timestamp.
         
@@ -194,80 +294,16 @@ class WialonAPI:
                 to_ts = int(approx_ts) + 120
                 from_ts = max(0, int(approx_ts) - 120)
 
-            # Load messages in time window
-            params = {
-                "svc": "messages/load_interval",
-                "params": json.dumps({
-                    "itemId": int(unit_id),
-                    "timeFrom": int(from_ts),
-                    "timeTo": int(to_ts),
-                    "flags": 0x0000,  # Basic message data
-                    "flagsMask": 0xFFFFFFFF
-                }),
-                "sid": self.sid,
-            }
-            
-            resp = requests.post(self.api_url, params=params, timeout=30)
-            data = resp.json()
-            
-            # Debug: save response
-            # print(f"    DEBUG: Messages response keys: {data.keys()}")
-            
-            messages = data.get("messages", [])
+            # Load position messages only (time + speed) in time window
+            messages = self.load_messages(unit_id, from_ts, to_ts, fields="position")
             if not messages:
                 print(f"    ⚠ No messages found for {unit_name} in time window")
                 return None
-            
-            # Find message closest to target timestamp
-            if approx_ts:
-                messages_sorted = sorted(messages, key=lambda m: abs(m.get("t", 0) - approx_ts))
-            else:
-                messages_sorted = messages
-            
-            # Extract speed from messages
-            for msg in messages_sorted:
-                speed = None
-                
-                # Method 1: Direct speed field in message
-                if "s" in msg:
-                    speed = msg["s"]
-                
-                # Method 2: Speed in position data
-                elif "pos" in msg and isinstance(msg["pos"], dict):
-                    if "s" in msg["pos"]:
-                        speed = msg["pos"]["s"]
-                
-                # Method 3: Speed in parameters
-                elif "p" in msg and isinstance(msg["p"], dict):
-                    if "speed" in msg["p"]:
-                        speed = msg["p"]["speed"]
-                    elif "s" in msg["p"]:
-                        speed = msg["p"]["s"]
-                
-                # Validate and format speed
-                if speed is not None:
-                    try:
-                        speed_val = float(speed)
-                        if 0 <= speed_val < 400:  # Reasonable speed range
-                            return f"{int(speed_val)} km/h"
-                    except (ValueError, TypeError):
-                        pass
-            
-            # If no direct speed field found, try text extraction as last resort
-            import re
-            for msg in messages_sorted[:5]:  # Check first 5 messages only
-                msg_str = str(msg)
-                
-                # Look for "52 km/h" pattern
-                match = re.search(r"(\d{1,3})\s*km[/\s]*h", msg_str, re.IGNORECASE)
-                if match:
-                    return f"{match.group(1)} km/h"
-                
-                # Look for "speed: 52" pattern
-                match2 = re.search(r"speed\s*[:\-]?\s*(\d{1,3})", msg_str, re.IGNORECASE)
-                if match2:
-                    return f"{match2.group(1)} km/h"
-            
+
+            speed_val = nearest_speed(messages, approx_ts)
+            if speed_val is not None:
+                return f"{int(speed_val)} km/h"
+
             print(f"    ⚠ Found {len(messages)} messages but no speed data for {unit_name}")
             
         except Exception as e:
@@ -279,8 +315,13 @@ class WialonAPI:
 
     def execute_report(self, group_id, template_id, output_path, 
                        interval_from=None, interval_to=None, 
-                       processor_func=None):
-        """Execute a Wialon report and save to Excel."""
+                       processor_func=None, keep_rows=False, formats=None):
+        """Execute a Wialon report and save to Excel.
+
+        keep_rows also stores the raw rows as <report>_rows.json.gz for
+        nodes that read them back (debug_capture.load_debug_json).
+        formats lists extra output formats (report_writers.write_report).
+        """
         tz_offset = get_local_timezone_offset()
         
         if interval_from is None and interval_to is None:
@@ -303,8 +344,8 @@ class WialonAPI:
             "sid": self.sid,
         }
 
-        resp = requests.post(self.api_url, params=params, timeout=30)
-        data = resp.json()
+        with stage("exec_report"):
+            data = self._post(params, timeout=30).json()
         
         if "reportResult" not in data:
             print("✗ Report execution failed:", data)
@@ -327,30 +368,49 @@ class WialonAPI:
             print("✗ Report has zero rows")
             return False
 
-        rows_list = self._fetch_report_rows(row_count, output_path)
+        with stage("row_fetch", rows_in=row_count) as st:
+            rows_list = self._fetch_report_rows(row_count, output_path)
+            st["rows_out"] = len(rows_list)
         
         if not rows_list:
             print("✗ No rows extracted")
             return False
 
-        parsed_rows = self._parse_rows(rows_list)
+        if keep_rows:
+            save_debug_json(rows_list, output_path, "rows", required=True)
+
+        with stage("parse", rows_in=len(rows_list)) as st:
+            parsed_rows = self._parse_rows(rows_list)
+            st["rows_out"] = len(parsed_rows)
         
         if not parsed_rows:
             print("✗ No parsed rows extracted")
             return False
 
+        self.last_report_headers = list(headers)
+        self.last_report_rows = parsed_rows
+
         try:
             df = pd.DataFrame(parsed_rows, columns=headers if headers else None)
         except Exception:
             df = pd.DataFrame(parsed_rows)
 
-        df = convert_timestamps_to_tanzania(df)
+        # Parallel processors convert timestamps inside their workers
+        if not getattr(processor_func, "converts_timestamps", False):
+            with stage("timestamps", rows_in=len(df)) as st:
+                df = convert_timestamps_to_tanzania(df)
+                st["rows_out"] = len(df)
 
         if processor_func:
-            df = processor_func(df, template_id, self)
+            name = getattr(processor_func, "__name__", "processor")
+            with stage(f"process:{name}", rows_in=len(df)) as st:
+                df = processor_func(df, template_id, self)
+                st["rows_out"] = len(df)
 
-        with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-            df.to_excel(writer, sheet_name="Live Data", index=False)
+        with stage("report_write", rows_in=len(df)) as st:
+            written = write_report(df, output_path, formats)
+            st["rows_out"] = len(df)
+            st["bytes_written"] = sum(os.path.getsize(p) for p in written)
 
         print(f"✓ Report saved: {output_path} ({len(parsed_rows)} rows)")
         return True
@@ -369,7 +429,7 @@ class WialonAPI:
                 }),
                 "sid": self.sid,
             }
-            r = requests.post(self.api_url, params=p, timeout=60)
+            r = self._post(p, timeout=60)
             try:
                 return r.json()
             except Exception:
@@ -381,6 +441,8 @@ class WialonAPI:
         save_debug_json(rows_resp, output_path, "rows_debug")
 
         if isinstance(rows_resp, dict) and rows_resp.get("error") is not None:
+            # The range is fetched again in chunks
+            record_http(0, retries=1)
             chunk_size = 200
             for s in range(0, row_count, chunk_size):
                 e = min(s + chunk_size - 1, row_count - 1)
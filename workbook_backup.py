@@ -0,0 +1,244 @@
+"""Content-addressed backups of the OVERALL workbook.
+
+A full copy of the workbook per run mostly duplicates parts that did not
+change (pivot caches, drawings, external links, untouched sheets). A
+snapshot here stores each zip part once, as a zlib-compressed object
+named by the SHA-256 of its content, plus a small JSON manifest listing
+the parts of that workbook version:
+
+    backup/objects/ab/abcdef...       part contents, shared by snapshots
+    backup/snapshots/<id>.json        part names, hashes and zip metadata
+
+A part whose name, CRC-32 and size match the previous snapshot reuses
+that snapshot's object without being read, so a daily snapshot only
+reads and writes the parts the append changed. Restoring rebuilds the
+workbook in a temporary file next to the target and renames it into
+place, so the target is either the old or the restored file, never a
+partial one. prune() applies the retention policy (config.BACKUP_KEEP_LAST
+and BACKUP_KEEP_DAYS) and deletes objects no snapshot refers to.
+
+Usage:
+    python workbook_backup.py list [overall_folder]
+    python workbook_backup.py restore <snapshot id> <output.xlsx> [overall_folder]
+    python workbook_backup.py prune [overall_folder]
+"""
+
+import os
+import json
+import zlib
+import shutil
+import hashlib
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+
+from config import BACKUP_FOLDER, BACKUP_KEEP_LAST, BACKUP_KEEP_DAYS
+
+SNAPSHOT_ID_FORMAT = "%Y%m%d-%H%M%S-%f"
+
+
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def _write_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class WorkbookBackups:
+    """Snapshots of workbook versions kept in an OVERALL folder."""
+
+    def __init__(self, overall_folder):
+        self.folder = os.path.join(overall_folder, BACKUP_FOLDER)
+        self.objects_folder = os.path.join(self.folder, "objects")
+        self.snapshots_folder = os.path.join(self.folder, "snapshots")
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_folder, digest[:2], digest)
+
+    def _put_object(self, data):
+        """Store part contents; return (digest, True if a new object was written)."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return digest, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_atomic(path, zlib.compress(data, 6))
+        return digest, True
+
+    def _read_object(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Backup object {digest} is corrupt")
+        return data
+
+    def list_snapshots(self):
+        """Return snapshot manifests, oldest first."""
+        if not os.path.isdir(self.snapshots_folder):
+            return []
+        snapshots = []
+        for name in sorted(os.listdir(self.snapshots_folder)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.snapshots_folder, name), 'r', encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                print(f"⚠ Skipping unreadable backup manifest {name}")
+        return snapshots
+
+    def snapshot(self, workbook_path):
+        """Back up a workbook version.
+
+        Args:
+            workbook_path: .xlsx file to back up
+
+        Returns:
+            Snapshot id
+        """
+        snapshots = self.list_snapshots()
+        previous = {}
+        if snapshots:
+            previous = {(p["name"], p["crc"], p["size"]): p["hash"] for p in snapshots[-1]["parts"]}
+
+        parts = []
+        written = 0
+        with zipfile.ZipFile(workbook_path) as z:
+            for info in z.infolist():
+                digest = previous.get((info.filename, info.CRC, info.file_size))
+                if digest is None or not os.path.exists(self._object_path(digest)):
+                    digest, stored = self._put_object(z.read(info))
+                    written += stored
+                parts.append({
+                    "name": info.filename,
+                    "hash": digest,
+                    "crc": info.CRC,
+                    "size": info.file_size,
+                    "date_time": list(info.date_time),
+                    "compress_type": info.compress_type,
+                    "external_attr": info.external_attr,
+                })
+
+        now = datetime.now()
+        snapshot_id = now.strftime(SNAPSHOT_ID_FORMAT)
+        manifest = {
+            "id": snapshot_id,
+            "created": now.isoformat(timespec='seconds'),
+            "workbook": os.path.basename(workbook_path),
+            "size": os.path.getsize(workbook_path),
+            "parts": parts,
+        }
+        os.makedirs(self.snapshots_folder, exist_ok=True)
+        _write_atomic(os.path.join(self.snapshots_folder, f"{snapshot_id}.json"),
+                      json.dumps(manifest).encode('utf-8'))
+        print(f"✓ Backed up {manifest['workbook']} as snapshot {snapshot_id} "
+              f"({written} of {len(parts)} parts stored)")
+        return snapshot_id
+
+    def _manifest(self, snapshot_id):
+        path = os.path.join(self.snapshots_folder, f"{snapshot_id}.json")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No backup snapshot {snapshot_id}")
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def restore(self, snapshot_id, dest_path):
+        """Rebuild a snapshot's workbook at dest_path (atomically replaced).
+
+        Args:
+            snapshot_id: Id returned by snapshot()
+            dest_path: Output .xlsx path
+
+        Returns:
+            dest_path
+        """
+        manifest = self._manifest(snapshot_id)
+        folder = os.path.dirname(os.path.abspath(dest_path))
+        fd, tmp_path = tempfile.mkstemp(suffix='.xlsx', dir=folder)
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(tmp_path, 'w') as out:
+                for part in manifest["parts"]:
+                    info = zipfile.ZipInfo(part["name"], date_time=tuple(part["date_time"]))
+                    info.compress_type = part["compress_type"]
+                    info.external_attr = part["external_attr"]
+                    out.writestr(info, self._read_object(part["hash"]))
+            if os.path.exists(dest_path):
+                shutil.copymode(dest_path, tmp_path)
+            else:
+                os.chmod(tmp_path, 0o666 & ~_umask())
+            os.replace(tmp_path, dest_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return dest_path
+
+    def prune(self, keep_last=None, keep_days=None):
+        """Delete snapshots outside the retention policy and unused objects.
+
+        Keeps the keep_last most recent snapshots plus the newest snapshot
+        of each of the last keep_days days.
+
+        Returns:
+            Tuple of (snapshots removed, objects removed)
+        """
+        keep_last = BACKUP_KEEP_LAST if keep_last is None else keep_last
+        keep_days = BACKUP_KEEP_DAYS if keep_days is None else keep_days
+
+        snapshots = self.list_snapshots()
+        keep = {s["id"] for s in snapshots[-keep_last:]} if keep_last else set()
+        cutoff = (datetime.now() - timedelta(days=keep_days)).date().isoformat()
+        newest_per_day = {}
+        for s in snapshots:
+            newest_per_day[s["created"][:10]] = s["id"]
+        keep |= {sid for day, sid in newest_per_day.items() if day > cutoff}
+
+        removed = 0
+        for s in snapshots:
+            if s["id"] not in keep:
+                os.remove(os.path.join(self.snapshots_folder, f"{s['id']}.json"))
+                removed += 1
+
+        used = {p["hash"] for s in snapshots if s["id"] in keep for p in s["parts"]}
+        objects_removed = 0
+        if os.path.isdir(self.objects_folder):
+            for prefix in os.listdir(self.objects_folder):
+                prefix_folder = os.path.join(self.objects_folder, prefix)
+                for digest in os.listdir(prefix_folder):
+                    if digest not in used:
+                        os.remove(os.path.join(prefix_folder, digest))
+                        objects_removed += 1
+                if not os.listdir(prefix_folder):
+                    os.rmdir(prefix_folder)
+        return removed, objects_removed
+
+
+if __name__ == "__main__":
+    import sys
+
+    commands = ("list", "restore", "prune")
+    if len(sys.argv) < 2 or sys.argv[1] not in commands or (sys.argv[1] == "restore" and len(sys.argv) < 4):
+        print("Usage: python workbook_backup.py list [overall_folder]")
+        print("       python workbook_backup.py restore <snapshot id> <output.xlsx> [overall_folder]")
+        print("       python workbook_backup.py prune [overall_folder]")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == "list":
+        backups = WorkbookBackups(sys.argv[2] if len(sys.argv) > 2 else ".")
+        for s in backups.list_snapshots():
+            print(f"{s['id']}  {s['created']}  {s['workbook']}  ({s['size']:,} bytes)")
+    elif command == "restore":
+        backups = WorkbookBackups(sys.argv[4] if len(sys.argv) > 4 else ".")
+        print(f"✓ Restored: {backups.restore(sys.argv[2], sys.argv[3])}")
+    else:
+        backups = WorkbookBackups(sys.argv[2] if len(sys.argv) > 2 else ".")
+        snapshots, objects = backups.prune()
+        print(f"✓ Removed {snapshots} snapshots and {objects} unused objects")
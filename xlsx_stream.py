@@ -0,0 +1,791 @@
+"""Package-level access to an .xlsx workbook for appending rows.
+
+The OVERALL workbook carries pivot caches, charts, external links and a
+large shared-strings table. Loading it through a spreadsheet library
+parses (and rewrites) all of that just to add a few hundred rows.
+XlsxPackage works on the zip parts directly instead:
+
+- a worksheet is scanned with iterparse one <row> at a time (only the
+  last row is kept for its style indexes), or streamed into a DataFrame
+  when the caller needs the existing data;
+- new <row> elements reuse the reference row's style indexes and are
+  spliced in before </sheetData> while the part is copied in chunks;
+- the <dimension> ref, the tables that end on the old last row and the
+  shared-strings count attributes are updated in place, and new strings
+  are appended as <si> entries;
+- every other part (pivots, charts, external links, drawings, ...) is
+  copied unchanged, as its compressed bytes (no inflate / deflate).
+
+Column number formats requested through set_column_format() become new
+cellXfs entries cloned from the reference cell's style.
+
+write_sheet() replaces a sheet's part with freshly generated rows (or
+adds a new sheet part, registered in the workbook, its relationships and
+the content types), for small static sheets such as the summaries.
+"""
+
+import os
+import re
+import copy
+import shutil
+import struct
+import numbers
+import posixpath
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime, date, timedelta
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+REL_SHARED_STRINGS = "/sharedStrings"
+REL_STYLES = "/styles"
+REL_TABLE = "/table"
+REL_WORKSHEET = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"
+CT_WORKSHEET = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+
+CHUNK_SIZE = 64 * 1024
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+# Built-in number formats that display dates/times
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+BUILTIN_FORMATS = {0: 'General', 49: '@'}
+
+CELL_REF_PATTERN = re.compile(r'([A-Z]+)(\d+)')
+DIMENSION_PATTERN = re.compile(rb'<dimension ref="([A-Z]+)\d+(?::([A-Z]+)\d+)?"\s*/>')
+ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Row attributes carried over from the reference row
+ROW_STYLE_ATTRS = ('s', 'customFormat', 'ht', 'customHeight')
+
+
+def _q(tag):
+    return f"{{{NS_MAIN}}}{tag}"
+
+
+def column_index(letters):
+    """Convert an Excel column letter (e.g. 'AB') to a 1-based index."""
+    idx = 0
+    for ch in letters:
+        idx = idx * 26 + (ord(ch) - 64)
+    return idx
+
+
+def column_letter(idx):
+    """Convert a 1-based column index to an Excel column letter."""
+    letters = ''
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _is_date_format(code):
+    """Return True if a number format code displays a date or time."""
+    # Drop quoted literals, escapes and [colour]/[$-locale] sections
+    code = re.sub(r'"[^"]*"|\\.|\[[^\]]*\]', '', code)
+    return bool(re.search(r'[dmyhs]', code, re.IGNORECASE))
+
+
+def _to_serial(value):
+    """Convert a datetime/date to an Excel serial number."""
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None)
+    return (value - EXCEL_EPOCH).total_seconds() / 86400
+
+
+def _format_number(value):
+    if isinstance(value, (bool, np.bool_)):
+        return '1' if value else '0'
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _parse_number(text):
+    if re.fullmatch(r'-?\d+', text):
+        return int(text)
+    return float(text)
+
+
+def _t_xml(text):
+    """Return a <t> element for text, preserving surrounding spaces."""
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<t{space}>{escape(text)}</t>'
+
+
+def _si_xml(text):
+    return f'<si>{_t_xml(text)}</si>'
+
+
+def _copy_with_edits(src, dst, head_edit=None, tail_edits=()):
+    """Copy a part in chunks, applying one head edit and one tail insertion.
+
+    Args:
+        src: Readable binary file
+        dst: Writable binary file
+        head_edit: Optional function(bytes) -> bytes applied once to the
+            first chunk (root element attributes, <dimension>)
+        tail_edits: (marker, replacement) byte pairs; the first marker
+            found is replaced once
+    """
+    hold = max((len(m) for m, _ in tail_edits), default=1) - 1
+    buf = b''
+    head_done = head_edit is None
+    replaced = not tail_edits
+
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        buf += chunk
+        if not head_done and (len(buf) >= CHUNK_SIZE or not chunk):
+            buf = head_edit(buf)
+            head_done = True
+        if head_done and not replaced:
+            for marker, replacement in tail_edits:
+                pos = buf.find(marker)
+                if pos != -1:
+                    buf = buf[:pos] + replacement + buf[pos + len(marker):]
+                    replaced = True
+                    break
+        if not chunk:
+            dst.write(buf)
+            break
+        if head_done:
+            keep = 0 if replaced else hold
+            cut = len(buf) - keep
+            dst.write(buf[:cut])
+            buf = buf[cut:]
+
+    if not replaced:
+        raise ValueError("Part does not contain the expected closing tag")
+
+
+def _copy_raw(src, out, info):
+    """Copy a zip member's compressed bytes into an open ZipFile as they are.
+
+    zipfile has no public raw copy, so the member's local header is
+    written here and its entry registered for the central directory that
+    out writes on close.
+
+    Args:
+        src: Binary file of the source zip
+        out: ZipFile open for writing
+        info: ZipInfo of the member in the source zip
+    """
+    src.seek(info.header_offset)
+    header = src.read(30)
+    name_len, extra_len = struct.unpack('<HH', header[26:30])
+    src.seek(info.header_offset + 30 + name_len + extra_len)
+
+    zinfo = copy.copy(info)
+    # CRC and sizes are known, so they go in the local header instead of
+    # a data descriptor
+    zinfo.flag_bits &= ~0x08
+    zinfo.header_offset = out.fp.tell()
+    out.fp.write(zinfo.FileHeader(zinfo.file_size > zipfile.ZIP64_LIMIT or
+                                  zinfo.compress_size > zipfile.ZIP64_LIMIT))
+    remaining = info.compress_size
+    while remaining:
+        chunk = src.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise ValueError(f"Truncated zip member: {info.filename}")
+        out.fp.write(chunk)
+        remaining -= len(chunk)
+    out.filelist.append(zinfo)
+    out.NameToInfo[zinfo.filename] = zinfo
+    out.start_dir = out.fp.tell()
+
+
+class XlsxPackage:
+    """An .xlsx file opened at the zip-part level for appending rows."""
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path)
+        self.names = set(self.zip.namelist())
+
+        workbook_part = self._office_document()
+        self.workbook_part = workbook_part
+        self.sheet_parts = {}
+        rels = self._rels(workbook_part)
+        root = ET.fromstring(self.zip.read(workbook_part))
+        for sheet in root.iter(_q('sheet')):
+            rid = sheet.get(f"{{{NS_REL}}}id")
+            if rid in rels:
+                self.sheet_parts[sheet.get('name')] = rels[rid][1]
+
+        self.sst_part = self._find_rel(rels, REL_SHARED_STRINGS)
+        self.styles_part = self._find_rel(rels, REL_STYLES)
+
+        self._shared_strings = None
+        self._string_index = None
+        self._new_strings = []
+        self._new_string_refs = 0
+
+        self._xf_formats = None
+        self._column_formats = {}
+        self._new_xfs = {}        # (base xf, format code) -> new xf index
+        self._new_num_fmts = {}   # format code -> numFmtId
+
+        self._last_rows = {}      # sheet -> scan info
+        self._headers = {}        # sheet -> (row number, {col: value}, {col: style})
+        self._header_cells = {}   # sheet -> {col: text} to add to the header row
+        self._appended = {}       # sheet -> list of row XML bytes
+        self._edited = {}         # part -> new bytes (small parts only)
+        self._new_parts = {}      # part -> bytes of parts added to the package
+
+    # ------------------------------------------------------------------ parts
+
+    def _rels(self, part):
+        """Return {rId: (type, target part)} for a part's relationships."""
+        folder, name = posixpath.split(part)
+        rels_part = posixpath.join(folder, "_rels", name + ".rels")
+        if rels_part not in self.names:
+            return {}
+        rels = {}
+        for rel in ET.fromstring(self.zip.read(rels_part)).iter(f"{{{NS_PKG_REL}}}Relationship"):
+            if rel.get('TargetMode') == 'External':
+                continue
+            target = rel.get('Target')
+            if target.startswith('/'):
+                target = target.lstrip('/')
+            else:
+                target = posixpath.normpath(posixpath.join(folder, target))
+            rels[rel.get('Id')] = (rel.get('Type'), target)
+        return rels
+
+    def _office_document(self):
+        for rel_type, target in self._rels('').values():
+            if rel_type.endswith('/officeDocument'):
+                return target
+        return 'xl/workbook.xml'
+
+    @staticmethod
+    def _find_rel(rels, suffix):
+        for rel_type, target in rels.values():
+            if rel_type.endswith(suffix):
+                return target
+        return None
+
+    def sheet_names(self):
+        return list(self.sheet_parts)
+
+    # ---------------------------------------------------------- shared strings
+
+    def _load_shared_strings(self):
+        if self._shared_strings is not None:
+            return
+        self._shared_strings = []
+        self._string_index = {}
+        if not self.sst_part:
+            return
+        with self.zip.open(self.sst_part) as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag == _q('si'):
+                    # Plain <t> or rich-text runs (<r><t>); phonetic hints skipped
+                    parts = elem.findall(_q('t')) + elem.findall(f"{_q('r')}/{_q('t')}")
+                    text = ''.join(t.text or '' for t in parts)
+                    self._string_index.setdefault(text, len(self._shared_strings))
+                    self._shared_strings.append(text)
+                    elem.clear()
+
+    def _string_ref(self, text):
+        """Return the shared-string index for text, adding it if new."""
+        self._load_shared_strings()
+        idx = self._string_index.get(text)
+        if idx is None:
+            idx = len(self._shared_strings)
+            self._shared_strings.append(text)
+            self._string_index[text] = idx
+            self._new_strings.append(text)
+        self._new_string_refs += 1
+        return idx
+
+    # ------------------------------------------------------------------ styles
+
+    def _load_styles(self):
+        """Read the number format code of every cellXfs entry."""
+        if self._xf_formats is not None:
+            return
+        self._xf_formats = []
+        if not self.styles_part:
+            return
+        root = ET.fromstring(self.zip.read(self.styles_part))
+        codes = dict(BUILTIN_FORMATS)
+        num_fmts = root.find(_q('numFmts'))
+        if num_fmts is not None:
+            for fmt in num_fmts:
+                codes[int(fmt.get('numFmtId'))] = fmt.get('formatCode')
+        cell_xfs = root.find(_q('cellXfs'))
+        for xf in (cell_xfs if cell_xfs is not None else []):
+            fmt_id = int(xf.get('numFmtId', 0))
+            self._xf_formats.append((fmt_id, codes.get(fmt_id)))
+
+    def _is_date_style(self, style):
+        self._load_styles()
+        if style >= len(self._xf_formats):
+            return False
+        fmt_id, code = self._xf_formats[style]
+        if fmt_id in BUILTIN_DATE_FORMATS:
+            return True
+        return code is not None and _is_date_format(code)
+
+    def set_column_format(self, sheet_name, col_letter, number_format):
+        """Use number_format for cells appended to this column."""
+        self._column_formats[(sheet_name, col_letter)] = number_format
+
+    def _style_with_format(self, base, number_format):
+        """Return a cellXfs index like base but with number_format."""
+        key = (base, number_format)
+        if not self.styles_part:
+            return base
+        if key in self._new_xfs:
+            return self._new_xfs[key]
+        self._load_styles()
+
+        fmt_id = next((i for i, c in BUILTIN_FORMATS.items() if c == number_format), None)
+        if fmt_id is None:
+            existing = {c: i for i, c in self._xf_formats if c is not None}
+            fmt_id = existing.get(number_format) or self._new_num_fmts.get(number_format)
+        if fmt_id is None:
+            used = [i for i, _ in self._xf_formats] + list(self._new_num_fmts.values())
+            fmt_id = max([163] + used) + 1
+            self._new_num_fmts[number_format] = fmt_id
+
+        if base < len(self._xf_formats) and self._xf_formats[base][0] == fmt_id:
+            self._new_xfs[key] = base
+            return base
+
+        idx = len(self._xf_formats)
+        self._xf_formats.append((fmt_id, number_format))
+        self._new_xfs[key] = idx
+        return idx
+
+    def _rewrite_styles(self):
+        """Add new numFmts and cellXfs entries to styles.xml (string level)."""
+        if not self._new_xfs and not self._new_num_fmts:
+            return
+        xml = self.zip.read(self.styles_part).decode('utf-8')
+
+        if self._new_num_fmts:
+            entries = ''.join(
+                f'<numFmt numFmtId="{i}" formatCode={quoteattr(c)}/>'
+                for c, i in self._new_num_fmts.items()
+            )
+            m = re.search(r'<numFmts count="(\d+)"\s*>', xml)
+            if m:
+                count = int(m.group(1)) + len(self._new_num_fmts)
+                xml = xml.replace(m.group(0), f'<numFmts count="{count}">', 1)
+                xml = xml.replace('</numFmts>', entries + '</numFmts>', 1)
+            else:
+                xml = re.sub(
+                    r'(<styleSheet\b[^>]*>)',
+                    lambda s: s.group(1) + f'<numFmts count="{len(self._new_num_fmts)}">{entries}</numFmts>',
+                    xml, count=1
+                )
+
+        m = re.search(r'<cellXfs count="(\d+)"\s*>(.*?)</cellXfs>', xml, re.DOTALL)
+        xfs = re.findall(r'<xf\b[^>]*?/>|<xf\b[^>]*?>.*?</xf>', m.group(2), re.DOTALL)
+        new_entries = []
+        for (base, _), idx in sorted(self._new_xfs.items(), key=lambda kv: kv[1]):
+            if idx < len(xfs):
+                continue
+            fmt_id = self._xf_formats[idx][0]
+            xf = xfs[base]
+            xf = re.sub(r'\snumFmtId="\d+"', '', xf, count=1)
+            xf = re.sub(r'\sapplyNumberFormat="\w+"', '', xf, count=1)
+            xf = xf.replace('<xf', f'<xf numFmtId="{fmt_id}" applyNumberFormat="1"', 1)
+            new_entries.append(xf)
+        if new_entries:
+            body = m.group(2) + ''.join(new_entries)
+            xml = (xml[:m.start()] + f'<cellXfs count="{len(xfs) + len(new_entries)}">'
+                   + body + '</cellXfs>' + xml[m.end():])
+
+        self._edited[self.styles_part] = xml.encode('utf-8')
+
+    # ------------------------------------------------------------------- sheets
+
+    def _cell_value(self, cell):
+        """Return the Python value of a <c> element."""
+        kind = cell.get('t', 'n')
+        if kind == 'inlineStr':
+            return ''.join(t.text or '' for t in cell.iter(_q('t')))
+        v = cell.find(_q('v'))
+        if v is None or v.text is None:
+            return None
+        text = v.text
+        if kind == 's':
+            self._load_shared_strings()
+            return self._shared_strings[int(text)]
+        if kind in ('str', 'e'):
+            return text
+        if kind == 'b':
+            return text == '1'
+        value = _parse_number(text)
+        if self._is_date_style(int(cell.get('s', 0))):
+            # Serials are float days: round off the representation error
+            return EXCEL_EPOCH + timedelta(milliseconds=round(float(value) * 86400000))
+        return value
+
+    def _scan(self, sheet_name, collect=False):
+        """Stream a worksheet row by row.
+
+        Args:
+            sheet_name: Sheet name
+            collect: Also return every row as {column index: value}
+
+        Returns:
+            Tuple of (last row info dict, list of (row number, cells) if collect)
+        """
+        part = self.sheet_parts[sheet_name]
+        rows = []
+        last = {"row": 0, "styles": {}, "attrs": {}, "first_value": None, "max_col": 0}
+
+        with self.zip.open(part) as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag != _q('row'):
+                    continue
+                r = int(elem.get('r', last["row"] + 1))
+                styles = {}
+                values = {}
+                first_value = None
+                for i, cell in enumerate(elem.iter(_q('c')), start=1):
+                    ref = cell.get('r')
+                    col = column_index(CELL_REF_PATTERN.match(ref).group(1)) if ref else i
+                    styles[col] = int(cell.get('s', 0))
+                    if collect or col == 1:
+                        value = self._cell_value(cell)
+                        if col == 1:
+                            first_value = value
+                        if collect:
+                            values[col] = value
+                last = {
+                    "row": r,
+                    "styles": styles,
+                    "attrs": {a: elem.get(a) for a in ROW_STYLE_ATTRS if elem.get(a) is not None},
+                    "first_value": first_value,
+                    "max_col": max([last["max_col"]] + list(styles)),
+                }
+                if collect:
+                    rows.append((r, values))
+                elem.clear()
+
+        self._last_rows.setdefault(sheet_name, last)
+        return last, rows
+
+    def header(self, sheet_name):
+        """Return (row number, {col: value}, {col: style}) of the first row."""
+        if sheet_name in self._headers:
+            return self._headers[sheet_name]
+        result = (1, {}, {})
+        with self.zip.open(self.sheet_parts[sheet_name]) as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag != _q('row'):
+                    continue
+                values, styles = {}, {}
+                for i, cell in enumerate(elem.iter(_q('c')), start=1):
+                    ref = cell.get('r')
+                    col = column_index(CELL_REF_PATTERN.match(ref).group(1)) if ref else i
+                    values[col] = self._cell_value(cell)
+                    styles[col] = int(cell.get('s', 0))
+                result = (int(elem.get('r', 1)), values, styles)
+                break
+        self._headers[sheet_name] = result
+        return result
+
+    def set_header_cells(self, sheet_name, cells):
+        """Queue text cells to add at the end of the header row.
+
+        Args:
+            sheet_name: Sheet name
+            cells: Dict of 1-based column -> header text (columns after the
+                existing header cells)
+        """
+        if not cells:
+            return
+        self._header_cells.setdefault(sheet_name, {}).update(cells)
+        last = self.last_row(sheet_name)
+        last["max_col"] = max([last["max_col"]] + list(cells))
+
+    def _header_xml(self, sheet_name):
+        row, _, styles = self.header(sheet_name)
+        style = styles[max(styles)] if styles else 0
+        return ''.join(
+            self._cell_xml(f"{column_letter(col)}{row}", text, style)
+            for col, text in sorted(self._header_cells[sheet_name].items())
+        ).encode('utf-8')
+
+    def last_row(self, sheet_name):
+        """Return scan info of the sheet's last row (row, styles, first_value, ...)."""
+        if sheet_name not in self._last_rows:
+            self._scan(sheet_name)
+        return self._last_rows[sheet_name]
+
+    def read_sheet(self, sheet_name):
+        """Read a worksheet into a DataFrame (first row is the header)."""
+        _, rows = self._scan(sheet_name, collect=True)
+        if not rows:
+            return pd.DataFrame()
+        _, header = rows[0]
+        width = max(max(cells, default=0) for _, cells in rows)
+        columns = [str(header.get(c, '') or '').strip() for c in range(1, width + 1)]
+        data = [[cells.get(c) for c in range(1, width + 1)] for _, cells in rows[1:]]
+        return pd.DataFrame(data, columns=columns)
+
+    def _cell_xml(self, ref, value, style):
+        s_attr = f' s="{style}"' if style else ''
+        if value is None or (isinstance(value, str) and value == ''):
+            return f'<c r="{ref}"{s_attr}/>'
+        if isinstance(value, (datetime, date, pd.Timestamp)):
+            return f'<c r="{ref}"{s_attr}><v>{_format_number(_to_serial(value))}</v></c>'
+        if isinstance(value, (bool, np.bool_)):
+            return f'<c r="{ref}"{s_attr} t="b"><v>{_format_number(value)}</v></c>'
+        if isinstance(value, numbers.Number):
+            if isinstance(value, float) and not np.isfinite(value):
+                return f'<c r="{ref}"{s_attr}/>'
+            return f'<c r="{ref}"{s_attr}><v>{_format_number(value)}</v></c>'
+
+        text = ILLEGAL_XML_CHARS.sub('', str(value))
+        if self.sst_part:
+            return f'<c r="{ref}"{s_attr} t="s"><v>{self._string_ref(text)}</v></c>'
+        return f'<c r="{ref}"{s_attr} t="inlineStr"><is>{_t_xml(text)}</is></c>'
+
+    def append_rows(self, sheet_name, rows, start_col=1):
+        """Queue rows to be appended after the sheet's last row.
+
+        Args:
+            sheet_name: Sheet name
+            rows: List of row value lists
+            start_col: 1-based column of the first value
+
+        Returns:
+            Number of rows queued
+        """
+        if not rows:
+            return 0
+        last = self.last_row(sheet_name)
+        row_attrs = ''.join(f' {k}="{v}"' for k, v in last["attrs"].items())
+
+        styles = {}
+        width = max(len(r) for r in rows)
+        for col in range(start_col, start_col + width):
+            style = last["styles"].get(col, 0)
+            number_format = self._column_formats.get((sheet_name, column_letter(col)))
+            if number_format is not None:
+                style = self._style_with_format(style, number_format)
+            styles[col] = style
+
+        pending = self._appended.setdefault(sheet_name, [])
+        next_row = last["row"] + len(pending) + 1
+        for offset, values in enumerate(rows):
+            r = next_row + offset
+            cells = ''.join(
+                self._cell_xml(f"{column_letter(col)}{r}", value, styles[col])
+                for col, value in enumerate(values, start=start_col)
+            )
+            pending.append(f'<row r="{r}"{row_attrs}>{cells}</row>'.encode('utf-8'))
+
+        last["max_col"] = max(last["max_col"], start_col + width - 1)
+        return len(rows)
+
+    def _part_text(self, part):
+        if part in self._edited:
+            return self._edited[part].decode('utf-8')
+        return self.zip.read(part).decode('utf-8')
+
+    def _add_sheet_part(self, sheet_name):
+        """Register a new empty worksheet part and return its name."""
+        numbers_used = [int(m.group(1)) for name in self.names | set(self._new_parts)
+                        for m in [re.match(r'xl/worksheets/sheet(\d+)\.xml$', name)] if m]
+        part = f"xl/worksheets/sheet{max(numbers_used, default=0) + 1}.xml"
+
+        folder, name = posixpath.split(self.workbook_part)
+        rels_part = posixpath.join(folder, "_rels", name + ".rels")
+        rels_xml = self._part_text(rels_part)
+        rel_ids = [int(i) for i in re.findall(r'Id="rId(\d+)"', rels_xml)]
+        rid = f"rId{max(rel_ids, default=0) + 1}"
+        target = posixpath.relpath(part, folder)
+        rels_xml = rels_xml.replace(
+            '</Relationships>',
+            f'<Relationship Id="{rid}" Type="{REL_WORKSHEET}" Target="{target}"/></Relationships>'
+        )
+        self._edited[rels_part] = rels_xml.encode('utf-8')
+
+        workbook_xml = self._part_text(self.workbook_part)
+        sheet_ids = [int(i) for i in re.findall(r'<sheet\b[^>]*\ssheetId="(\d+)"', workbook_xml)]
+        workbook_xml = workbook_xml.replace(
+            '</sheets>',
+            f'<sheet name={quoteattr(sheet_name)} sheetId="{max(sheet_ids, default=0) + 1}" '
+            f'r:id="{rid}"/></sheets>'
+        )
+        self._edited[self.workbook_part] = workbook_xml.encode('utf-8')
+
+        types_xml = self._part_text(CONTENT_TYPES_PART)
+        types_xml = types_xml.replace(
+            '</Types>', f'<Override PartName="/{part}" ContentType="{CT_WORKSHEET}"/></Types>'
+        )
+        self._edited[CONTENT_TYPES_PART] = types_xml.encode('utf-8')
+
+        self.sheet_parts[sheet_name] = part
+        return part
+
+    def write_sheet(self, sheet_name, rows):
+        """Replace a sheet's contents with rows (the sheet is added if missing).
+
+        The first row is frozen as the header. Meant for small generated
+        sheets: the whole part is built in memory and any formatting,
+        tables or drawings of an existing sheet are dropped.
+
+        Args:
+            sheet_name: Sheet name
+            rows: List of row value lists (header first)
+        """
+        part = self.sheet_parts.get(sheet_name) or self._add_sheet_part(sheet_name)
+        self._appended.pop(sheet_name, None)
+        self._header_cells.pop(sheet_name, None)
+        self._last_rows.pop(sheet_name, None)
+        self._headers.pop(sheet_name, None)
+
+        width = max((len(r) for r in rows), default=1)
+        xml_rows = ''.join(
+            f'<row r="{r}">' + ''.join(
+                self._cell_xml(f"{column_letter(col)}{r}", value, 0)
+                for col, value in enumerate(values, start=1)
+            ) + '</row>'
+            for r, values in enumerate(rows, start=1)
+        )
+        xml = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+            f'<dimension ref="A1:{column_letter(width)}{max(len(rows), 1)}"/>'
+            '<sheetViews><sheetView workbookViewId="0">'
+            '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+            '</sheetView></sheetViews>'
+            f'<sheetData>{xml_rows}</sheetData></worksheet>'
+        ).encode('utf-8')
+
+        if part in self.names:
+            self._edited[part] = xml
+        else:
+            self._new_parts[part] = xml
+
+    def _extend_tables(self, sheet_name, old_last, new_last):
+        """Grow tables that end on the old last row to cover the new rows."""
+        for rel_type, target in self._rels(self.sheet_parts[sheet_name]).values():
+            if not rel_type.endswith(REL_TABLE) or target not in self.names:
+                continue
+            xml = self.zip.read(target).decode('utf-8')
+            m = re.search(r'<table\b[^>]*?\sref="([A-Z]+\d+):([A-Z]+)(\d+)"', xml)
+            if not m or int(m.group(3)) != old_last or 'totalsRowCount="' in m.group(0):
+                continue
+            old_ref = f'{m.group(1)}:{m.group(2)}{old_last}'
+            new_ref = f'{m.group(1)}:{m.group(2)}{new_last}'
+            xml = xml.replace(f'ref="{old_ref}"', f'ref="{new_ref}"')
+            self._edited[target] = xml.encode('utf-8')
+
+    # --------------------------------------------------------------------- save
+
+    def _sheet_edits(self, sheet_name):
+        last = self._last_rows[sheet_name]
+        appended = self._appended.get(sheet_name, [])
+        new_rows = b''.join(appended)
+        new_last = last["row"] + len(appended)
+        right = column_letter(max(last["max_col"], 1))
+        header_cells = self._header_xml(sheet_name) if self._header_cells.get(sheet_name) else b''
+
+        def head_edit(buf):
+            def dim(m):
+                left = m.group(1).decode()
+                return f'<dimension ref="{left}1:{right}{new_last}"/>'.encode()
+            buf = DIMENSION_PATTERN.sub(dim, buf, count=1)
+            if header_cells:
+                m = re.search(rb'<row\b[^>]*?(/?)>', buf)
+                end = buf.find(b'</row>', m.end()) if m and not m.group(1) else -1
+                if m and m.group(1):
+                    buf = buf[:m.start()] + m.group(0)[:-2] + b'>' + header_cells + b'</row>' + buf[m.end():]
+                elif end != -1:
+                    buf = buf[:end] + header_cells + buf[end:]
+                else:
+                    print(f"  ⚠ Header row of '{sheet_name}' not found, header cells not written")
+            return buf
+
+        tail_edits = []
+        if new_rows:
+            tail_edits = [
+                (b'</sheetData>', new_rows + b'</sheetData>'),
+                (b'<sheetData/>', b'<sheetData>' + new_rows + b'</sheetData>'),
+            ]
+        return head_edit, tail_edits
+
+    def _sst_edits(self):
+        entries = b''.join(_si_xml(s).encode('utf-8') for s in self._new_strings)
+        refs = self._new_string_refs
+        added = len(self._new_strings)
+
+        def head_edit(buf):
+            def attrs(m):
+                tag = m.group(0)
+                for name, inc in ((b'count', refs), (b'uniqueCount', added)):
+                    tag = re.sub(
+                        rb'\s' + name + rb'="(\d+)"',
+                        lambda a: b' ' + name + b'="' + str(int(a.group(1)) + inc).encode() + b'"',
+                        tag, count=1
+                    )
+                return tag
+            return re.sub(rb'<sst\b[^>]*>', attrs, buf, count=1)
+
+        return head_edit, [(b'</sst>', entries + b'</sst>')]
+
+    def save(self, path):
+        """Write the workbook with the queued rows to path (may be the source)."""
+        streamed = {}
+        for sheet_name, rows in self._appended.items():
+            if rows:
+                last = self._last_rows[sheet_name]
+                self._extend_tables(sheet_name, last["row"], last["row"] + len(rows))
+        for sheet_name in set(self._appended) | set(self._header_cells):
+            if self._appended.get(sheet_name) or self._header_cells.get(sheet_name):
+                streamed[self.sheet_parts[sheet_name]] = self._sheet_edits(sheet_name)
+        if self._new_string_refs and self.sst_part:
+            streamed[self.sst_part] = self._sst_edits()
+        self._rewrite_styles()
+
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(suffix='.xlsx', dir=folder)
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(tmp_path, 'w') as out, open(self.path, 'rb') as raw:
+                for info in self.zip.infolist():
+                    if info.filename not in self._edited and info.filename not in streamed:
+                        _copy_raw(raw, out, info)
+                        continue
+                    with self.zip.open(info) as src, out.open(copy.copy(info), 'w') as dst:
+                        if info.filename in self._edited:
+                            dst.write(self._edited[info.filename])
+                        else:
+                            head_edit, tail_edits = streamed[info.filename]
+                            _copy_with_edits(src, dst, head_edit, tail_edits)
+                for part, data in self._new_parts.items():
+                    out.writestr(part, data, compress_type=zipfile.ZIP_DEFLATED)
+            # mkstemp creates the file private; keep the source's permissions
+            shutil.copymode(self.path, tmp_path)
+            if os.path.abspath(path) == os.path.abspath(self.path):
+                self.zip.close()
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def close(self):
+        self.zip.close()